@@ -18,58 +18,162 @@
 
 import argparse
 import platformdirs
+import contextlib
 import datetime
-import glob
+import functools
+import hashlib
+import io
 import json
 import os
-import pprint
 import pwd
 import re
+import secrets
 import sys
+import urllib.parse
 import warnings
 
-import jinja2
-import pypi_search.search
-import requests
-from metaextract import utils as meta_utils
-
+import py2pack.batch
+import py2pack.buildenv
+import py2pack.cache
+import py2pack.config
+import py2pack.index
+import py2pack.net
 import py2pack.requires
+import py2pack.store
+import py2pack.update
+import py2pack.utils
 from py2pack import version as py2pack_version
+from py2pack.index import SIMPLE_JSON
 from py2pack.utils import (_get_archive_filelist, get_pyproject_table,
                            parse_pyproject, get_setuptools_scripts,
-                           get_metadata)
-
-from email import parser
+                           get_metadata, get_static_metadata, json_select, run_metaextract, sha256sum,
+                           ArchiveIndex)
 
 
 def replace_string(output_string, replaces):
-    for name, replacement in replaces.items():
-        pattern = r'(?<!%)%{' + name + '}'  # Negative lookbehind to exclude "%%{name}"
-        output_string = re.sub(pattern, replacement.replace(r'%', r'%%'), output_string)
-    return output_string.replace(r'%%', r'%')
+    return py2pack.utils.replace_placeholders(output_string, replaces)
 
 
 warnings.simplefilter('always', DeprecationWarning)
 
+DEFAULT_TEMPLATE = 'opensuse.spec'
+
 SPDX_LICENSES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spdx_license_map.json')
-with open(SPDX_LICENSES_FILE, 'r') as fp:
-    SPDX_LICENSES = json.load(fp)
+
+
+@functools.lru_cache(maxsize=None)
+def get_spdx_licenses():
+    """Return the map of license names to SPDX identifiers, it is read on first use"""
+    with open(SPDX_LICENSES_FILE, 'r') as fp:
+        return json.load(fp)
+
+
+def __getattr__(name):
+    # SPDX_LICENSES used to be read at import time
+    if name == 'SPDX_LICENSES':
+        return get_spdx_licenses()
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+
+
+def _latest_version(simple):
+    """Return the current release in the decoded JSON simple API page
+    of a project, see pypi_latest_version()"""
+    from packaging.utils import (InvalidSdistFilename, InvalidWheelFilename,
+                                 parse_sdist_filename, parse_wheel_filename)
+    from packaging.version import InvalidVersion, Version
+
+    # PEP 700 lists versions without files, too. Those are not yanked.
+    yanked = dict.fromkeys(simple.get('versions', []), False)
+    file_versions = {}
+    for f in simple.get('files', []):
+        try:
+            if f['filename'].endswith('.whl'):
+                version = parse_wheel_filename(f['filename'])[1]
+            else:
+                version = parse_sdist_filename(f['filename'])[1]
+        except (KeyError, InvalidSdistFilename, InvalidWheelFilename, InvalidVersion):
+            continue
+        file_versions.setdefault(version, []).append(bool(f.get('yanked')))
+    candidates = {}
+    for version_string in set(yanked) | {str(v) for v in file_versions}:
+        try:
+            version = Version(version_string)
+        except InvalidVersion:
+            continue
+        files_yanked = file_versions.get(version)
+        if not (files_yanked and all(files_yanked)):
+            candidates.setdefault(version, version_string)
+    final = [v for v in candidates if not v.is_prerelease]
+    if not (final or candidates):
+        return None
+    return candidates[max(final or candidates)]
+
+
+def pypi_latest_version(project):
+    """Find the current release of a project with the JSON simple API
+
+    https://peps.python.org/pep-0691/
+
+    Like PyPI, this is the newest version which is not yanked, preferring
+    final releases over pre-releases. Returns None if the index does not
+    support the JSON simple API or the project has no usable versions.
+    """
+    url = py2pack.index.index_url('simple/{}/'.format(project))
+    try:
+        simple = json.loads(py2pack.cache.cached_get(url, accept=SIMPLE_JSON))
+    except ValueError:
+        return None
+    return _latest_version(simple)
+
+
+def _pypi_json_url(project, release=None):
+    if release:
+        return py2pack.index.index_url('pypi/{}/{}/json'.format(project, release))
+    return py2pack.index.index_url('pypi/{}/json'.format(project))
+
+
+def _absolute_urls(data, url):
+    """make the file URLs of the JSON API document from url absolute,
+    mirrors may use relative ones"""
+    for release in data.get('urls') or []:
+        if release.get('url'):
+            release['url'] = urllib.parse.urljoin(url, release['url'])
+    return data
 
 
 def pypi_json(project, release=None):
     """Access the PyPI JSON API
 
     https://warehouse.pypa.io/api-reference/json.html
+
+    Responses are kept in the local HTTP cache. The metadata of a pinned
+    release never changes, so it is served from the cache without asking
+    the index again.
+
+    Without release, the current version is looked up first so that only
+    the small version specific document is downloaded instead of the
+    project document listing all files of all releases. If that is not
+    possible, only "info" and "urls" are decoded from the project document.
+
+    The metadata comes from the configured package index, see
+    py2pack.index.index_url().
+
+    py2pack.aio.Client.pypi_json() is the asyncio variant.
     """
-    version = ('/' + release) if release else ''
-    with requests.get('https://pypi.org/pypi/{}{}/json'.format(project, version)) as r:
-        pypimeta = r.json()
-    return pypimeta
+    if not release:
+        release = pypi_latest_version(project)
+    url = _pypi_json_url(project, release)
+    if not release:
+        body = py2pack.cache.cached_get(url).decode('utf-8')
+        return _absolute_urls(json_select(body, ['info', 'urls', 'message']), url)
+    return _absolute_urls(json.loads(py2pack.cache.cached_get(url, immutable=True)), url)
 
 
 def pypi_text_file(pkg_info_path):
+    import email.parser
+
     with open(pkg_info_path, 'r') as pkg_info_file:
-        pkg_info_lines = parser.Parser().parse(pkg_info_file)
+        pkg_info_lines = email.parser.Parser().parse(pkg_info_file)
     pkg_info_dict = {}
     for key, value in pkg_info_lines.items():
         key = key.lower().replace('-', '_')
@@ -111,25 +215,54 @@ def _get_template_dirs():
     ])
 
 
+def _update_package_list(args):
+    """refresh the local copy of the "Simple API" index if needed"""
+    if getattr(args, 'refresh', False) or \
+            (not getattr(args, 'offline', False) and py2pack.index.is_stale()):
+        try:
+            py2pack.index.refresh()
+        except OSError as exc:
+            if not py2pack.index.load():
+                print('unable to get the list of PyPI packages: {0}'.format(exc))
+                sys.exit(1)
+            warnings.warn("Could not refresh the list of PyPI packages: {0}. "
+                          "Using the local copy.".format(exc))
+
+
 def list_packages(args=None):
-    """query the "Simple API" of PYPI for all packages and print them."""
+    """print all packages on PyPI from the local copy of the "Simple API" index.
+
+    The local copy is refreshed when it is older than the configured maximum
+    age (or with --refresh), using a conditional request.
+    """
+    _update_package_list(args)
     print('listing all PyPI packages...')
-    with requests.get('https://pypi.org/simple/') as r:
-        html = r.text
-    simplere = re.compile(r'<a href="/simple/.+">(.*)</a>')
-    for package in simplere.findall(html):
+    for package in py2pack.index.search_prefix(py2pack.index.load(), getattr(args, 'prefix', None)):
         print(package)
 
 
 def search(args):
+    """search the local index of PyPI package names (and cached summaries)"""
+    _update_package_list(args)
+    hits = py2pack.index.SearchIndex.open().search(
+        args.name, limit=getattr(args, 'limit', py2pack.index.DEFAULT_SEARCH_LIMIT))
+    if getattr(args, 'json', False):
+        json.dump(hits, sys.stdout, indent=2)
+        print()
+        return
     print('searching for package {0}...'.format(args.name))
-    for hit in pypi_search.search.find_packages(args.name):
-        print('found {0}-{1}'.format(hit['name'], hit['version']))
+    for hit in hits:
+        if hit['version']:
+            print('found {0}-{1}'.format(hit['name'], hit['version']))
+        else:
+            print('found {0}'.format(hit['name']))
 
 
 def show(args):
     fetch_data(args)
     print('showing package {0}...'.format(args.fetched_data['info']['name']))
+    import pprint
+
     pprint.pprint(args.fetched_data)
 
 
@@ -140,11 +273,19 @@ def fetch(args):
         print("unable to find a source release for {0}!".format(args.name))
         sys.exit(1)
     print('downloading package {0}-{1}...'.format(args.name, args.version))
-    print('from {0}'.format(url['url']))
+    print('from {0}'.format(url['fetch_url']))
 
-    with requests.get(url['url']) as r:
-        with open(url['filename'], 'wb') as f:
-            f.write(r.content)
+    sha256 = url.get('digests', {}).get('sha256')
+    try:
+        store = py2pack.store.get_store()
+        if store is None:
+            py2pack.net.download(url['fetch_url'], url['filename'], sha256=sha256)
+        else:
+            stored = store.fetch(url['fetch_url'], url['filename'], args.name, args.version, sha256=sha256)
+            store.checkout(stored, url['filename'])
+    except (ValueError, OSError) as exc:
+        print('unable to download {0}: {1}'.format(url['filename'], exc))
+        sys.exit(1)
 
 
 def _canonicalize_setup_data(data):
@@ -264,40 +405,113 @@ def _quote_shell_metacharacters(string):
     return string
 
 
-def _augment_data_from_tarball(args, filename, data):
-    docs_re = re.compile(r"{0}-{1}\/((?:AUTHOR|ChangeLog|CHANGES|NEWS|README).*)".format(args.name, args.version), re.IGNORECASE)
-    license_re = re.compile(r"{0}-{1}\/((?:COPYING|LICENSE).*)".format(args.name, args.version), re.IGNORECASE)
-
-    data_pyproject = parse_pyproject(filename)
-    if data_pyproject is not None and "license" in data and data["license"] in SPDX_LICENSES:
-        # Trust the PyPI Metadata and don't try to update with a possible non SPDX identifier
-        data_pyproject.pop("license", None)
-    data.update(data_pyproject)
-
-    try:
-        buildrequires = data['build-system']['requires']
-    except KeyError:
+def _uses_setuptools(pyproject):
+    buildrequires = get_pyproject_table(pyproject, 'build-system.requires')
+    if buildrequires is None:
         # No build system specified in pyproject.toml: legacy setuptools
         buildrequires = ['setuptools']
-
-    if any(['setuptools' in br for br in buildrequires]):
+    return any(['setuptools' in br for br in buildrequires])
+
+
+def _needs_extraction(args, archive, complete):
+    """Whether _inspect_tarball() needs the files of the sdist on disk, None
+    while the small files read so far can not tell (see ArchiveIndex)"""
+    if 'pyproject.toml' not in archive.files and not complete:
+        return None
+    if _uses_setuptools(parse_pyproject(archive)):
+        # setup.py may need any file of the sdist
+        return True
+    source = getattr(args, 'metadata', 'auto')
+    if source != 'auto':
+        return source == 'build'
+    if 'PKG-INFO' not in archive.files and not complete:
+        return None
+    pkg_info, dynamic = get_static_metadata(archive)
+    return pkg_info is None or bool(dynamic)
+
+
+def _inspect_tarball(args, archive):
+    """collect everything py2pack wants to know from the sdist.
+
+    This is the expensive part of _augment_data_from_tarball(). The result
+    only depends on the archive content and the options and is JSON
+    serializable, so it can be kept in the metadata cache.
+    """
+    result = {'pyproject': parse_pyproject(archive), 'data': None, 'error': None}
+    if _uses_setuptools(result['pyproject']):
         try:
-            data_archive = meta_utils.from_archive(filename)
-            data.update(data_archive['data'])
+            # setup.py may need any file of the sdist
+            data_archive = run_metaextract(archive.extract(), sys.executable)
+            result['data'] = data_archive['data']
         except Exception as exc:
-            warnings.warn("Could not get setuptools information from tarball {}: {}. "
-                          "Valuable information for the generation might be missing."
-                          .format(filename, exc))
+            result['error'] = ("Could not get setuptools information from tarball {}: {}. "
+                               "Valuable information for the generation might be missing.", str(exc))
     else:
         try:
-            mdata = get_metadata(filename)
-            data.update(mdata)
+            result['data'] = get_metadata(archive, source=getattr(args, 'metadata', 'auto'))
         except Exception as exc:
-            warnings.warn("Could not get metadata information from tarball {}: {}. "
-                          "Valuable information for the generation might be missing."
-                          .format(filename, exc))
+            result['error'] = ("Could not get metadata information from tarball {}: {}. "
+                               "Valuable information for the generation might be missing.", str(exc))
+
+    result['names'] = _get_archive_filelist(archive)
+    # the same types whether the result comes from the cache or not
+    return json.loads(json.dumps(result, default=str))
+
+
+def _inspect_tarball_cached(args, filename):
+    cache = None if getattr(args, 'no_metadata_cache', False) else py2pack.cache.get_metadata_cache()
+    key = None
+    if cache is not None:
+        key = cache.key(sha256sum(filename), metadata=getattr(args, 'metadata', 'auto'))
+        result = cache.get(key)
+        if result is not None:
+            if not getattr(args, 'quiet', False):
+                print('using cached metadata for {0}'.format(os.path.basename(filename)))
+            return result
+    # files are only extracted if the metadata can not be read from the
+    # index, and then in the same pass over the archive
+    with ArchiveIndex(filename, extract=functools.partial(_needs_extraction, args)) as archive:
+        result = _inspect_tarball(args, archive)
+    if cache is not None and not result['error']:
+        # failures may be temporary (e.g. no network for the build), retry them
+        cache.set(key, result)
+    return result
+
+
+def _augment_data_from_tarball(args, filename, data, tarball=None):
+    """add metadata from the sdist to data.
+
+    filename may be the name of the archive or an ArchiveIndex of it. All
+    steps share a single ArchiveIndex, so the archive is only read once.
+    Results for a sdist with the same sha256 are taken from the metadata
+    cache instead. tarball is the result of _inspect_tarball_cached() if
+    the archive was already inspected elsewhere.
+    """
+    if tarball is not None:
+        pass
+    elif isinstance(filename, ArchiveIndex):
+        tarball = _inspect_tarball(args, filename)
+        filename = filename.filename
+    else:
+        tarball = _inspect_tarball_cached(args, filename)
+
+    docs_re = re.compile(r"{0}-{1}\/((?:AUTHOR|ChangeLog|CHANGES|NEWS|README).*)".format(args.name, args.version), re.IGNORECASE)
+    license_re = re.compile(r"{0}-{1}\/((?:COPYING|LICENSE).*)".format(args.name, args.version), re.IGNORECASE)
 
-    names = _get_archive_filelist(filename)
+    data_pyproject = tarball['pyproject']
+    if data_pyproject is not None and "license" in data and data["license"] in get_spdx_licenses():
+        # Trust the PyPI Metadata and don't try to update with a possible non SPDX identifier
+        data_pyproject.pop("license", None)
+    data.update(data_pyproject)
+
+    if tarball['error']:
+        message, exc = tarball['error']
+        warnings.warn(message.format(filename, exc))
+    elif tarball['data']:
+        # fields missing in the sdist metadata keep the value from PyPI
+        data.update((key, value) for key, value in tarball['data'].items() if value is not None)
+
+    names = tarball['names']
     _canonicalize_setup_data(data)
 
     for name in names:
@@ -332,17 +546,20 @@ def _normalize_license(data):
         # try to get license from classifiers
         license = _license_from_classifiers(data)
     if license:
-        if license in SPDX_LICENSES.keys():
-            data['license'] = SPDX_LICENSES[license]
+        spdx_licenses = get_spdx_licenses()
+        if license in spdx_licenses:
+            data['license'] = spdx_licenses[license]
         else:
             data['license'] = "%s (FIXME:No SPDX)" % (license)
     else:
         data['license'] = "FIXME-UNKNOWN"
 
 
-def _prepare_template_env(template_dir):
+def _prepare_template_env(template_dir, bytecode_cache=None):
+    import jinja2
+
     # setup jinja2 environment with custom filters
-    env = jinja2.Environment(loader=jinja2.FileSystemLoader(template_dir))
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader(template_dir), bytecode_cache=bytecode_cache)
     env.filters['parenthesize_version'] = \
         lambda s: re.sub('([=<>]+)(.+)', r' (\1 \2)', s)
     env.filters['basename'] = \
@@ -357,24 +574,216 @@ def _get_source_url(pypi_name, filename):
         pypi_name[0], pypi_name, filename)
 
 
+def spec_data(args, fetched_data, tarball_file=None, tarball=None):
+    """Return the template data for a spec.
+
+    The data is put together from the PyPI metadata fetched_data (it is
+    modified) and the sdist tarball_file, if there is one. args needs the
+    attributes name, version and source_url, and may set the options of
+    _augment_data_from_tarball(). tarball is the already inspected
+    tarball_file, see _inspect_tarball_cached(). Nothing global is
+    touched, so this can run in several threads at once.
+    """
+    data = fetched_data['info']
+    durl = _newest_download_url(args.name, fetched_data)
+    source_url = data['source_url'] = (args.source_url or (durl and durl['url']))
+    data['year'] = datetime.datetime.now().year                             # set current year
+    data['user_name'] = pwd.getpwuid(os.getuid())[4]                        # set system user (packager)
+    data['summary_no_ending_dot'] = re.sub(r'(.*)\.', r'\g<1>', data.get('summary')) if data.get('summary') else ""
+
+    if tarball_file:                                                        # get some more info from that
+        _augment_data_from_tarball(args, tarball_file, data, tarball)
+    else:
+        warnings.warn("No tarball for {} in version {} found. Valuable "
+                      "information for the generation might be missing."
+                      "".format(args.name, args.version))
+        tarball_file = args.name + '-' + args.version + '.zip'
+
+    if not source_url:
+        data['source_url'] = os.path.basename(tarball_file)
+
+    _normalize_license(data)
+    return data
+
+
+# jinja2 environments by template directories, they keep the compiled
+# templates in memory and reload them when the files change
+_template_envs = {}
+
+
+def get_template_env():
+    """Return the jinja2 environment for the template directories"""
+    template_dirs = tuple(_get_template_dirs())
+    env = _template_envs.get(template_dirs)
+    if env is None:
+        env = _template_envs.setdefault(template_dirs, _prepare_template_env(
+            list(template_dirs), bytecode_cache=py2pack.cache.get_template_cache()))
+    return env
+
+
+def render_template(template, data):
+    """Render the template file with data and return the result as str"""
+    return get_template_env().get_template(template).render(data)
+
+
+def stream_template(template, data, stream):
+    """Render the template file with data to the text stream piece by
+    piece, without the whole result in memory"""
+    stream.writelines(get_template_env().get_template(template).generate(data))
+
+
+def write_template(template, data, filename):
+    """Render the template file with data to filename.
+
+    The result is written to a temporary file next to filename, which
+    replaces filename once the template is rendered completely. So
+    filename is either the old or the new file, never a partial one.
+    """
+    directory, basename = os.path.split(filename)
+    tmp = os.path.join(directory, '.{0}.{1}.tmp'.format(basename, secrets.token_hex(4)))
+    # os.open() and not mkstemp(), to get the usual permissions (umask)
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with io.open(fd, 'w', encoding='utf-8') as outfile:
+            stream_template(template, data, outfile)
+        os.replace(tmp, filename)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+# tags which load other templates
+_TEMPLATE_REFERENCE_RE = re.compile(r'{%-?\s*(?:include|extends|import|from)\b')
+
+
+def _template_digest(env, template, digest=None, seen=None):
+    # sha256 over the source of template and of the templates it loads
+    import jinja2.meta
+
+    digest = digest or hashlib.sha256()
+    seen = seen if seen is not None else set()
+    seen.add(template)
+    source = env.loader.get_source(env, template)[0]
+    digest.update(template.encode('utf-8') + b'\0' + source.encode('utf-8') + b'\0')
+    if _TEMPLATE_REFERENCE_RE.search(source):
+        for name in sorted(filter(None, jinja2.meta.find_referenced_templates(env.parse(source)))):
+            if name not in seen:
+                _template_digest(env, name, digest, seen)
+    return digest
+
+
+def _manifest_filename(filename):
+    directory, basename = os.path.split(filename)
+    return os.path.join(directory, '.{0}.py2pack'.format(basename))
+
+
+def template_manifest(template, data):
+    """Return what the output of template for data depends on: the
+    py2pack version and hashes of the template source and the data"""
+    data_json = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return {
+        'py2pack': py2pack_version.version,
+        'template': template,
+        'template_sha256': _template_digest(get_template_env(), template).hexdigest(),
+        'data_sha256': hashlib.sha256(data_json.encode('utf-8')).hexdigest(),
+    }
+
+
+def write_template_if_changed(template, data, filename, force=False):
+    """Render template like write_template(), unless neither the template,
+    the data nor py2pack changed since filename was written.
+
+    A manifest of the inputs is kept next to filename in
+    .<filename>.py2pack. filename is written again when it was changed or
+    removed since then, or with force.
+
+    Returns:
+        True if filename was written, False if it was up to date
+    """
+    manifest = template_manifest(template, data)
+    manifest_file = _manifest_filename(filename)
+    if not force:
+        try:
+            with open(manifest_file) as f:
+                old = json.load(f)
+            output_sha256 = py2pack.utils.sha256sum(filename)
+        except (OSError, ValueError):
+            old = None
+        if old and old.pop('output_sha256', None) == output_sha256 and old == manifest:
+            return False
+    write_template(template, data, filename)
+    manifest['output_sha256'] = py2pack.utils.sha256sum(filename)
+    py2pack.utils.atomic_write(manifest_file, json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8'))
+    return True
+
+
+def _stream_template_stdout(template, data, output=None):
+    # the spec is utf-8, whatever the locale of stdout is
+    output = output or sys.stdout
+    buffer = getattr(output, 'buffer', None)
+    if buffer is None:
+        stream_template(template, data, output)
+        return
+    output.flush()
+    stdout = io.TextIOWrapper(buffer, encoding='utf-8')
+    try:
+        stream_template(template, data, stdout)
+        stdout.flush()
+    finally:
+        stdout.detach()
+
+
+def template_names(templates):
+    """Return the list of templates for the -t option, which is given once,
+    several times or as 'all' for all templates"""
+    if not templates:
+        return [DEFAULT_TEMPLATE]
+    if isinstance(templates, str):
+        templates = [templates]
+    if 'all' in templates:
+        templates = sorted(file_template_list())
+    return list(dict.fromkeys(templates))
+
+
+def output_filename(name, template, several=False):
+    """Name of the file generated from template, e.g. python-foo.spec. With
+    several templates at once, the template name tells the files apart:
+    python-foo.opensuse.spec, python-foo.fedora.spec"""
+    if several:
+        return "python-" + name + '.' + template
+    return "python-" + name + '.' + template.rsplit('.', 1)[1]   # take template file ending
+
+
 def generate(args):
+    if not getattr(args, 'stdout', False):
+        return _generate(args)
+    # the spec is the only output on stdout, all status messages go to stderr
+    output = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        _generate(args, output)
+
+
+def _generate(args, output=None):
     # TODO (toabctl): remove this is a later release
     if args.run:
         warnings.warn("the '--run' switch is deprecated and a noop",
                       DeprecationWarning)
 
+    templates = template_names(args.template)
+    if args.filename and len(templates) > 1:
+        print("--filename can only be used with a single template")
+        sys.exit(1)
+    if output is not None and len(templates) > 1:
+        print("--stdout can only be used with a single template")
+        sys.exit(1)
+    if output is not None and args.filename:
+        print("--stdout and --filename can not be used together")
+        sys.exit(1)
     fetch_local_data(args)
-    if not args.template:
-        args.template = file_template_list()[0]
-    if not args.filename:
-        args.filename = "python-" + args.name + '.' + args.template.rsplit('.', 1)[1]   # take template file ending
+    if not args.filename and len(templates) == 1 and output is None:
+        args.filename = output_filename(args.name, templates[0])
     print('generating spec file for {0}...'.format(args.name))
     data = args.fetched_data['info']
-    durl = newest_download_url(args)
-    source_url = data['source_url'] = (args.source_url or (durl and durl['url']))
-    data['year'] = datetime.datetime.now().year                             # set current year
-    data['user_name'] = pwd.getpwuid(os.getuid())[4]                        # set system user (packager)
-    data['summary_no_ending_dot'] = re.sub(r'(.*)\.', r'\g<1>', data.get('summary')) if data.get('summary') else ""
 
     # If package name supplied on command line differs in case from PyPI's one
     # then package archive will be fetched but the name will be the one from PyPI.
@@ -386,35 +795,28 @@ def generate(args):
     source_glob = args.source_glob or default_source
     data_name = data['name'] or name
 
+    sources = py2pack.utils.get_source_index(source_glob)
     tarball_file = []
     for __name in (name, name.translate(tr), data_name, data_name.translate(tr)):
-        tarball_file.extend(glob.glob(replace_string(source_glob, {'name': __name, 'version': version})))
+        tarball_file.extend(sources.find(__name, version))
         if tarball_file:
             break
-
-    if tarball_file:                                                        # get some more info from that
-        tarball_file = tarball_file[0]
-        _augment_data_from_tarball(args, tarball_file, data)
-
-    else:
-        warnings.warn("No tarball for {} in version {} found. Valuable "
-                      "information for the generation might be missing."
-                      "".format(args.name, args.version))
-        tarball_file = args.name + '-' + args.version + '.zip'
-
-    if not source_url:
-        data['source_url'] = os.path.basename(tarball_file)
-
-    _normalize_license(data)
-
-    env = _prepare_template_env(_get_template_dirs())
-    template = env.get_template(args.template)
-    result = template.render(data).encode('utf-8')                          # render template and encode properly
-    outfile = open(args.filename, 'wb')                                     # write result to spec file
-    try:
-        outfile.write(result)
-    finally:
-        outfile.close()
+    if not tarball_file:
+        # not in the working directory, maybe fetched somewhere else before
+        store = py2pack.store.get_store()
+        stored = store.lookup(name, version) if store is not None else None
+        if stored:
+            tarball_file.append(stored)
+
+    # the metadata is the same for all templates, get it once
+    data = spec_data(args, args.fetched_data, tarball_file[0] if tarball_file else None)
+    for template in templates:
+        if output is not None:
+            _stream_template_stdout(template, data, output)
+            continue
+        filename = args.filename or output_filename(args.name, template, several=True)
+        if not write_template_if_changed(template, data, filename, force=getattr(args, 'force', False)):
+            print('{0} is up to date, skipped (--force regenerates it)'.format(filename))
 
 
 def fetch_local_data(args):
@@ -444,26 +846,34 @@ def fetch_data(args):
         args.version = args.fetched_data['info']['version']                 # return current release number
 
 
-def newest_download_url(args):
-    """check but do not use the url delivered by pypi. that url contains a hash and
-    needs to be adjusted with every package update. Instead use
-    the pypi.io url
-    """
-    if not hasattr(args, "fetched_data"):
-        return {}
-    for release in args.fetched_data['urls']:     # Check download URLs in releases
+def _newest_download_url(name, fetched_data):
+    # 'url' is the public one for the spec, 'fetch_url' the one to download
+    # from, which is on the mirror if the configured index is one
+    for release in fetched_data['urls']:          # Check download URLs in releases
         if release['packagetype'] == 'sdist':                      # Found the source URL we care for
-            release['url'] = _get_source_url(args.name, release['filename'])
+            release.setdefault('fetch_url', release['url'])
+            release['url'] = _get_source_url(name, release['filename'])
             return release
     # No PyPI tarball release, let's see if an upstream download URL is provided:
-    data = args.fetched_data['info']
+    data = fetched_data['info']
     if 'download_url' in data and data['download_url']:
         url = data['download_url']
         return {'url': url,
+                'fetch_url': url,
                 'filename': os.path.basename(url)}
     return {}                                                               # We're all out of bubblegum
 
 
+def newest_download_url(args):
+    """check but do not use the url delivered by pypi. that url contains a hash and
+    needs to be adjusted with every package update. Instead use
+    the pypi.io url
+    """
+    if not hasattr(args, "fetched_data"):
+        return {}
+    return _newest_download_url(args.name, args.fetched_data)
+
+
 def file_template_list():
     template_files = []
     for d in _get_template_dirs():
@@ -471,17 +881,101 @@ def file_template_list():
     return template_files
 
 
+class _TemplateChoices(object):
+    # choices of -t, the template directories are only read when a
+    # template is given or the help lists them
+    def __contains__(self, template):
+        return template == 'all' or template in file_template_list()
+
+    def __iter__(self):
+        return iter(file_template_list() + ['all'])
+
+
+def _configure(args):
+    """Set up the py2pack modules from the configuration file and the
+    command line options in args"""
+    config = py2pack.config.load(args.config)
+    pool_size = py2pack.config.setting(config, 'network', 'pool_size', args.pool_size, type=int)
+    if pool_size is None and getattr(args, 'jobs', None):
+        # a connection for every worker thread of generate-batch
+        pool_size = max(py2pack.net.DEFAULT_POOL_SIZE, args.jobs)
+    py2pack.net.configure(
+        pool_size=pool_size,
+        connect_timeout=py2pack.config.setting(config, 'network', 'connect_timeout', args.connect_timeout, type=float),
+        read_timeout=py2pack.config.setting(config, 'network', 'read_timeout', args.read_timeout, type=float),
+        retries=py2pack.config.setting(config, 'network', 'retries', getattr(args, 'retries', None), type=int),
+        backoff=py2pack.config.setting(config, 'network', 'backoff', type=float))
+
+    py2pack.cache.configure(
+        directory=py2pack.config.setting(config, 'cache', 'directory', args.cache_dir),
+        ttl=py2pack.config.setting(config, 'cache', 'ttl', args.cache_ttl, type=int),
+        max_size=py2pack.config.setting(config, 'cache', 'max_size', type=int),
+        enabled=not args.no_cache and py2pack.config.setting(config, 'cache', 'enabled', default=True, type=bool))
+    py2pack.cache.configure_metadata_cache(
+        directory=py2pack.config.setting(config, 'metadata_cache', 'directory'),
+        max_size=py2pack.config.setting(config, 'metadata_cache', 'max_size', type=int),
+        enabled=py2pack.config.setting(config, 'metadata_cache', 'enabled', default=True, type=bool))
+    py2pack.cache.configure_template_cache(
+        directory=py2pack.config.setting(config, 'template_cache', 'directory'),
+        enabled=py2pack.config.setting(config, 'template_cache', 'enabled', default=True, type=bool))
+    _template_envs.clear()
+    py2pack.buildenv.configure(
+        directory=py2pack.config.setting(config, 'buildenv', 'directory'),
+        max_size=py2pack.config.setting(config, 'buildenv', 'max_size', type=int),
+        offline=py2pack.config.setting(config, 'buildenv', 'offline', getattr(args, 'offline_build', None),
+                                       default=False, type=bool),
+        wheel_dir=py2pack.config.setting(config, 'buildenv', 'wheel_dir', getattr(args, 'wheel_dir', None)),
+        enabled=not getattr(args, 'fresh_build_env', None) and
+        py2pack.config.setting(config, 'buildenv', 'enabled', default=True, type=bool))
+    py2pack.utils.configure(
+        extract_dir=py2pack.config.setting(config, 'extract', 'directory', getattr(args, 'extract_dir', None)))
+    py2pack.index.configure(
+        directory=py2pack.config.setting(config, 'index', 'directory'),
+        max_age=py2pack.config.setting(config, 'index', 'max_age', type=int),
+        url=py2pack.config.setting(config, 'index', 'url', getattr(args, 'index_url', None)))
+    py2pack.store.configure(
+        directory=py2pack.config.setting(config, 'store', 'directory'),
+        max_size=py2pack.config.setting(config, 'store', 'max_size', type=int),
+        enabled=not getattr(args, 'no_store', None) and
+        py2pack.config.setting(config, 'store', 'enabled', default=True, type=bool))
+
+
 def main():
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument('--version', action='version', version='%(prog)s {0}'.format(py2pack_version.version))
     parser.add_argument('--proxy', help='HTTP proxy to use')
+    parser.add_argument('--config', default=None,
+                        help='configuration file (default: {0})'.format(py2pack.config.default_config_file()))
+    parser.add_argument('--pool-size', type=int, default=None, help='HTTP connections kept open per host')
+    parser.add_argument('--connect-timeout', type=float, default=None, help='HTTP connect timeout in seconds')
+    parser.add_argument('--read-timeout', type=float, default=None, help='HTTP read timeout in seconds')
+    parser.add_argument('--retries', type=int, default=None,
+                        help='retries of failed or throttled HTTP requests (default: {0})'.format(
+                            py2pack.net.DEFAULT_RETRIES))
+    parser.add_argument('--index-url', default=None,
+                        help='PyPI compatible index or file:// mirror to get metadata and sdists from '
+                        '(default: {0})'.format(py2pack.index.DEFAULT_INDEX_URL))
+    parser.add_argument('--cache-dir', default=None, help='directory for cached PyPI responses')
+    parser.add_argument('--cache-ttl', type=int, default=None,
+                        help='seconds before cached PyPI responses are revalidated')
+    parser.add_argument('--no-cache', action='store_true', default=None, help='do not cache PyPI responses')
+    parser.add_argument('--no-store', action='store_true', default=None,
+                        help='download sdists into the working directory only, not into the shared store')
     subparsers = parser.add_subparsers(title='commands')
 
     parser_list = subparsers.add_parser('list', help='list all packages on PyPI')
+    parser_list.add_argument('prefix', nargs='?', help='only list packages starting with this prefix')
+    parser_list.add_argument('--refresh', action='store_true', help='update the local package list first')
+    parser_list.add_argument('--offline', action='store_true', help='only use the local package list')
     parser_list.set_defaults(func=list_packages)
 
     parser_search = subparsers.add_parser('search', help='search for packages on PyPI')
-    parser_search.add_argument('name', help='package name (with optional version)')
+    parser_search.add_argument('name', help='package name or words of its summary')
+    parser_search.add_argument('-l', '--limit', type=int, default=py2pack.index.DEFAULT_SEARCH_LIMIT,
+                               help='maximum number of results')
+    parser_search.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser_search.add_argument('--refresh', action='store_true', help='update the local package list first')
+    parser_search.add_argument('--offline', action='store_true', help='only use the local package list')
     parser_search.set_defaults(func=search)
 
     parser_show = subparsers.add_parser('show', help='show metadata for package')
@@ -502,22 +996,68 @@ def main():
     parser_generate.add_argument('--source-glob', help='source glob template')
     parser_generate.add_argument('--local', action='store_true', help='build from local package')
     parser_generate.add_argument('--localfile', default='', help='path to the local PKG-INFO or json metadata')
-    parser_generate.add_argument('-t', '--template', choices=file_template_list(), default='opensuse.spec', help='file template')
+    parser_generate.add_argument('-t', '--template', action='append', choices=_TemplateChoices(), metavar='TEMPLATE',
+                                 help='file template (%(choices)s), can be given several times or as "all" for '
+                                 'all templates (default: {0})'.format(DEFAULT_TEMPLATE))
     parser_generate.add_argument('-f', '--filename', help='spec filename (optional)')
+    parser_generate.add_argument('--stdout', action='store_true', help='write the result to stdout, not to a file')
+    parser_generate.add_argument('--force', action='store_true',
+                                 help='write the file even if its template and metadata did not change')
+    parser_generate.add_argument('--metadata', choices=['auto', 'static', 'build'], default='auto',
+                                 help='for non-setuptools sdists: use the static PKG-INFO, build the '
+                                 'metadata, or build only when PKG-INFO has dynamic fields (default)')
+    parser_generate.add_argument('--no-metadata-cache', action='store_true',
+                                 help='always inspect the tarball, do not use cached results')
+    parser_generate.add_argument('--fresh-build-env', action='store_true', default=None,
+                                 help='build metadata in a new environment instead of a pooled one')
+    parser_generate.add_argument('--offline-build', action='store_true', default=None,
+                                 help='only install build requirements from --wheel-dir')
+    parser_generate.add_argument('--wheel-dir', default=None, help='directory with wheels for build environments')
+    parser_generate.add_argument('--extract-dir', default=None,
+                                 help='directory to unpack sdists in, e.g. a tmpfs like /dev/shm')
     # TODO (toabctl): remove this is a later release
     parser_generate.add_argument(
         '-r', '--run', action='store_true',
         help='DEPRECATED and noop. will be removed in future releases!')
     parser_generate.set_defaults(func=generate)
 
+    parser_batch = subparsers.add_parser('generate-batch', help='generate spec files for many packages')
+    parser_batch.add_argument('file', nargs='?', default='-',
+                              help='file with one name[==version] per line (default: stdin)')
+    parser_batch.add_argument('-t', '--template', action='append', choices=_TemplateChoices(), metavar='TEMPLATE',
+                              help='file template (%(choices)s), see generate --template')
+    parser_batch.add_argument('-d', '--directory', default='.', help='directory for the sdists and spec files')
+    parser_batch.add_argument('-j', '--jobs', type=int, default=py2pack.batch.DEFAULT_JOBS,
+                              help='packages handled at once')
+    parser_batch.add_argument('-p', '--processes', type=int, default=os.cpu_count(),
+                              help='processes inspecting sdists, 0 inspects them in the worker threads')
+    parser_batch.add_argument('--metadata', choices=['auto', 'static', 'build'], default='auto',
+                              help='see generate --metadata')
+    parser_batch.add_argument('--no-metadata-cache', action='store_true',
+                              help='always inspect the tarballs, do not use cached results')
+    parser_batch.add_argument('--force', action='store_true',
+                              help='write all files, also those whose template and metadata did not change')
+    parser_batch.add_argument('--stats', action='store_true',
+                              help='print the throughput and queue sizes of the pipeline stages')
+    parser_batch.set_defaults(func=py2pack.batch.generate_batch)
+
+    parser_update = subparsers.add_parser('update', help='update spec files to the latest release of their package')
+    parser_update.add_argument('specfile', nargs='+', help='spec file to update in place')
+    parser_update.add_argument('--version', default=None, help='update to this release instead of the latest one')
+    parser_update.add_argument('-j', '--jobs', type=int, default=py2pack.update.DEFAULT_JOBS,
+                               help='spec files updated at once')
+    parser_update.set_defaults(func=py2pack.update.update)
+
     parser_help = subparsers.add_parser('help', help='show this help')
     parser_help.set_defaults(func=lambda args: parser.print_help())
 
     args = parser.parse_args()
 
+    _configure(args)
+
     # set HTTP proxy if one is provided
     if args.proxy:
-        with requests.get(args.proxy) as r:
+        with py2pack.net.get(args.proxy) as r:
             if not r.ok:
                 print('the proxy \'{0}\' is not responding'.format(args.proxy))
                 sys.exit(1)
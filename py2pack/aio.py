@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""asyncio client for the package index.
+
+This module needs aiohttp (``pip install py2pack[async]``). It provides
+coroutine versions of pypi_json(), fetch() and list_packages(), which
+can keep many requests in flight from a single thread, e.g.::
+
+    async with py2pack.aio.Client(per_host=16) as client:
+        metadata = await asyncio.gather(*(client.pypi_json(n) for n in names))
+
+The number of connections per host is limited. Further requests wait
+for a free connection. Below that, an adaptive limit per host lowers the
+concurrency while the server throttles. Failed requests are retried with
+backoff. Responses go through the same HTTP cache, and downloads resume
+and verify like the synchronous functions. Timeouts and retries are the
+ones set with py2pack.net.configure(). Blocking file work (the HTTP
+cache, reading and writing files, hashing partial downloads, storing the
+project list) runs in the default executor, so it does not stall the
+other requests.
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import urllib.parse
+
+import aiohttp
+
+import py2pack
+import py2pack.cache
+import py2pack.index
+import py2pack.net
+from py2pack.utils import json_select
+
+DEFAULT_PER_HOST = 10
+# connections over all hosts, 0 for no limit
+DEFAULT_LIMIT = 100
+
+
+async def _run(func, *args):
+    # blocking file work, off the event loop
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args))
+
+
+class AdaptiveLimit(py2pack.net.AIMDLimit):
+    """py2pack.net.AIMDLimit for coroutines"""
+
+    def __init__(self, *args, **kwargs):
+        super(AdaptiveLimit, self).__init__(*args, **kwargs)
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(self._allowed)
+            self.in_use += 1
+
+    async def release(self, throttled=False):
+        async with self._cond:
+            self.in_use -= 1
+            self._update(throttled)
+            self._cond.notify_all()
+
+
+class _FileResponse(object):
+    """The parts of aiohttp.ClientResponse used here, for file:// URLs"""
+
+    def __init__(self, url, accept=None):
+        self.url = url
+        self.path, content_type = py2pack.net.file_url_path(url, accept)
+        self.status = 404 if self.path is None else 200
+        self.headers = {'Content-Type': content_type} if content_type else {}
+        self.content = self
+
+    async def read(self):
+        if self.path is None:
+            return b''
+        return await _run(self._read)
+
+    def _read(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    async def iter_chunked(self, size):
+        f = await _run(open, self.path, 'rb')
+        try:
+            while True:
+                chunk = await _run(f.read, size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            await _run(f.close)
+
+    def raise_for_status(self):
+        if self.path is None:
+            raise FileNotFoundError("'{0}' does not exist".format(self.url))
+
+    def release(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+class Client(object):
+    def __init__(self, per_host=DEFAULT_PER_HOST, limit=DEFAULT_LIMIT):
+        self.per_host = per_host
+        self.limit = limit
+        self._session = None
+        self._limits = {}
+
+    async def __aenter__(self):
+        connect_timeout, read_timeout = py2pack.net.get_timeout()
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.per_host),
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+            # the proxy from the environment, like requests
+            trust_env=True)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def host_limit(self, url):
+        """Return the AdaptiveLimit for the host of url"""
+        host = urllib.parse.urlsplit(url).netloc
+        if host not in self._limits:
+            self._limits[host] = AdaptiveLimit(self.per_host)
+        return self._limits[host]
+
+    async def get(self, url, headers=None):
+        """GET url with retries like py2pack.net.get().
+
+        Returns the aiohttp response, use it with "async with".
+        """
+        if url.startswith('file:'):
+            return _FileResponse(url, (headers or {}).get('Accept'))
+        retries, _ = py2pack.net.get_retries()
+        limit = self.host_limit(url)
+        attempt = 0
+        while True:
+            await limit.acquire()
+            throttled = False
+            try:
+                r = await self._session.get(url, headers=headers)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                throttled = True
+                if attempt >= retries:
+                    raise
+                delay = py2pack.net.backoff_delay(attempt)
+            else:
+                throttled = r.status in py2pack.net.THROTTLE_STATUSES
+                if r.status not in py2pack.net.RETRY_STATUSES or attempt >= retries:
+                    return r
+                delay = py2pack.net.backoff_delay(attempt, r.headers)
+                r.release()
+            finally:
+                await limit.release(throttled)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def cached_get(self, url, immutable=False, accept=None):
+        """Like py2pack.cache.cached_get()"""
+        key, entry, headers = await _run(py2pack.cache.lookup, url, accept)
+        if headers is None:
+            return entry.body
+        async with await self.get(url, headers) as r:
+            body = await r.read()
+            return await _run(py2pack.cache.store, key, entry, r.status, r.headers, body, immutable)
+
+    async def pypi_latest_version(self, project):
+        """Like py2pack.pypi_latest_version()"""
+        url = py2pack.index.index_url('simple/{}/'.format(project))
+        try:
+            simple = json.loads(await self.cached_get(url, accept=py2pack.index.SIMPLE_JSON))
+        except ValueError:
+            return None
+        return py2pack._latest_version(simple)
+
+    async def pypi_json(self, project, release=None):
+        """Like py2pack.pypi_json()"""
+        if not release:
+            release = await self.pypi_latest_version(project)
+        url = py2pack._pypi_json_url(project, release)
+        if not release:
+            body = await self.cached_get(url)
+            return py2pack._absolute_urls(json_select(body.decode('utf-8'), ['info', 'urls', 'message']), url)
+        return py2pack._absolute_urls(json.loads(await self.cached_get(url, immutable=True)), url)
+
+    async def download(self, url, filename, sha256=None):
+        """Like py2pack.net.download(), returns the hex sha256 digest of the file
+
+        Raises:
+            ValueError: when the downloaded data does not match sha256
+            aiohttp.ClientResponseError: when the server responds with an error
+        """
+        partname = filename + '.part'
+        digest, offset = await _run(py2pack.net.resume_state, partname)
+        headers = {'Range': 'bytes={0}-'.format(offset)} if offset else {}
+        async with await self.get(url, headers) as r:
+            if offset and r.status == 416:
+                # the partial file is no prefix of the remote file, start over
+                os.unlink(partname)
+                return await self.download(url, filename, sha256)
+            r.raise_for_status()
+            if r.status != 206:
+                # range not supported, the server sends the whole file
+                digest = hashlib.sha256()
+                offset = 0
+            f = await _run(open, partname, 'ab' if offset else 'wb')
+            try:
+                async for chunk in r.content.iter_chunked(py2pack.net.DOWNLOAD_CHUNK_SIZE):
+                    digest.update(chunk)
+                    await _run(f.write, chunk)
+            finally:
+                await _run(f.close)
+        return await _run(py2pack.net.finish_download, url, partname, filename, digest, sha256)
+
+    async def fetch(self, project, version=None, directory='.'):
+        """Download the sdist of a release (the latest if version is None)
+
+        Returns:
+            the name of the downloaded file
+
+        Raises:
+            ValueError: when there is no release or no source release
+        """
+        fetched_data = await self.pypi_json(project, version)
+        if not fetched_data.get('urls'):
+            raise ValueError("unable to find a suitable release for {0}".format(project))
+        url = py2pack._newest_download_url(project, fetched_data)
+        if not url:
+            raise ValueError("unable to find a source release for {0}".format(project))
+        filename = os.path.join(directory, url['filename'])
+        await self.download(url['fetch_url'], filename, sha256=url.get('digests', {}).get('sha256'))
+        return filename
+
+    async def refresh_index(self, directory=None, url=None):
+        """Like py2pack.index.refresh()"""
+        state, headers = await _run(py2pack.index._refresh_request, directory)
+        async with await self.get(url or py2pack.index.index_url('simple/'), headers) as r:
+            unchanged = py2pack.index._is_unchanged(state, r.status, r.headers)
+            if not unchanged:
+                r.raise_for_status()
+                parser = py2pack.index._NameParser(r.headers.get('Content-Type', ''))
+                names = []
+                async for chunk in r.content.iter_chunked(py2pack.index.CHUNK_SIZE):
+                    names.extend(parser.feed(chunk))
+                state = await _run(py2pack.index._store_names, directory, names, r.headers)
+        await _run(py2pack.index._save_state, directory, state)
+        return not unchanged
+
+    async def list_packages(self, prefix=None, refresh=False, directory=None):
+        """Return the names of all projects on the index starting with prefix.
+
+        The local project list is refreshed first if it is stale (or with
+        refresh).
+        """
+        if refresh or await _run(py2pack.index.is_stale, directory):
+            await self.refresh_index(directory)
+        return py2pack.index.search_prefix(await _run(py2pack.index.load, directory), prefix)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Library interface of py2pack.
+
+Unlike the command line functions, these take all inputs as arguments
+and return the result instead of writing files, reading the working
+directory or printing. They do not change global state and can be called
+from several threads at once, e.g.::
+
+    with concurrent.futures.ThreadPoolExecutor() as pool:
+        specs = pool.map(lambda n: generate_spec(n, None, 'opensuse.spec'), names)
+
+The network, cache and build environment settings are the ones set with
+the configure() functions of the py2pack.net, py2pack.cache and
+py2pack.buildenv modules.
+"""
+
+import argparse
+import copy
+from typing import Optional  # noqa: F401, pylint: disable=unused-import
+
+import py2pack
+
+
+def generate_spec(name, version=None, template='opensuse.spec', archive=None, metadata=None,
+                  source_url=None, metadata_source='auto', metadata_cache=True):
+    # type: (str, Optional[str], str, Optional[str], Optional[dict], Optional[str], str, bool) -> str
+    """Generate a spec (or other template) for a package.
+
+    Args:
+        name: project name on PyPI
+        version: release, the latest one if None
+        template: name of a py2pack template, see py2pack.file_template_list()
+        archive: path of the sdist to take additional metadata from.
+            Without it, the result only uses the PyPI metadata.
+        metadata: PyPI JSON metadata of the release (a dict with 'info'
+            and 'urls') to use instead of fetching it. It is not modified.
+        source_url: Source URL for the spec instead of the PyPI one
+        metadata_source: 'auto', 'static' or 'build', like generate --metadata
+        metadata_cache: use the metadata cache for archive
+
+    Returns:
+        the rendered template
+
+    Raises:
+        ValueError: when PyPI has no release files for the package
+        jinja2.TemplateNotFound: for an unknown template
+    """
+    if metadata is None:
+        metadata = py2pack.pypi_json(name, version)
+        if not metadata.get('urls'):
+            raise ValueError("unable to find a suitable release for {0}".format(name))
+    metadata = copy.deepcopy(metadata)
+    options = argparse.Namespace(
+        name=name, version=metadata['info'].get('version') or version, source_url=source_url,
+        metadata=metadata_source, no_metadata_cache=not metadata_cache, quiet=True)
+    data = py2pack.spec_data(options, metadata, archive)
+    return py2pack.render_template(template, data)
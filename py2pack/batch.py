@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Generate specs for many packages in one run.
+
+The work is split into pipeline stages connected by bounded queues:
+
+fetch
+    worker threads get the metadata from PyPI and download the sdist,
+    so the network waits of different packages overlap
+inspect
+    the sdists are inspected in a pool of processes, since this is mostly
+    CPU bound (decompression, running setup.py or a build backend). The
+    result is small and JSON serializable, which keeps the data sent
+    between the processes small too.
+render
+    threads render the templates and write the spec files. The metadata
+    is computed once and used for all templates given with -t. Files
+    whose template and metadata did not change are not written again,
+    see py2pack.write_template_if_changed().
+
+While package N is inspected, package N+1 is already downloaded. When a
+stage is slower than the one before, its queue fills up and the earlier
+stage waits, so the number of packages in flight (and the memory they
+need) stays bounded.
+"""
+
+import argparse
+import functools
+import os
+import queue
+import sys
+import threading
+import time
+
+import py2pack
+import py2pack.net
+import py2pack.store
+
+DEFAULT_JOBS = 8
+RENDER_WORKERS = 2
+
+# end of the input of a stage
+_DONE = object()
+
+
+class Job(object):
+    """A package on its way through the pipeline"""
+
+    def __init__(self, name, version=None):
+        self.name = name
+        self.version = version
+        self.options = None
+        self.fetched_data = None
+        self.tarball_file = None
+        self.tarball = None
+        self.filenames = []  # written
+        self.unchanged = []  # skipped, their inputs did not change
+        self.error = None  # the exception of the failed stage
+        self.start = time.monotonic()
+        self.seconds = None
+
+
+class Stage(object):
+    """Worker threads calling func for the jobs from a bounded queue.
+
+    A job is passed on to the next stage afterwards; jobs which failed in
+    an earlier stage are passed on without calling func.
+    """
+
+    def __init__(self, name, func, workers, maxsize=None):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue = queue.Queue(maxsize or 2 * workers)
+        self.processed = 0
+        self.busy = 0.0  # seconds spent in func, summed over the workers
+        self.max_depth = 0
+        self._lock = threading.Lock()
+        self._running = 0
+        self._started = None
+
+    @property
+    def depth(self):
+        """Number of jobs waiting for this stage"""
+        return self.queue.qsize()
+
+    def throughput(self):
+        """Jobs per second since the stage started"""
+        if self._started is None:
+            return 0.0
+        elapsed = time.monotonic() - self._started
+        return self.processed / elapsed if elapsed else 0.0
+
+    def put(self, job):
+        """Queue a job, blocks while the queue is full"""
+        self.queue.put(job)
+        with self._lock:
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def close(self):
+        """Signal the end of the input, the workers exit once the queue is empty"""
+        for _ in range(self.workers):
+            self.queue.put(_DONE)
+
+    def start(self, output):
+        """Start the workers. output gets the processed jobs (put()) and
+        is closed (close()) after the last one."""
+        self._started = time.monotonic()
+        self._running = self.workers
+        for i in range(self.workers):
+            threading.Thread(target=self._work, args=(output,), daemon=True,
+                             name='py2pack-{0}-{1}'.format(self.name, i)).start()
+
+    def _work(self, output):
+        while True:
+            job = self.queue.get()
+            if job is _DONE:
+                break
+            if job.error is None:
+                start = time.monotonic()
+                try:
+                    self.func(job)
+                except Exception as exc:
+                    job.error = exc
+                with self._lock:
+                    self.processed += 1
+                    self.busy += time.monotonic() - start
+            output.put(job)
+        with self._lock:
+            self._running -= 1
+            last = self._running == 0
+        if last:
+            output.close()
+
+
+class _Results(queue.Queue):
+    # output of the last stage
+    def close(self):
+        self.put(_DONE)
+
+
+class Pipeline(object):
+    def __init__(self, stages):
+        self.stages = stages
+
+    def run(self, jobs):
+        """Feed jobs into the first stage and yield them as they leave the last one"""
+        results = _Results()
+        for stage, output in zip(self.stages, self.stages[1:] + [results]):
+            stage.start(output)
+
+        def feed():
+            for job in jobs:
+                self.stages[0].put(job)
+            self.stages[0].close()
+
+        threading.Thread(target=feed, daemon=True, name='py2pack-feed').start()
+        while True:
+            job = results.get()
+            if job is _DONE:
+                return
+            yield job
+
+    def stats(self):
+        """Return name, queue depth, processed jobs and throughput of the stages"""
+        return [{'name': s.name, 'depth': s.depth, 'max_depth': s.max_depth,
+                 'processed': s.processed, 'throughput': s.throughput(), 'busy': s.busy}
+                for s in self.stages]
+
+
+def parse_entries(lines):
+    """Return (name, version) tuples for lines of 'name[==version]'.
+
+    version is None if the line has no ==. Empty lines and comments
+    starting with # are skipped.
+    """
+    entries = []
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        name, _, version = line.partition('==')
+        entries.append((name.strip(), version.strip() or None))
+    return entries
+
+
+def _inspect(options, filename):
+    # runs in the process pool
+    return py2pack._inspect_tarball_cached(options, filename)
+
+
+def _mp_context():
+    # worker threads already run when the pool starts processes, so do
+    # not fork them. The processes are set up with _configure() instead.
+    import multiprocessing
+
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def _fetch(args, job):
+    job.fetched_data = py2pack.pypi_json(job.name, job.version)
+    if not job.fetched_data.get('urls'):
+        raise ValueError("unable to find a suitable release")
+    job.version = job.fetched_data['info']['version']
+    job.options = argparse.Namespace(
+        name=job.name, version=job.version, source_url=None,
+        metadata=args.metadata, no_metadata_cache=args.no_metadata_cache, quiet=True)
+    url = py2pack._newest_download_url(job.name, job.fetched_data)
+    if url:
+        job.tarball_file = os.path.join(args.directory, url['filename'])
+        if not os.path.exists(job.tarball_file):
+            sha256 = url.get('digests', {}).get('sha256')
+            store = py2pack.store.get_store()
+            if store is None:
+                py2pack.net.download(url['fetch_url'], job.tarball_file, sha256=sha256)
+            else:
+                store.checkout(store.fetch(url['fetch_url'], url['filename'], job.name, job.version,
+                                           sha256=sha256), job.tarball_file)
+
+
+def _inspect_job(inspector, job):
+    if job.tarball_file is None:
+        return
+    if inspector is None:
+        job.tarball = _inspect(job.options, job.tarball_file)
+    else:
+        job.tarball = inspector.submit(_inspect, job.options, job.tarball_file).result()
+
+
+def _render(args, job):
+    data = py2pack.spec_data(job.options, job.fetched_data, job.tarball_file, job.tarball)
+    templates = py2pack.template_names(args.template)
+    job.filenames = []
+    job.unchanged = []
+    for template in templates:
+        filename = os.path.join(args.directory,
+                                py2pack.output_filename(job.name, template, several=len(templates) > 1))
+        if py2pack.write_template_if_changed(template, data, filename, force=getattr(args, 'force', False)):
+            job.filenames.append(filename)
+        else:
+            job.unchanged.append(filename)
+    # done with the data, do not keep it until the job is reported
+    job.fetched_data = job.tarball = None
+
+
+def make_pipeline(args, inspector=None):
+    """The fetch, inspect and render stages for the options of generate-batch"""
+    return Pipeline([
+        Stage('fetch', functools.partial(_fetch, args), args.jobs),
+        Stage('inspect', functools.partial(_inspect_job, inspector), args.processes or args.jobs),
+        Stage('render', functools.partial(_render, args), RENDER_WORKERS),
+    ])
+
+
+def generate_batch(args):
+    if args.file in (None, '-'):
+        entries = parse_entries(sys.stdin)
+    else:
+        with open(args.file) as f:
+            entries = parse_entries(f)
+    os.makedirs(args.directory, exist_ok=True)
+
+    start = time.monotonic()
+    failed = unchanged = 0
+    inspector = None
+    if args.processes:
+        import concurrent.futures
+
+        inspector = concurrent.futures.ProcessPoolExecutor(
+            max_workers=args.processes, mp_context=_mp_context(),
+            initializer=py2pack._configure, initargs=(args,))
+    pipeline = make_pipeline(args, inspector)
+    try:
+        for job in pipeline.run(Job(name, version) for name, version in entries):
+            job.seconds = time.monotonic() - job.start
+            if job.error:
+                failed += 1
+                print('failed    {0}: {1}'.format(job.name, job.error))
+            elif job.filenames:
+                print('generated {0} {1} ({2:.1f}s)'.format(', '.join(job.filenames), job.version, job.seconds))
+            else:
+                unchanged += 1
+                print('unchanged {0} {1}'.format(', '.join(job.unchanged), job.version))
+    finally:
+        if inspector is not None:
+            inspector.shutdown()
+    print('{0} generated, {1} unchanged, {2} failed in {3:.1f}s'.format(
+        len(entries) - failed - unchanged, unchanged, failed, time.monotonic() - start))
+    if getattr(args, 'stats', False):
+        for stage in pipeline.stats():
+            print('{name:8} {processed} done, {throughput:.2f}/s, busy {busy:.1f}s, '
+                  'max queue {max_depth}'.format(**stage))
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pool of persistent build environments for metadata builds.
+
+build.util.project_wheel_metadata(isolated=True) creates a new virtual
+environment and installs the build backend into it for every package.
+Most packages share a handful of backends, so the environments here are
+kept between packages and runs, one per normalized set of
+build-system.requires. A file lock per environment keeps concurrent
+py2pack processes from installing into an environment while another one
+uses it. The requirements a package asks for with
+get_requires_for_build_wheel go into a temporary overlay for that build
+only, so the pooled environments never change once created. Least
+recently used environments are removed once the pool grows beyond its
+size limit.
+"""
+
+import fcntl
+import hashlib
+import os
+import pathlib
+import shutil
+import subprocess
+import sys
+import sysconfig
+import tempfile
+from contextlib import contextmanager
+
+import platformdirs
+
+import py2pack.utils
+
+DEFAULT_MAX_SIZE = 2 * 1024 * 1024 * 1024  # bytes
+# pip can install into another environment with --python since 22.3
+PIP_PYTHON_OPTION_VERSION = '22.3'
+
+
+def default_pool_dir():
+    return os.path.join(platformdirs.user_cache_dir(appname="py2pack"), "buildenv")
+
+
+def normalize_requires(requires):
+    """Return a canonical, sorted tuple of the requirement strings"""
+    from packaging.requirements import InvalidRequirement, Requirement
+    from packaging.utils import canonicalize_name
+
+    normalized = set()
+    for r in requires:
+        try:
+            req = Requirement(r)
+        except InvalidRequirement:
+            normalized.add(r.strip())
+            continue
+        req.name = canonicalize_name(req.name)
+        normalized.add(str(req))
+    return tuple(sorted(normalized))
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.lstat(os.path.join(root, f)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class BuildEnv(object):
+    """A virtual environment of the pool.
+
+    Provides python_executable and make_extra_environ() like the
+    IsolatedEnv of build. overlay is a directory with additional packages
+    which is put in front of the environment on PYTHONPATH.
+    """
+
+    def __init__(self, path, offline=False, wheel_dir=None, overlay=None):
+        self.path = path
+        self.offline = offline
+        self.wheel_dir = wheel_dir
+        self.overlay = overlay
+
+    @property
+    def bin_dir(self):
+        return os.path.join(self.path, 'Scripts' if os.name == 'nt' else 'bin')
+
+    @property
+    def python_executable(self):
+        return os.path.join(self.bin_dir, 'python.exe' if os.name == 'nt' else 'python')
+
+    @property
+    def purelib(self):
+        return sysconfig.get_path('purelib', vars={'base': self.path, 'platbase': self.path})
+
+    def make_extra_environ(self):
+        return {'PATH': os.pathsep.join([self.bin_dir, os.environ.get('PATH', '')]),
+                'PYTHONPATH': self.overlay or ''}
+
+    def create(self):
+        import venv
+
+        venv.EnvBuilder(with_pip=False, symlinks=os.name != 'nt').create(self.path)
+
+    def _pip(self):
+        from packaging.version import Version
+
+        try:
+            from pip import __version__ as pip_version
+            if Version(pip_version) >= Version(PIP_PYTHON_OPTION_VERSION):
+                return [sys.executable, '-m', 'pip', '--python', self.python_executable]
+        except ImportError:
+            pass
+        if not os.path.exists(os.path.join(self.purelib, 'pip')):
+            subprocess.check_call([self.python_executable, '-Im', 'ensurepip', '--default-pip'],
+                                  stdout=subprocess.DEVNULL)
+        return [self.python_executable, '-Im', 'pip']
+
+    def missing(self, requirements):
+        """Return the requirements not satisfied by the environment"""
+        from importlib import metadata as importlib_metadata
+
+        from packaging.requirements import InvalidRequirement, Requirement
+        from packaging.utils import canonicalize_name
+
+        paths = [self.overlay, self.purelib] if self.overlay else [self.purelib]
+        installed = {}
+        for d in importlib_metadata.distributions(path=paths):
+            if d.metadata['Name']:
+                # the first one found on the path is the one imported
+                installed.setdefault(canonicalize_name(d.metadata['Name']), d.version)
+        missing = []
+        for r in requirements:
+            try:
+                req = Requirement(r)
+            except InvalidRequirement:
+                missing.append(r)
+                continue
+            if req.marker and not req.marker.evaluate():
+                continue
+            version = installed.get(canonicalize_name(req.name))
+            if version is None or not req.specifier.contains(version, prereleases=True):
+                missing.append(r)
+        return missing
+
+    def install(self, requirements, target=None):
+        """Install requirements into the environment, or into the directory
+        target (with all their dependencies) to leave the environment as it is"""
+        if not requirements:
+            return
+        cmd = self._pip() + ['install', '--no-input', '--disable-pip-version-check',
+                             '--no-warn-script-location', '--no-compile']
+        if target:
+            cmd += ['--target', target]
+        if self.offline:
+            cmd += ['--no-index']
+        if self.wheel_dir:
+            cmd += ['--find-links', self.wheel_dir]
+        # pip evaluates environment markers only in requirement files
+        with tempfile.NamedTemporaryFile('w', prefix='py2pack-requirements-', suffix='.txt') as f:
+            f.write('\n'.join(requirements))
+            f.flush()
+            subprocess.check_output(cmd + ['-r', f.name], stderr=subprocess.STDOUT)
+
+    def runner(self, cmd, cwd=None, extra_environ=None):
+        """subprocess runner for pyproject_hooks running inside this environment"""
+        import pyproject_hooks
+
+        env = dict(extra_environ or {})
+        env.update(self.make_extra_environ())
+        pyproject_hooks.quiet_subprocess_runner(cmd, cwd=cwd, extra_environ=env)
+
+
+class BuildEnvPool(object):
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE, offline=False, wheel_dir=None):
+        self.directory = directory or default_pool_dir()
+        self.max_size = max_size
+        self.offline = offline
+        self.wheel_dir = wheel_dir
+
+    @staticmethod
+    def key(requires):
+        # environments are only usable with the interpreter they were created for
+        key = '\n'.join((os.path.realpath(sys.executable),) + normalize_requires(requires))
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+    @contextmanager
+    def env(self, requires):
+        """Yield a BuildEnv with requires installed.
+
+        The environment is created on first use. While it is in use, it is
+        locked shared, so any number of builds use it at once; only its
+        creation locks it exclusively.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        key = self.key(requires)
+        path = os.path.join(self.directory, key)
+        env = BuildEnv(path, offline=self.offline, wheel_dir=self.wheel_dir)
+        stamp = os.path.join(path, 'py2pack-requires.txt')
+        created = False
+        with py2pack.utils.file_lock(path + '.lock', fcntl.LOCK_SH) as lock:
+            if not os.path.exists(stamp):
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                # another process may have created it meanwhile
+                if not os.path.exists(stamp):
+                    shutil.rmtree(path, ignore_errors=True)
+                    env.create()
+                    env.install(list(requires))
+                    with open(stamp, 'w') as f:
+                        f.write('\n'.join(normalize_requires(requires)) + '\n')
+                    created = True
+                fcntl.flock(lock, fcntl.LOCK_SH)
+            # mark as recently used for the eviction
+            os.utime(stamp)
+            yield env
+        if created:
+            self.evict()
+
+    @contextmanager
+    def overlay(self, env, requirements):
+        """Yield a BuildEnv for env with the requirements the backend asked
+        for installed.
+
+        Other builds may use the pooled environment meanwhile, and other
+        packages may need other versions of the same requirements, so the
+        missing ones are installed into a temporary overlay for this build
+        only. The pooled environment is not changed.
+        """
+        missing = env.missing(requirements)
+        if not missing:
+            yield env
+            return
+        with tempfile.TemporaryDirectory(prefix='py2pack-overlay-') as overlay:
+            env.install(missing, target=overlay)
+            yield BuildEnv(env.path, offline=env.offline, wheel_dir=env.wheel_dir, overlay=overlay)
+
+    def evict(self, max_size=None):
+        """Remove least recently used environments until the pool fits max_size"""
+        max_size = self.max_size if max_size is None else max_size
+        envs = []
+        for entry in os.scandir(self.directory):
+            stamp = os.path.join(entry.path, 'py2pack-requires.txt')
+            try:
+                if entry.is_dir():
+                    envs.append((os.path.getmtime(stamp), _dir_size(entry.path), entry.path))
+            except FileNotFoundError:
+                # being created or removed by another process
+                continue
+
+        def remove(path):
+            with open(path + '.lock', 'a') as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # in use by another process
+                    return False
+                shutil.rmtree(path, ignore_errors=True)
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        py2pack.utils.evict_lru(envs, max_size, remove)
+
+
+_pool = None
+_enabled = True
+
+
+def configure(directory=None, max_size=None, offline=False, wheel_dir=None, enabled=True):
+    """Set up the pool used by project_wheel_metadata()"""
+    global _pool, _enabled
+    _enabled = enabled
+    _pool = BuildEnvPool(directory=directory,
+                         max_size=DEFAULT_MAX_SIZE if max_size is None else max_size,
+                         offline=offline, wheel_dir=wheel_dir)
+
+
+def get_pool():
+    """Return the configured BuildEnvPool or None if pooling is disabled"""
+    global _pool
+    if not _enabled:
+        return None
+    if _pool is None:
+        _pool = BuildEnvPool()
+    return _pool
+
+
+def project_wheel_metadata(source_dir, pool=None):
+    """Like build.util.project_wheel_metadata(source_dir, isolated=True), but
+    with a build environment from the pool"""
+    from importlib import metadata as importlib_metadata
+
+    from build import ProjectBuilder
+
+    pool = pool or get_pool()
+    builder = ProjectBuilder(source_dir)
+    with pool.env(builder.build_system_requires) as env:
+        builder = ProjectBuilder(source_dir, python_executable=env.python_executable,
+                                 runner=env.runner)
+        with pool.overlay(env, builder.get_requires_for_build('wheel')) as build_env:
+            builder = ProjectBuilder(source_dir, python_executable=build_env.python_executable,
+                                     runner=build_env.runner)
+            with tempfile.TemporaryDirectory() as tmpdir:
+                path = pathlib.Path(builder.metadata_path(tmpdir))
+                return importlib_metadata.PathDistribution(path).metadata
@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Persistent on-disk cache for HTTP responses.
+
+Every entry is a single file: a JSON header line holding the validators
+(ETag, Last-Modified) and the time it was stored, followed by the raw
+response body. Entries are written to a temporary file and atomically
+renamed into place, so several py2pack processes can share one cache
+directory without locking. The least recently used entries are evicted
+once the cache grows beyond its size limit.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+import platformdirs
+
+import py2pack.net
+import py2pack.version
+from py2pack.utils import evict_lru
+
+DEFAULT_TTL = 3600  # seconds
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024  # bytes
+# scanning the whole cache for eviction is not free, only do it every so often
+EVICT_INTERVAL = 64
+
+
+def default_cache_dir():
+    return os.path.join(platformdirs.user_cache_dir(appname="py2pack"), "http")
+
+
+def default_metadata_cache_dir():
+    return os.path.join(platformdirs.user_cache_dir(appname="py2pack"), "metadata")
+
+
+def default_template_cache_dir():
+    return os.path.join(platformdirs.user_cache_dir(appname="py2pack"), "templates")
+
+
+class CacheEntry(namedtuple('CacheEntry', ['meta', 'body'])):
+    """A cached response: header dict and body bytes."""
+
+    def is_fresh(self, ttl):
+        if self.meta.get('immutable'):
+            return True
+        return time.time() - self.meta.get('stored', 0) < ttl
+
+    def validators(self):
+        """conditional request headers to revalidate this entry"""
+        headers = {}
+        if self.meta.get('etag'):
+            headers['If-None-Match'] = self.meta['etag']
+        if self.meta.get('last_modified'):
+            headers['If-Modified-Since'] = self.meta['last_modified']
+        return headers
+
+
+class HTTPCache(object):
+    def __init__(self, directory=None, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory or default_cache_dir()
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _path(self, url):
+        key = self.key(url)
+        return os.path.join(self.directory, key[:2], key)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline().decode('utf-8'))
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        return CacheEntry(meta, body)
+
+    def get(self, url):
+        """Return the CacheEntry for url or None"""
+        path = self._path(url)
+        entry = self._read(path)
+        if entry is None or entry.meta.get('url') != url:
+            return None
+        try:
+            # mark as recently used for the LRU eviction
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def set(self, url, body, headers=None, immutable=False):
+        headers = headers or {}
+        meta = {
+            'url': url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'stored': time.time(),
+            'immutable': immutable,
+        }
+        self._write(url, meta, body)
+        return CacheEntry(meta, body)
+
+    def refresh(self, entry):
+        """Mark a revalidated entry as fresh again"""
+        meta = dict(entry.meta, stored=time.time())
+        self._write(meta['url'], meta, entry.body)
+        return CacheEntry(meta, entry.body)
+
+    def _write(self, url, meta, body):
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json.dumps(meta).encode('utf-8') + b'\n')
+                f.write(body)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % EVICT_INTERVAL == 1
+        if evict:
+            self.evict()
+
+    def _entries(self):
+        try:
+            shards = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith('.tmp-'):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    # removed by a concurrent process
+                    continue
+                yield st.st_mtime, st.st_size, entry.path
+
+    def entries(self):
+        """Iterate over all CacheEntry objects in the cache"""
+        for _, _, path in self._entries():
+            entry = self._read(path)
+            if entry is not None:
+                yield entry
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, max_size=None):
+        """Remove least recently used entries until the cache fits max_size"""
+        max_size = self.max_size if max_size is None else max_size
+
+        def remove(path):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+        evict_lru(self._entries(), max_size, remove)
+
+    def clear(self):
+        self.evict(max_size=0)
+
+
+class MetadataCache(object):
+    """Cache for the metadata py2pack extracts from sdists.
+
+    Entries are keyed by the sha256 of the archive, the py2pack and python
+    versions and the options which influence the result, so they never
+    need revalidation. Hits and misses are counted.
+    """
+
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self._store = HTTPCache(directory or default_metadata_cache_dir(), max_size=max_size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(sha256, **options):
+        parts = ['sha256:' + sha256,
+                 'py2pack:' + py2pack.version.version,
+                 'python:{0}.{1}'.format(*sys.version_info[:2])]
+        parts += ['{0}:{1}'.format(k, v) for k, v in sorted(options.items())]
+        return '|'.join(parts)
+
+    def get(self, key):
+        """Return the cached value for key or None"""
+        entry = self._store.get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if entry is None else json.loads(entry.body.decode('utf-8'))
+
+    def set(self, key, value):
+        self._store.set(key, json.dumps(value).encode('utf-8'), immutable=True)
+
+
+_cache = None
+_cache_enabled = True
+_metadata_cache = None
+_metadata_cache_enabled = True
+
+
+def configure(directory=None, ttl=None, max_size=None, enabled=True):
+    """Set up the cache used by cached_get()"""
+    global _cache, _cache_enabled
+    _cache_enabled = enabled
+    _cache = HTTPCache(directory=directory,
+                       ttl=DEFAULT_TTL if ttl is None else ttl,
+                       max_size=DEFAULT_MAX_SIZE if max_size is None else max_size)
+
+
+def get_cache():
+    """Return the configured HTTPCache or None if caching is disabled"""
+    global _cache
+    if not _cache_enabled:
+        return None
+    if _cache is None:
+        _cache = HTTPCache()
+    return _cache
+
+
+def configure_metadata_cache(directory=None, max_size=None, enabled=True):
+    """Set up the cache returned by get_metadata_cache()"""
+    global _metadata_cache, _metadata_cache_enabled
+    _metadata_cache_enabled = enabled
+    _metadata_cache = MetadataCache(directory=directory,
+                                    max_size=DEFAULT_MAX_SIZE if max_size is None else max_size)
+
+
+def get_metadata_cache():
+    """Return the configured MetadataCache or None if it is disabled"""
+    global _metadata_cache
+    if not _metadata_cache_enabled:
+        return None
+    if _metadata_cache is None:
+        _metadata_cache = MetadataCache()
+    return _metadata_cache
+
+
+def lookup(url, accept=None):
+    """First half of cached_get(): look for url in the cache.
+
+    Returns:
+        tuple (key, entry, headers). entry is the cached CacheEntry, if
+        there is one. If it is fresh, headers is None and no request is
+        needed. Otherwise headers holds the headers for the request. key
+        is None for URLs which are not cached.
+    """
+    if url.startswith('file:'):
+        # a local mirror is as fast as the cache
+        return None, None, {'Accept': accept} if accept is not None else {}
+    key = url if accept is None else '{0} [{1}]'.format(url, accept)
+    cache = get_cache()
+    entry = cache.get(key) if cache else None
+    if entry is not None and entry.is_fresh(cache.ttl):
+        return key, entry, None
+    headers = entry.validators() if entry is not None else {}
+    if accept is not None:
+        headers['Accept'] = accept
+    return key, entry, headers
+
+
+def store(key, entry, status_code, headers, body, immutable=False):
+    """Second half of cached_get(): handle the response for lookup()
+    and return the body to use"""
+    if key is None:
+        return body
+    cache = get_cache()
+    if entry is not None and status_code == 304:
+        return cache.refresh(entry).body
+    if cache and status_code == 200:
+        cache.set(key, body, headers, immutable=immutable)
+    return body
+
+
+def cached_get(url, immutable=False, accept=None):
+    """GET url and return the body bytes, going through the response cache.
+
+    Immutable entries (e.g. metadata of a pinned release) are served without
+    any network round trip. Other entries are served as long as they are
+    younger than the cache TTL and revalidated with a conditional request
+    afterwards. Only successful responses are stored. Responses for
+    different accept headers are cached separately.
+    """
+    key, entry, headers = lookup(url, accept)
+    if headers is None:
+        return entry.body
+    with py2pack.net.get(url, headers=headers) as r:
+        return store(key, entry, r.status_code, r.headers, r.content, immutable)
+
+
+_template_cache = None
+_template_cache_dir = None
+_template_cache_enabled = True
+
+
+def configure_template_cache(directory=None, enabled=True):
+    """Set up the cache returned by get_template_cache()"""
+    global _template_cache, _template_cache_dir, _template_cache_enabled
+    _template_cache = None
+    _template_cache_dir = directory
+    _template_cache_enabled = enabled
+
+
+def get_template_cache():
+    """Return the jinja2 bytecode cache for compiled templates, None if it
+    is disabled or its directory cannot be created.
+
+    Jinja stores a template under the hash of its name and file name and
+    compiles it again when the template source changes.
+    """
+    global _template_cache
+    if not _template_cache_enabled:
+        return None
+    if _template_cache is None:
+        directory = _template_cache_dir or default_template_cache_dir()
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError:
+            return None
+        import jinja2
+
+        _template_cache = jinja2.FileSystemBytecodeCache(directory)
+    return _template_cache
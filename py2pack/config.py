@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Handling of the py2pack configuration file.
+
+The configuration file is an ini-style file, by default
+``py2pack.conf`` in the user config dir, e.g.::
+
+    [network]
+    pool_size = 10
+    connect_timeout = 10
+    read_timeout = 60
+    retries = 4
+    backoff = 0.5
+
+    [cache]
+    directory = /var/cache/py2pack
+    ttl = 3600
+    max_size = 536870912
+    enabled = true
+
+    [index]
+    url = https://pypi.org/
+    directory = /var/cache/py2pack/index
+    max_age = 86400
+
+    [metadata_cache]
+    directory = /var/cache/py2pack/metadata
+    max_size = 536870912
+    enabled = true
+
+    [template_cache]
+    directory = /var/cache/py2pack/templates
+    enabled = true
+
+    [buildenv]
+    directory = /var/cache/py2pack/buildenv
+    max_size = 2147483648
+    offline = false
+    wheel_dir = /srv/wheels
+    enabled = true
+
+    [extract]
+    directory = /dev/shm
+
+    [store]
+    directory = /var/cache/py2pack/sdists
+    max_size = 5368709120
+    enabled = true
+
+Options given on the command line take precedence over the file.
+"""
+
+import configparser
+import os
+
+import platformdirs
+
+
+def default_config_file():
+    return os.path.join(platformdirs.user_config_dir(appname="py2pack"), "py2pack.conf")
+
+
+def load(filename=None):
+    """Read the configuration file. A missing file is an empty configuration"""
+    config = configparser.ConfigParser()
+    config.read(filename or default_config_file())
+    return config
+
+
+def setting(config, section, option, override=None, default=None, type=str):
+    """Return the value of an option.
+
+    Args:
+        config: the ConfigParser returned by load()
+        section: section in the configuration file
+        option: option in that section
+        override: value given on the command line, wins if not None
+        default: returned when the option is set nowhere
+        type: conversion function for the value from the file (str, int, float, bool)
+
+    Returns:
+        the option value
+    """
+    if override is not None:
+        return override
+    if not config.has_option(section, option):
+        return default
+    if type is bool:
+        return config.getboolean(section, option)
+    return type(config.get(section, option))
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Local copy of the list of all projects on the package index.
+
+The list is stored as a text file with one project name per line, sorted
+case-insensitively, next to a small JSON file with the validators of the
+last download. Refreshing sends a conditional request and skips the body
+when the index did not change since (same ETag or same last serial), and
+otherwise parses the response while it is downloaded.
+
+For searching, a trigram index over the normalized project names is
+built from the list when a search first needs it after the list
+changed, so refreshing the list for listing does not pay for it. The
+postings (ids of the names containing a trigram) are stored in one
+binary file, so a query only reads the postings of its own trigrams.
+Summaries and versions are taken from project metadata found in the
+HTTP cache.
+"""
+
+import array
+import bisect
+import collections
+import json
+import os
+import re
+import time
+import urllib.parse
+
+import platformdirs
+
+import py2pack.cache
+import py2pack.net
+from py2pack.utils import atomic_write, json_select
+
+# the package index, a PyPI compatible server or a file:// directory mirror
+DEFAULT_INDEX_URL = 'https://pypi.org/'
+SIMPLE_JSON = 'application/vnd.pypi.simple.v1+json'
+DEFAULT_MAX_AGE = 24 * 3600  # seconds
+CHUNK_SIZE = 256 * 1024
+# longest piece of a response that can hold a single project name
+MAX_TOKEN = 4096
+
+DEFAULT_SEARCH_LIMIT = 20
+# minimal trigram similarity for fuzzy matches
+FUZZY_THRESHOLD = 0.3
+
+# PEP 691 JSON and the PEP 503 HTML variant of the simple index
+_JSON_NAME_RE = re.compile(rb'"name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_HTML_NAME_RE = re.compile(rb'<a\s[^>]*>([^<]*)</a>')
+_NORMALIZE_RE = re.compile(r'[-_.]+')
+_JSON_API_URL_RE = re.compile(r'/pypi/([^/]+)/(?:[^/]+/)?json$')
+
+_directory = None
+_max_age = DEFAULT_MAX_AGE
+_url = DEFAULT_INDEX_URL
+
+
+def default_index_dir():
+    return os.path.join(platformdirs.user_cache_dir(appname="py2pack"), "index")
+
+
+def configure(directory=None, max_age=None, url=None):
+    global _directory, _max_age, _url
+    _directory = directory
+    _max_age = DEFAULT_MAX_AGE if max_age is None else max_age
+    _url = url or DEFAULT_INDEX_URL
+    if not _url.endswith('/'):
+        _url += '/'
+
+
+def index_url(path=''):
+    """Return the URL of path (e.g. 'simple/') on the configured package index"""
+    return urllib.parse.urljoin(_url, path)
+
+
+def _paths(directory):
+    directory = directory or _directory or default_index_dir()
+    return (os.path.join(directory, 'projects.txt'),
+            os.path.join(directory, 'projects.json'))
+
+
+def _search_paths(directory):
+    directory = os.path.dirname(_paths(directory)[0])
+    return (os.path.join(directory, 'search.json'),
+            os.path.join(directory, 'search.bin'))
+
+
+def _read_state(directory):
+    try:
+        with open(_paths(directory)[1]) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class _NameParser(object):
+    """Extract the project names from the chunks of a simple index response"""
+
+    def __init__(self, content_type):
+        self.is_json = 'json' in content_type
+        self._name_re = _JSON_NAME_RE if self.is_json else _HTML_NAME_RE
+        self._tail = b''
+
+    def feed(self, chunk):
+        """Return the names completed by chunk"""
+        buf = self._tail + chunk
+        names = []
+        end = 0
+        for m in self._name_re.finditer(buf):
+            name = m.group(1)
+            if self.is_json:
+                names.append(json.loads(b'"' + name + b'"'))
+            else:
+                names.append(name.decode('utf-8').strip())
+            end = m.end()
+        self._tail = buf[max(end, len(buf) - MAX_TOKEN):]
+        return names
+
+
+def _stream_names(response):
+    """yield the project names from a simple index response while it is downloaded"""
+    parser = _NameParser(response.headers.get('Content-Type', ''))
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        yield from parser.feed(chunk)
+
+
+def is_stale(directory=None):
+    state = _read_state(directory)
+    return time.time() - state.get('updated', 0) >= _max_age or \
+        not os.path.exists(_paths(directory)[0])
+
+
+def refresh(directory=None, url=None):
+    """Bring the local project list up to date.
+
+    url is the simple index to read, by default the one of the configured
+    package index.
+
+    py2pack.aio.Client.refresh_index() is the asyncio variant.
+
+    Returns:
+        True if the list changed, False if the index reported no changes
+    """
+    state, headers = _refresh_request(directory)
+    with py2pack.net.get(url or index_url('simple/'), headers=headers, stream=True) as r:
+        unchanged = _is_unchanged(state, r.status_code, r.headers)
+        if not unchanged:
+            r.raise_for_status()
+            state = _store_names(directory, _stream_names(r), r.headers)
+    _save_state(directory, state)
+    return not unchanged
+
+
+def _refresh_request(directory):
+    """Return the state of the last refresh and the headers for the
+    conditional request of the next one"""
+    state = _read_state(directory)
+    headers = {'Accept': '{0}, text/html;q=0.1'.format(SIMPLE_JSON)}
+    if os.path.exists(_paths(directory)[0]):
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+    else:
+        state = {}
+    return state, headers
+
+
+def _is_unchanged(state, status_code, headers):
+    serial = headers.get('X-PyPI-Last-Serial')
+    return status_code == 304 or (serial is not None and serial == state.get('serial'))
+
+
+def _store_names(directory, names, headers):
+    """Write the project list and return the new state. The search index
+    is rebuilt by the next SearchIndex.open()."""
+    names = sorted(set(names), key=str.lower)
+    atomic_write(_paths(directory)[0], ''.join(n + '\n' for n in names).encode('utf-8'))
+    return {'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'serial': headers.get('X-PyPI-Last-Serial')}
+
+
+def _save_state(directory, state):
+    state['updated'] = time.time()
+    atomic_write(_paths(directory)[1], json.dumps(state).encode('utf-8'))
+
+
+def load(directory=None):
+    """Return the sorted list of project names from the local copy"""
+    try:
+        with open(_paths(directory)[0], encoding='utf-8') as f:
+            return f.read().splitlines()
+    except FileNotFoundError:
+        return []
+
+
+def _prefix_range(names, prefix):
+    prefix = prefix.lower()
+    keys = [n.lower() for n in names]
+    start = bisect.bisect_left(keys, prefix)
+    return start, bisect.bisect_left(keys, prefix + '\U0010ffff', lo=start)
+
+
+def search_prefix(names, prefix):
+    """Return all names from the sorted list starting with prefix (ignoring case)"""
+    if not prefix:
+        return names
+    start, end = _prefix_range(names, prefix)
+    return names[start:end]
+
+
+def normalize(name):
+    """PEP 503 normalized project name"""
+    return _NORMALIZE_RE.sub('-', name).lower()
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _cached_project_info(cache=None):
+    """Return {normalized name: (summary, version)} for all project metadata
+    in the HTTP cache, the most recently stored entry wins"""
+    cache = cache or py2pack.cache.get_cache()
+    found = {}
+    if cache is None:
+        return {}
+    for entry in cache.entries():
+        m = _JSON_API_URL_RE.search(entry.meta.get('url', ''))
+        if not m:
+            continue
+        try:
+            info = json_select(entry.body.decode('utf-8'), ['info']).get('info') or {}
+        except ValueError:
+            continue
+        name = normalize(info.get('name') or m.group(1))
+        stored = entry.meta.get('stored', 0)
+        if name not in found or found[name][0] < stored:
+            found[name] = (stored, info.get('summary') or '', info.get('version') or '')
+    return {name: [summary, version] for name, (_, summary, version) in found.items()}
+
+
+def build_search_index(directory=None):
+    """(Re)build the search index from the local project list"""
+    names = load(directory)
+    postings = collections.defaultdict(list)
+    for i, name in enumerate(names):
+        for gram in _trigrams(normalize(name)):
+            postings[gram].append(i)
+    header = {'count': len(names), 'trigrams': {}, 'info': _cached_project_info()}
+    blob = array.array('I')
+    for gram, ids in postings.items():
+        header['trigrams'][gram] = [len(blob), len(ids)]
+        blob.extend(ids)
+    header_file, blob_file = _search_paths(directory)
+    atomic_write(blob_file, blob.tobytes())
+    atomic_write(header_file, json.dumps(header).encode('utf-8'))
+
+
+class SearchIndex(object):
+    """Trigram index over the names of the local project list"""
+
+    def __init__(self, directory=None):
+        header_file, self._blob_file = _search_paths(directory)
+        self.names = load(directory)
+        with open(header_file, encoding='utf-8') as f:
+            header = json.load(f)
+        if header['count'] != len(self.names):
+            raise ValueError("Search index does not match the project list")
+        self._trigrams = header['trigrams']
+        self._info = header['info']
+
+    @classmethod
+    def open(cls, directory=None):
+        """Open the search index, build it first if it is missing or outdated"""
+        header_file = _search_paths(directory)[0]
+        names_file = _paths(directory)[0]
+        if not os.path.exists(header_file) or \
+                os.path.getmtime(header_file) < os.path.getmtime(names_file):
+            build_search_index(directory)
+        try:
+            return cls(directory)
+        except ValueError:
+            build_search_index(directory)
+            return cls(directory)
+
+    def _postings(self, blob, gram):
+        offset, count = self._trigrams.get(gram, (0, 0))
+        ids = array.array('I')
+        if count:
+            blob.seek(offset * ids.itemsize)
+            ids.frombytes(blob.read(count * ids.itemsize))
+        return ids
+
+    def _candidates(self, query):
+        """Yield (id, score) of names matching query"""
+        grams = _trigrams(query)
+        if not grams:
+            # too short for trigrams, only look for prefix matches
+            for i in range(*_prefix_range(self.names, query)):
+                yield i, None
+            return
+        counts = collections.Counter()
+        with open(self._blob_file, 'rb') as blob:
+            for gram in grams:
+                counts.update(self._postings(blob, gram))
+        for i, shared in counts.items():
+            # shared / |union of trigrams| can not reach the threshold otherwise
+            if shared >= FUZZY_THRESHOLD * len(grams):
+                yield i, shared
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """Return the best matches for query as list of dicts with name,
+        version, summary and score, best first.
+
+        Exact, prefix and substring matches of the normalized name rank
+        highest (shorter names first), followed by fuzzy matches by trigram
+        similarity and projects whose cached summary contains all words of
+        the query.
+        """
+        query = normalize(query.strip())
+        # padded like pg_trgm, so that matching word starts and ends count more
+        padded = _trigrams('  ' + query + ' ')
+        scores = {}
+        for i, shared in self._candidates(query):
+            name = normalize(self.names[i])
+            closeness = len(query) / len(name)
+            if name == query:
+                score = 3.0
+            elif name.startswith(query):
+                score = 2.0 + closeness
+            elif query in name:
+                score = 1.0 + closeness
+            elif shared:
+                name_padded = _trigrams('  ' + name + ' ')
+                score = len(padded & name_padded) / len(padded | name_padded)
+                if score < FUZZY_THRESHOLD:
+                    continue
+            else:
+                continue
+            scores[i] = score
+        words = re.split(r'[-\s]+', query)
+        by_name = None
+        for name, (summary, _) in self._info.items():
+            summary = summary.lower()
+            if summary and all(w in summary for w in words):
+                if by_name is None:
+                    by_name = {normalize(n): i for i, n in enumerate(self.names)}
+                i = by_name.get(name)
+                if i is not None:
+                    scores[i] = max(scores.get(i, 0), 0.5)
+        best = sorted(scores.items(), key=lambda x: (-x[1], self.names[x[0]].lower()))
+        results = []
+        for i, score in best[:limit]:
+            summary, version = self._info.get(normalize(self.names[i]), ['', ''])
+            results.append({'name': self.names[i], 'version': version,
+                            'summary': summary, 'score': round(score, 3)})
+        return results
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Shared HTTP session used for all network access.
+
+All requests go through one requests.Session with a keep-alive connection
+pool, so a run talking to PyPI many times does one TCP and TLS handshake
+per host instead of one per request.
+
+Requests which fail with a connection error, a timeout or a status
+telling that the server is (temporarily) unable to answer are retried
+after a randomized, exponentially growing delay, or the delay the server
+asks for with Retry-After. The number of concurrent requests per host is
+limited by an AdaptiveLimit, which goes down when the server throttles
+and slowly up again while it answers normally.
+
+file:// URLs are served from a local directory mirror laid out like the
+index (see file_url_path()).
+"""
+
+import datetime
+import hashlib
+import io
+import mimetypes
+import os
+import random
+import threading
+import time
+import urllib.parse
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10.0  # seconds
+DEFAULT_READ_TIMEOUT = 60.0  # seconds
+# number of different hosts to keep connection pools for
+POOL_HOSTS = 10
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+DEFAULT_RETRIES = 4
+DEFAULT_BACKOFF = 0.5  # seconds, doubled for every retry
+MAX_BACKOFF = 60.0  # seconds
+# longest Retry-After that is waited for
+MAX_RETRY_AFTER = 300.0  # seconds
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+# statuses meaning that the server is overloaded, they lower the concurrency
+THROTTLE_STATUSES = frozenset([429, 503])
+# files for a directory of a file:// mirror (e.g. simple/<project>/), as
+# written by bandersnatch
+SIMPLE_INDEX_FILES = [('index.v1_json', 'application/vnd.pypi.simple.v1+json'),
+                      ('index.html', 'text/html')]
+
+_lock = threading.Lock()
+_session = None
+_pool_size = DEFAULT_POOL_SIZE
+_timeout = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+_retries = DEFAULT_RETRIES
+_backoff = DEFAULT_BACKOFF
+_limits = {}  # host -> AdaptiveLimit
+
+
+class AIMDLimit(object):
+    """Concurrency limit adapted like the TCP congestion window.
+
+    Every normal response raises the limit by 1/limit, so by about one
+    per round of requests (additive increase). A throttled request halves
+    it (multiplicative decrease). Decreases within COOLDOWN seconds of the
+    previous one are ignored, since a burst of throttled responses is the
+    answer to the same overload.
+    """
+    DECREASE = 0.5
+    COOLDOWN = 1.0  # seconds
+
+    def __init__(self, maximum, initial=None, minimum=1):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = float(initial or max(minimum, maximum // 2))
+        self.in_use = 0
+        self._decreased = None
+
+    def _allowed(self):
+        return self.in_use < int(self.limit)
+
+    def _update(self, throttled):
+        if not throttled:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            return
+        now = time.monotonic()
+        if self._decreased is None or now - self._decreased >= self.COOLDOWN:
+            self.limit = max(self.minimum, self.limit * self.DECREASE)
+            self._decreased = now
+
+
+class AdaptiveLimit(AIMDLimit):
+    """AIMDLimit for threads"""
+
+    def __init__(self, *args, **kwargs):
+        super(AdaptiveLimit, self).__init__(*args, **kwargs)
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Wait until one more request is allowed"""
+        with self._cond:
+            self._cond.wait_for(self._allowed)
+            self.in_use += 1
+
+    def release(self, throttled=False):
+        """Done with a request, throttled tells whether the server throttled it"""
+        with self._cond:
+            self.in_use -= 1
+            self._update(throttled)
+            self._cond.notify_all()
+
+
+def file_url_path(url, accept=None):
+    """Return the file and its content type for a file:// URL.
+
+    A directory is answered with its index.v1_json (PEP 691) or
+    index.html, depending on accept. Files named json (like the
+    pypi/<project>/<version>/json documents of the JSON API) are JSON.
+
+    Returns:
+        tuple (path, content type), (None, None) if there is no such file
+    """
+    import urllib.request
+
+    path = urllib.request.url2pathname(urllib.parse.urlsplit(url).path)
+    if os.path.isdir(path):
+        candidates = SIMPLE_INDEX_FILES
+        if not accept or 'json' not in accept.split(',')[0]:
+            candidates = list(reversed(candidates))
+        for name, content_type in candidates:
+            if os.path.isfile(os.path.join(path, name)):
+                return os.path.join(path, name), content_type
+        return None, None
+    if not os.path.isfile(path):
+        return None, None
+    if os.path.basename(path) == 'json':
+        return path, 'application/json'
+    return path, mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+class FileAdapter(object):
+    """requests transport adapter for the file:// URLs of a local mirror.
+
+    It implements the interface of requests.adapters.BaseAdapter without
+    deriving from it, so requests is only imported when it is used.
+    """
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        import requests
+
+        path, content_type = file_url_path(request.url, request.headers.get('Accept'))
+        response = requests.Response()
+        response.url = request.url
+        response.request = request
+        if path is None:
+            response.status_code = 404
+            response.reason = 'Not Found'
+            response.raw = io.BytesIO(b'')
+        else:
+            response.status_code = 200
+            response.reason = 'OK'
+            response.raw = open(path, 'rb')
+            response.headers['Content-Type'] = content_type
+            response.headers['Content-Length'] = str(os.path.getsize(path))
+        return response
+
+    def close(self):
+        pass
+
+
+def configure(pool_size=None, connect_timeout=None, read_timeout=None, retries=None, backoff=None):
+    """Set pool size (connections per host), timeouts and retries of the session.
+
+    An already existing session is closed, the next request opens a new one
+    with the given settings.
+    """
+    global _session, _pool_size, _timeout, _retries, _backoff
+    with _lock:
+        _pool_size = pool_size or DEFAULT_POOL_SIZE
+        _timeout = (connect_timeout or DEFAULT_CONNECT_TIMEOUT,
+                    read_timeout or DEFAULT_READ_TIMEOUT)
+        _retries = DEFAULT_RETRIES if retries is None else retries
+        _backoff = DEFAULT_BACKOFF if backoff is None else backoff
+        _limits.clear()
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_session():
+    """Return the shared session, create it on first use"""
+    global _session
+    with _lock:
+        if _session is None:
+            import requests
+            import requests.adapters
+
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_HOSTS,
+                                                    pool_maxsize=_pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.mount('file://', FileAdapter())
+            _session = session
+        return _session
+
+
+def get_timeout():
+    """Return the configured (connect, read) timeouts in seconds"""
+    return _timeout
+
+
+def get_retries():
+    """Return the configured number of retries and the backoff base in seconds"""
+    return _retries, _backoff
+
+
+def host_limit(url):
+    """Return the AdaptiveLimit for the host of url"""
+    host = urllib.parse.urlsplit(url).netloc
+    with _lock:
+        if host not in _limits:
+            _limits[host] = AdaptiveLimit(_pool_size)
+        return _limits[host]
+
+
+def retry_after(headers):
+    """Return the seconds from a Retry-After header, None if there is none"""
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    import email.utils
+
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt, headers=None):
+    """Return the seconds to wait before retry number attempt (from 0).
+
+    This is the Retry-After of the response if it has one, otherwise a
+    random delay up to the exponentially growing backoff ("full jitter"),
+    so that clients throttled at the same time do not return at the same
+    time.
+    """
+    delay = retry_after(headers or {})
+    if delay is not None:
+        return min(delay, MAX_RETRY_AFTER)
+    return random.uniform(0, min(MAX_BACKOFF, _backoff * 2 ** attempt))
+
+
+def get(url, **kwargs):
+    """requests.get() through the shared session with the default timeouts.
+
+    Connection errors, timeouts and responses with a status in
+    RETRY_STATUSES are retried up to the configured number of times,
+    waiting backoff_delay() in between. After that, the last response is
+    returned whatever its status, or the last exception raised.
+    """
+    import requests
+
+    kwargs.setdefault('timeout', _timeout)
+    limit = host_limit(url)
+    attempt = 0
+    while True:
+        limit.acquire()
+        throttled = False
+        try:
+            r = get_session().get(url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            throttled = True
+            if attempt >= _retries:
+                raise
+            delay = backoff_delay(attempt)
+        else:
+            throttled = r.status_code in THROTTLE_STATUSES
+            if r.status_code not in RETRY_STATUSES or attempt >= _retries:
+                return r
+            delay = backoff_delay(attempt, r.headers)
+            r.close()
+        finally:
+            limit.release(throttled)
+        time.sleep(delay)
+        attempt += 1
+
+
+def download(url, filename, sha256=None):
+    """Stream url into filename.
+
+    The data is written in chunks to ``<filename>.part`` which is renamed
+    to filename once complete, so memory usage does not depend on the size
+    of the download and filename never contains a partial file. If a
+    ``.part`` file is left over from an interrupted download, it is resumed
+    with a HTTP Range request. When sha256 is given, the digest is computed
+    while downloading and checked before the file is moved into place.
+
+    Returns:
+        the hex sha256 digest of the file
+
+    Raises:
+        ValueError: when the downloaded data does not match sha256
+        requests.HTTPError: when the server responds with an error
+    """
+    partname = filename + '.part'
+    digest, offset = resume_state(partname)
+    headers = {'Range': 'bytes={0}-'.format(offset)} if offset else {}
+    with get(url, headers=headers, stream=True) as r:
+        if offset and r.status_code == 416:
+            # the partial file is no prefix of the remote file, start over
+            os.unlink(partname)
+            return download(url, filename, sha256)
+        r.raise_for_status()
+        if r.status_code != 206:
+            # range not supported, the server sends the whole file
+            digest = hashlib.sha256()
+            offset = 0
+        with open(partname, 'ab' if offset else 'wb') as f:
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                f.write(chunk)
+    return finish_download(url, partname, filename, digest, sha256)
+
+
+def resume_state(partname):
+    """Return the sha256 object and the size of a partial download"""
+    digest = hashlib.sha256()
+    offset = 0
+    if os.path.exists(partname):
+        with open(partname, 'rb') as f:
+            for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                offset += len(chunk)
+    return digest, offset
+
+
+def finish_download(url, partname, filename, digest, sha256=None):
+    """Check the digest of a complete download, move it into place and
+    return the hex digest"""
+    if sha256 and digest.hexdigest() != sha256.lower():
+        os.unlink(partname)
+        raise ValueError("sha256 mismatch for '{0}': expected {1}, got {2}".format(
+            url, sha256, digest.hexdigest()))
+    os.replace(partname, filename)
+    return digest.hexdigest()
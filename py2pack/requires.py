@@ -27,8 +27,6 @@ For further information concerning requirements (and markers), see `PEP 508
 
 from typing import List, Optional  # noqa: F401, pylint: disable=unused-import
 
-from packaging.requirements import Requirement
-
 
 def _requirement_filter_by_marker(req):
     # type: (Requirement) -> bool
@@ -51,6 +49,7 @@ def _requirement_find_lowest_possible(req):
     Examples
     --------
 
+    >>> from packaging.requirements import Requirement
     >>> req = Requirement("foobar>=1.0,>2")
     >>> _requirement_find_lowest_possible(req)
     ['foobar', '>=', '1.0']
@@ -97,6 +96,8 @@ def _requirements_sanitize(req_list):
     ... ])
     ['foo >= 3.0', 'bar > 1.0']
     """
+    from packaging.requirements import Requirement
+
     filtered_req_list = (
         _requirement_find_lowest_possible(req) for req in
         (Requirement(s.split("#", maxsplit=1)[0]) for s in req_list)
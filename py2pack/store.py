@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Shared store of downloaded sdists.
+
+Every sdist is stored once, by the sha256 of its content, as
+``sha256/<aa>/<sha256>/<filename>``. ``projects/<name>/<version>.json``
+maps a release to its sdist, so generate can find the sdist of a release
+without a copy in the working directory. fetch hardlinks (or reflinks)
+the stored file into the working directory, so any number of checkouts
+share one copy on disk. Stored files are read-only, since a hardlinked
+checkout is the same file.
+
+The least recently used sdists are removed once the store grows beyond
+its size limit. Checkouts keep their (hardlinked) copy.
+"""
+
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+
+import platformdirs
+
+import py2pack.net
+from py2pack.index import normalize
+from py2pack.utils import evict_lru, file_lock, sha256sum
+
+DEFAULT_MAX_SIZE = 5 * 1024 * 1024 * 1024  # bytes
+# ioctl to clone a file on copy-on-write filesystems (btrfs, xfs)
+FICLONE = 0x40049409
+
+
+def default_store_dir():
+    return os.path.join(platformdirs.user_cache_dir(appname="py2pack"), "sdists")
+
+
+def link(source, destination):
+    """Make destination the same file as source: a hardlink if possible,
+    a reflink or a copy otherwise. An existing destination is replaced."""
+    tmp = os.path.join(os.path.dirname(os.path.abspath(destination)),
+                       '.{0}.py2pack-tmp'.format(os.path.basename(destination)))
+    try:
+        os.unlink(tmp)
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(source, tmp)
+    except OSError:
+        with open(source, 'rb') as src, open(tmp, 'wb') as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            except OSError:
+                shutil.copyfileobj(src, dst)
+    os.replace(tmp, destination)
+
+
+class Store(object):
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory or default_store_dir()
+        self.max_size = max_size
+
+    def _blob_dir(self, sha256):
+        return os.path.join(self.directory, 'sha256', sha256[:2], sha256)
+
+    def _release_file(self, name, version):
+        return os.path.join(self.directory, 'projects', normalize(name), '{0}.json'.format(version))
+
+    def get(self, sha256, filename=None):
+        """Return the path of the stored file with this sha256, None if missing"""
+        blob_dir = self._blob_dir(sha256.lower())
+        try:
+            names = [filename] if filename else os.listdir(blob_dir)
+        except FileNotFoundError:
+            return None
+        for name in names:
+            path = os.path.join(blob_dir, name)
+            if os.path.isfile(path):
+                try:
+                    # mark as recently used for the pruning
+                    os.utime(blob_dir)
+                except FileNotFoundError:
+                    # pruned by a concurrent process
+                    return None
+                return path
+        return None
+
+    def lookup(self, name, version):
+        """Return the path of the stored sdist of a release, None if missing"""
+        try:
+            with open(self._release_file(name, version)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return self.get(entry['sha256'], entry['filename'])
+
+    def add(self, filename, name=None, version=None, sha256=None, move=False):
+        """Put a file into the store and return the path of the stored file.
+
+        With name and version, it is recorded as the sdist of that release.
+        sha256 saves hashing the file again if the caller knows it. With
+        move, filename is moved into the store instead of linked or copied.
+        """
+        sha256 = (sha256 or sha256sum(filename)).lower()
+        path = self.get(sha256)
+        if path is None:
+            blob_dir = self._blob_dir(sha256)
+            os.makedirs(blob_dir, exist_ok=True)
+            path = os.path.join(blob_dir, os.path.basename(filename))
+            if move:
+                os.replace(filename, path)
+            else:
+                link(filename, path)
+            os.chmod(path, 0o444)
+            added = True
+        else:
+            added = False
+            if move:
+                os.unlink(filename)
+        if name and version:
+            release_file = self._release_file(name, version)
+            os.makedirs(os.path.dirname(release_file), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(release_file), prefix='.tmp-')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'sha256': sha256, 'filename': os.path.basename(path)}, f)
+            os.replace(tmp, release_file)
+        if added:
+            self.prune(keep=path)
+        return path
+
+    def _find(self, filename, name=None, version=None, sha256=None):
+        path = None
+        if name and version:
+            path = self.lookup(name, version)
+        if path is None and sha256:
+            path = self.get(sha256, filename)
+        if path is not None and name and version and self.lookup(name, version) is None:
+            self.add(path, name, version, sha256)
+        return path
+
+    def fetch(self, url, filename, name=None, version=None, sha256=None):
+        """Return the stored file for a release, download it first if missing.
+
+        Only one process at a time downloads a file, the others wait for it
+        and take the stored file afterwards.
+
+        Raises:
+            the exceptions of py2pack.net.download()
+        """
+        path = self._find(filename, name, version, sha256)
+        if path is not None:
+            return path
+        tmp_dir = os.path.join(self.directory, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        download = os.path.join(tmp_dir, filename)
+        with file_lock(download + '.lock'):
+            # stored by another process while this one waited for the lock
+            path = self._find(filename, name, version, sha256)
+            if path is not None:
+                return path
+            # the .part file of an interrupted download is resumed
+            digest = py2pack.net.download(url, download, sha256=sha256)
+            return self.add(download, name, version, sha256=digest, move=True)
+
+    def checkout(self, path, destination):
+        """Put the stored file path at destination (a hardlink if possible)"""
+        link(path, destination)
+
+    def _blobs(self):
+        """yield (last use, size, blob directory) for all stored files"""
+        root = os.path.join(self.directory, 'sha256')
+        try:
+            prefixes = os.listdir(root)
+        except FileNotFoundError:
+            return
+        for prefix in prefixes:
+            try:
+                blob_dirs = list(os.scandir(os.path.join(root, prefix)))
+            except FileNotFoundError:
+                continue
+            for entry in blob_dirs:
+                try:
+                    mtime = entry.stat().st_mtime
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                except FileNotFoundError:
+                    # removed by a concurrent process
+                    continue
+                yield mtime, size, entry.path
+
+    def size(self):
+        return sum(size for _, size, _ in self._blobs())
+
+    def prune(self, max_size=None, keep=None):
+        """Remove least recently used files until the store fits max_size.
+
+        Release entries of removed files are dropped when they are looked
+        up the next time. keep is a stored file which must stay.
+        """
+        max_size = self.max_size if max_size is None else max_size
+        keep_dir = os.path.dirname(keep) if keep else None
+
+        def remove(blob_dir):
+            if blob_dir == keep_dir:
+                return False
+            shutil.rmtree(blob_dir, ignore_errors=True)
+
+        return evict_lru(self._blobs(), max_size, remove)
+
+
+_store = None
+_enabled = True
+
+
+def configure(directory=None, max_size=None, enabled=True):
+    global _store, _enabled
+    _enabled = enabled
+    _store = Store(directory=directory,
+                   max_size=DEFAULT_MAX_SIZE if max_size is None else max_size)
+
+
+def get_store():
+    """Return the configured Store or None if it is disabled"""
+    global _store
+    if not _enabled:
+        return None
+    if _store is None:
+        _store = Store()
+    return _store
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Update existing spec files to a new upstream release.
+
+Unlike generate, this keeps the spec file as it is and only changes
+
+- the Version: line (or the %define it refers to),
+- the Source: line, if it points to PyPI and the sdist name changed,
+- the python requirement lines, for requirements added, removed or
+  changed in the Requires-Dist of the new release.
+
+Only the PyPI JSON metadata of the new release is needed, the sdist is
+not downloaded. Requirements are not changed when the release has no
+Requires-Dist metadata.
+"""
+
+import re
+import sys
+
+import py2pack
+import py2pack.requires
+import py2pack.utils
+
+DEFAULT_JOBS = 8
+
+_MACRO_DEFINITION_RE = re.compile(r'^%(?:define|global)\s+(\w+)\s+(.*?)\s*$', re.MULTILINE)
+_MACRO_RE = re.compile(r'%{?\??(\w+)}?')
+_TAG_RE = r'^({0}:\s*)(.*?)\s*$'
+_VERSION_RE = re.compile(_TAG_RE.format('Version'), re.MULTILINE | re.IGNORECASE)
+_SOURCE_RE = re.compile(_TAG_RE.format('Source0?'), re.MULTILINE | re.IGNORECASE)
+_NAME_RE = re.compile(_TAG_RE.format('Name'), re.MULTILINE | re.IGNORECASE)
+# Requires: python-foo >= 1, BuildRequires: %{python_module foo >= 1}
+_REQUIREMENT_RE = re.compile(r'^((Build)?Requires:\s*)(python3?-|%{python_module\s+)([^}\s]+(?:\s*[<>=!~]+\s*[^}\s]+)?)(}?)\s*$',
+                             re.IGNORECASE)
+_PYPI_SOURCE_RE = re.compile(r'^https?://(?:files\.pythonhosted\.org|pypi\.io|pypi\.python\.org|pypi\.org)'
+                             r'/packages/source/[^/]/([^/]+)/')
+_TEST_SECTION_START = '# SECTION test requirements'
+_SECTION_END = '# /SECTION'
+
+
+def _macros(text):
+    return dict(_MACRO_DEFINITION_RE.findall(text))
+
+
+def _expand(value, macros, depth=10):
+    # expand %name and %{name} of simple %define/%global macros
+    for _ in range(depth):
+        expanded = _MACRO_RE.sub(lambda m: macros.get(m.group(1), m.group(0)), value)
+        if expanded == value:
+            break
+        value = expanded
+    return value
+
+
+def parse_spec(text):
+    """Return the name, version, source and PyPI project of a spec file.
+
+    Raises:
+        ValueError: when the spec has no Version: line
+    """
+    macros = _macros(text)
+    name = _NAME_RE.search(text)
+    version = _VERSION_RE.search(text)
+    source = _SOURCE_RE.search(text)
+    if not version:
+        raise ValueError('no Version: line')
+    if name:
+        macros.setdefault('name', _expand(name.group(2), macros))
+    macros.setdefault('version', _expand(version.group(2), macros))
+    spec = {
+        'name': macros.get('name'),
+        'version': macros['version'],
+        'source': _expand(source.group(2), macros) if source else None,
+        'project': None,
+    }
+    pypi_source = _PYPI_SOURCE_RE.match(spec['source'] or '')
+    if pypi_source:
+        spec['project'] = pypi_source.group(1)
+    elif 'pypi_name' in macros:
+        spec['project'] = _expand(macros['pypi_name'], macros)
+    elif spec['name']:
+        spec['project'] = re.sub(r'^python3?-', '', spec['name'])
+    return spec
+
+
+def _replace_value(text, match, value):
+    return text[:match.start(2)] + value + text[match.end(2):]
+
+
+def _set_version(text, old, new):
+    match = _VERSION_RE.search(text)
+    raw = match.group(2)
+    macro = _MACRO_RE.fullmatch(raw)
+    if macro:
+        # Version: %{pypi_version}, change the definition
+        definition = re.search(r'^%(?:define|global)\s+' + re.escape(macro.group(1)) + r'\s+(' +
+                               re.escape(old) + r')\s*$', text, re.MULTILINE)
+        if definition:
+            return text[:definition.start(1)] + new + text[definition.end(1):]
+    return _replace_value(text, match, raw.replace(old, new))
+
+
+def _set_source(text, spec, version, url):
+    match = _SOURCE_RE.search(text)
+    if not match:
+        return text
+    raw = match.group(2)
+    if not _PYPI_SOURCE_RE.match(spec['source']):
+        # somewhere else, only the version can change
+        return _replace_value(text, match, raw.replace(spec['version'], version))
+    macros = _macros(text)
+    macros['version'] = version
+    if not url or _expand(raw, macros) == url:
+        return text
+    # like the templates do it
+    return _replace_value(text, match, url.replace(version, '%{version}'))
+
+
+def _requirement_name(requirement):
+    from packaging.utils import canonicalize_name
+
+    return canonicalize_name(re.split(r'[\s<>=!~]', requirement, maxsplit=1)[0])
+
+
+def _update_requirements(lines, requirements, previous=None):
+    """Change the python requirement lines from the requirements of the
+    previous release to requirements.
+
+    Lines of requirements which are gone are removed: Requires: lines and
+    the BuildRequires: lines of the test requirements section. Others are
+    changed in place, new ones are added after the last Requires: line
+    and at the end of the test requirements section. Without previous,
+    nothing is removed. Lines added by hand are kept.
+    """
+    new = {_requirement_name(r): r for r in requirements}
+    removed = set(_requirement_name(r) for r in previous or []) - set(new)
+    present = set()
+    prefix = 'python-'
+    for line in lines:
+        match = _REQUIREMENT_RE.match(line)
+        if match and not match.group(2):
+            present.add(_requirement_name(match.group(4)))
+            prefix = match.group(3)
+    # not in the spec although the previous release had it: removed by hand
+    added = sorted(set(new) - present - set(_requirement_name(r) for r in previous or []))
+
+    result = []
+    in_test_section = False
+    test_section_end = None
+    last_requires = None
+    for line in lines:
+        if line.strip() == _TEST_SECTION_START:
+            in_test_section = True
+        elif line.strip() == _SECTION_END and in_test_section:
+            in_test_section = False
+            test_section_end = len(result)
+        match = _REQUIREMENT_RE.match(line)
+        if match:
+            name = _requirement_name(match.group(4))
+            if name in new:
+                line = match.group(1) + match.group(3) + new[name] + match.group(5)
+            elif name in removed and (not match.group(2) or in_test_section):
+                continue
+        result.append(line)
+        if match and not match.group(2):
+            last_requires = len(result) - 1
+
+    if added and test_section_end is not None:
+        result[test_section_end:test_section_end] = [
+            'BuildRequires:  %{{python_module {0}}}'.format(new[name]) for name in added]
+        if last_requires is not None and last_requires >= test_section_end:
+            last_requires += len(added)
+    if added:
+        if last_requires is None:
+            # after the last requirement of any kind
+            tags = [i for i, line in enumerate(result) if re.match(r'(Build)?Requires:', line)]
+            last_requires = tags[-1] if tags else len(result) - 1
+        template = 'Requires:       {0}{1}}}' if prefix.startswith('%') else 'Requires:       {0}{1}'
+        result[last_requires + 1:last_requires + 1] = [template.format(prefix, new[name]) for name in added]
+    return result
+
+
+def is_newer(version, spec_version):
+    from packaging.version import InvalidVersion, Version
+
+    try:
+        return Version(version) > Version(spec_version)
+    except InvalidVersion:
+        return version != spec_version
+
+
+def update_spec(text, metadata, previous=None):
+    """Return text, a spec file, updated to the release of the PyPI
+    metadata, and a list of the changes.
+
+    previous is the PyPI metadata of the release the spec is for, its
+    requirements tell which requirements the new release dropped.
+    """
+    spec = parse_spec(text)
+    info = metadata['info']
+    version = info['version']
+    changes = []
+    if not is_newer(version, spec['version']):
+        return text, changes
+
+    text = _set_version(text, spec['version'], version)
+    changes.append('version {0} -> {1}'.format(spec['version'], version))
+    url = py2pack._newest_download_url(spec['project'], metadata).get('url')
+    updated = _set_source(text, spec, version, url)
+    if updated != text:
+        changes.append('source')
+        text = updated
+    if info.get('requires_dist') is not None:
+        requirements = py2pack.requires._requirements_sanitize(info['requires_dist'])
+        previous_requirements = (previous or {}).get('info', {}).get('requires_dist')
+        if previous_requirements is not None:
+            previous_requirements = py2pack.requires._requirements_sanitize(previous_requirements)
+        lines = text.split('\n')
+        updated = '\n'.join(_update_requirements(lines, requirements, previous_requirements))
+        if updated != text:
+            changes.append('requirements')
+            text = updated
+    return text, changes
+
+
+def update_file(filename, version=None):
+    """Update the spec file filename in place, see update_spec().
+
+    Returns:
+        the list of changes, empty if the spec is up to date
+    """
+    with open(filename, encoding='utf-8') as f:
+        text = f.read()
+    spec = parse_spec(text)
+    if not spec['project']:
+        raise ValueError('unable to find the PyPI project name')
+    metadata = py2pack.pypi_json(spec['project'], version)
+    if not metadata.get('info'):
+        raise ValueError('{0} not found on PyPI'.format(spec['project']))
+    previous = None
+    if is_newer(metadata['info']['version'], spec['version']):
+        try:
+            previous = py2pack.pypi_json(spec['project'], spec['version'])
+        except (OSError, ValueError):
+            pass
+    text, changes = update_spec(text, metadata, previous)
+    if changes:
+        py2pack.utils.atomic_write(filename, text.encode('utf-8'), keep_mode=True)
+    return changes
+
+
+def update(args):
+    import concurrent.futures
+
+    failed = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(update_file, filename, args.version) for filename in args.specfile]
+        for filename, future in zip(args.specfile, futures):
+            try:
+                changes = future.result()
+            except Exception as exc:
+                failed += 1
+                print('failed    {0}: {1}'.format(filename, exc))
+                continue
+            if changes:
+                print('updated   {0}: {1}'.format(filename, ', '.join(changes)))
+            else:
+                print('unchanged {0}'.format(filename))
+    if failed:
+        sys.exit(1)
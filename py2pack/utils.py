@@ -17,30 +17,368 @@
 
 """Module containing utility functions that fit nowhere else."""
 
+import bisect
+import fcntl
+import fnmatch
+import glob
+import hashlib
+import json
 import os
+import re
+import subprocess
+import sys
 import tempfile
 import shutil
 from contextlib import contextmanager
-from build.util import project_wheel_metadata
 
-from typing import List  # noqa: F401, pylint: disable=unused-import
-try:
-    import tomllib as toml
-except ModuleNotFoundError:
-    import tomli as toml
+from typing import Callable, Dict, Iterable, List, Optional, Set, Union  # noqa: F401, pylint: disable=unused-import
 
 import tarfile
 import zipfile
 
-from backports.entry_points_selectable import EntryPoint, EntryPoints
+import py2pack.buildenv
+
+# parent directory for extracted archives, None for the default temp dir
+_extract_dir = None
+
+
+def configure(extract_dir=None):
+    """Set the directory archives are extracted to, e.g. a tmpfs like /dev/shm"""
+    global _extract_dir
+    _extract_dir = extract_dir
+
+
+class ArchiveIndex(object):
+    """Member list and small metadata files of a tar or zip archive.
+
+    A single pass over the archive records all member names with their
+    offsets and keeps the contents of the toplevel files in SMALL_FILES,
+    which is all most metadata steps need. All members can be extracted
+    in the same pass, so the archive is decompressed only once, or later
+    with extract().
+
+    Whether the files are needed on disk often depends on the small files,
+    e.g. only setuptools builds run setup.py. extract can then be a
+    function of the ArchiveIndex and a flag telling whether the pass is
+    complete, which returns True or False once it can decide from the
+    small files read so far, None otherwise. Until it decides, members are
+    extracted in the pass; if it decides False, they are removed again.
+
+    Use it as a context manager to remove the extracted files again.
+    """
+    SMALL_FILES = ('pyproject.toml', 'PKG-INFO', 'setup.cfg')
+
+    def __init__(self, filename, extract=False):
+        # type: (str, Union[bool, Callable[[ArchiveIndex, bool], Optional[bool]]]) -> None
+        """Index the archive.
+
+        Args:
+            filename: name of the archive
+            extract: also extract all members to a temporary directory, or
+                a function deciding that while indexing (see above)
+
+        Raises:
+            ValueError: when the file is neither a zip nor a tar archive
+            FileNotFoundError: when the provided file does not exist
+        """
+        self.filename = filename
+        self.offsets = {}  # type: Dict[str, int]
+        self.files = {}  # type: Dict[str, bytes]
+        self.extract_dir = None  # type: Optional[str]
+        self._extracted_all = False
+        self._is_zip = False
+        self._needs_files = extract if callable(extract) else None
+        if extract:
+            self._make_extract_dir()
+            self._decide(complete=False)
+        try:
+            try:
+                self._index_tar()
+            except tarfile.ReadError:
+                try:
+                    self._index_zip()
+                except zipfile.BadZipFile:
+                    raise ValueError("Can not read '{!s}'. "
+                                     "Not a tar or zip file".format(filename))
+            self._decide(complete=True)
+        except BaseException:
+            self.close()
+            raise
+        self._extracted_all = self.extract_dir is not None
+        names = set(self.offsets)
+        names.discard("./")
+        self.names = sorted(names)  # type: List[str]
+
+    @staticmethod
+    def _is_small_file(name):
+        return name.count("/") == 1 and name.rsplit("/", 1)[1] in ArchiveIndex.SMALL_FILES
+
+    def _decide(self, complete):
+        # ask the extract function until it knows whether the files are needed
+        if self._needs_files is None:
+            return
+        needed = self._needs_files(self, complete)
+        if needed is None and not complete:
+            return
+        self._needs_files = None
+        if needed is False:
+            self._remove_extract_dir()
+
+    def _remove_extract_dir(self):
+        if self.extract_dir is not None:
+            shutil.rmtree(self.extract_dir, ignore_errors=True)
+            self.extract_dir = None
+
+    def _make_extract_dir(self):
+        if self.extract_dir is None:
+            if _extract_dir:
+                os.makedirs(_extract_dir, exist_ok=True)
+            self.extract_dir = tempfile.mkdtemp(prefix="py2pack_", dir=_extract_dir)
+        return self.extract_dir
+
+    @staticmethod
+    def _extract_tar_member(tar_file, member, path):
+        if hasattr(tarfile, 'data_filter'):
+            tar_file.extract(member, path, filter='data')
+        else:
+            tar_file.extract(member, path)
+
+    def _index_tar(self):
+        with tarfile.open(self.filename) as tar_file:
+            # iterating reads the (compressed) stream front to back once
+            for m in tar_file:
+                self.offsets[m.name] = m.offset_data
+                small = m.isfile() and self._is_small_file(m.name)
+                if self.extract_dir:
+                    self._extract_tar_member(tar_file, m, self.extract_dir)
+                    if small:
+                        # reading the member again would seek backwards
+                        # in the compressed stream, use the extracted file
+                        with open(os.path.join(self.extract_dir, m.name), 'rb') as fh:
+                            self.files[m.name.split("/", 1)[1]] = fh.read()
+                elif small:
+                    with tar_file.extractfile(m) as fh:
+                        self.files[m.name.split("/", 1)[1]] = fh.read()
+                if small:
+                    self._decide(complete=False)
+
+    def _index_zip(self):
+        with zipfile.ZipFile(self.filename) as zip_file:
+            self._is_zip = True
+            for info in zip_file.infolist():
+                self.offsets[info.filename] = info.header_offset
+                if self._is_small_file(info.filename):
+                    self.files[info.filename.split("/", 1)[1]] = zip_file.read(info)
+                    self._decide(complete=False)
+                if self.extract_dir:
+                    zip_file.extract(info, self.extract_dir)
+
+    def extract(self):
+        # type: () -> str
+        """Extract all members of the archive.
+
+        Nothing is done if they were extracted already, so it is cheap to
+        call this from every step which needs files on disk.
+
+        Returns:
+            the toplevel directory of the extracted sdist (see root_dir)
+        """
+        if self._extracted_all:
+            return self.root_dir
+        path = self._make_extract_dir()
+        if self._is_zip:
+            with zipfile.ZipFile(self.filename) as zip_file:
+                zip_file.extractall(path)
+        else:
+            with tarfile.open(self.filename) as tar_file:
+                for m in tar_file:
+                    self._extract_tar_member(tar_file, m, path)
+        self._extracted_all = True
+        return self.root_dir
+
+    @classmethod
+    def of(cls, archive):
+        """Return archive if it already is an ArchiveIndex, else index the file"""
+        return archive if isinstance(archive, cls) else cls(archive)
+
+    @property
+    def root_dir(self):
+        """The toplevel directory of the extracted sdist (None if not extracted)"""
+        if self.extract_dir is None:
+            return None
+        entries = os.listdir(self.extract_dir)
+        if len(entries) == 1 and os.path.isdir(os.path.join(self.extract_dir, entries[0])):
+            return os.path.join(self.extract_dir, entries[0])
+        return self.extract_dir
+
+    def close(self):
+        self._remove_extract_dir()
+        self._extracted_all = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@contextmanager
+def file_lock(filename, mode=fcntl.LOCK_EX):
+    """Hold an flock() of filename (created if missing), which is shared
+    with other processes. mode is fcntl.LOCK_EX or fcntl.LOCK_SH."""
+    with open(filename, 'a') as f:
+        fcntl.flock(f, mode)
+        try:
+            yield f
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def evict_lru(entries, max_size, remove):
+    """Remove the least recently used entries until the rest fits max_size.
+
+    entries are (last use, size, path) tuples. remove(path) removes an
+    entry and may return False if it can not be removed now, e.g. since it
+    is in use.
+
+    Returns:
+        the total size of the remaining entries
+    """
+    entries = sorted(entries)
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= max_size:
+            break
+        if remove(path) is False:
+            continue
+        total -= size
+    return total
+
+
+def atomic_write(filename, data, keep_mode=False):
+    # type: (str, bytes, bool) -> None
+    """Replace filename with data at once, readers see either the old or
+    the new content. With keep_mode, the new file gets the permissions of
+    the old one. The temporary file is removed if writing fails."""
+    directory = os.path.dirname(filename) or os.curdir
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        if keep_mode:
+            shutil.copymode(filename, tmp)
+        os.replace(tmp, filename)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def sha256sum(filename):
+    # type: (str) -> str
+    """Return the hex sha256 digest of the file content"""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# %{key} but not the escaped %%{key}
+_PLACEHOLDER_RE = re.compile(r'(?<!%)%{([^}]*)}')
+_GLOB_MAGIC_RE = re.compile(r'[*?[]')
+
+
+def replace_placeholders(template, replaces):
+    # type: (str, Dict[str, str]) -> str
+    """Replace %{key} in template with replaces[key], %% is a literal %"""
+    def replace(match):
+        if match.group(1) in replaces:
+            return replaces[match.group(1)].replace('%', '%%')
+        return match.group(0)
+    return _PLACEHOLDER_RE.sub(replace, template).replace('%%', '%')
+
+
+class SourceIndex(object):
+    """Find source archives with a glob template like '%{name}-%{version}.*'.
+
+    Instead of a glob reading the whole directory for every package, each
+    directory is listed once (again when its mtime changes) and kept
+    sorted. A lookup is a binary search for the literal start of the
+    pattern and a match of the few names found there.
+    """
+
+    def __init__(self, template):
+        self.template = template
+        # literal parts and placeholder names alternate
+        self._parts = _PLACEHOLDER_RE.split(template)
+        self._listings = {}  # absolute directory: (mtime, sorted names)
+
+    def pattern(self, replaces):
+        # type: (Dict[str, str]) -> str
+        """The glob pattern for replaces, like replace_placeholders()"""
+        parts = list(self._parts)
+        for i in range(1, len(parts), 2):
+            if parts[i] in replaces:
+                parts[i] = replaces[parts[i]].replace('%', '%%')
+            else:
+                parts[i] = '%{' + parts[i] + '}'
+        return ''.join(parts).replace('%%', '%')
+
+    def _listing(self, directory):
+        directory = os.path.abspath(directory or os.curdir)
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return []
+        listing = self._listings.get(directory)
+        if listing is None or listing[0] != mtime:
+            listing = (mtime, sorted(os.listdir(directory)))
+            self._listings[directory] = listing
+        return listing[1]
+
+    def find(self, name, version):
+        # type: (str, str) -> List[str]
+        """Return the files matching the template for name and version,
+        like glob.glob() but sorted"""
+        pattern = self.pattern({'name': name, 'version': version})
+        directory, basename = os.path.split(pattern)
+        if _GLOB_MAGIC_RE.search(directory):
+            return sorted(glob.glob(pattern))
+        names = self._listing(directory)
+        prefix = _GLOB_MAGIC_RE.split(basename, 1)[0]
+        match = re.compile(fnmatch.translate(basename)).match
+        hidden = basename.startswith('.')
+        found = []
+        for i in range(bisect.bisect_left(names, prefix), len(names)):
+            if not names[i].startswith(prefix):
+                break
+            if match(names[i]) and (hidden or not names[i].startswith('.')):
+                found.append(os.path.join(directory, names[i]))
+        return found
+
+
+_source_indexes = {}  # type: Dict[str, SourceIndex]
+
+
+def get_source_index(template):
+    # type: (str) -> SourceIndex
+    """Return the SourceIndex for template, shared by all callers"""
+    index = _source_indexes.get(template)
+    if index is None:
+        index = _source_indexes.setdefault(template, SourceIndex(template))
+    return index
 
 
 def _get_archive_filelist(filename):
-    # type: (str) -> List[str]
+    # type: (Union[str, ArchiveIndex]) -> List[str]
     """Extract the list of files from a tar or zip archive.
 
     Args:
-        filename: name of the archive
+        filename: name of the archive or its ArchiveIndex
 
     Returns:
         Sorted list of files in the archive, excluding './'
@@ -50,49 +388,27 @@ def _get_archive_filelist(filename):
         FileNotFoundError: when the provided file does not exist (for Python 3)
         IOError: when the provided file does not exist (for Python 2)
     """
-    names = []  # type: List[str]
-    if tarfile.is_tarfile(filename):
-        with tarfile.open(filename) as tar_file:
-            names = sorted(tar_file.getnames())
-    elif zipfile.is_zipfile(filename):
-        with zipfile.ZipFile(filename) as zip_file:
-            names = sorted(zip_file.namelist())
-    else:
-        raise ValueError("Can not get filenames from '{!s}'. "
-                         "Not a tar or zip file".format(filename))
-    if "./" in names:
-        names.remove("./")
-    return names
+    return ArchiveIndex.of(filename).names
 
 
 def parse_pyproject(archive):
     """Parse the pyproject.toml in the archive and return the metadata as dict.
 
     Args:
-        archive: the filename of the archive
+        archive: the filename of the archive or its ArchiveIndex
 
     Returns:
         dict of metadata. Empty if no pyproject.toml was found in the toplevel directory
     """
-    pyproject = {}
-    if tarfile.is_tarfile(archive):
-        with tarfile.open(archive) as tar_file:
-            for m in tar_file:
-                if m.name.endswith('pyproject.toml') and m.name.count("/") == 1:
-                    with tar_file.extractfile(m) as fh:
-                        pyproject = toml.load(fh)
-                    break
-    elif zipfile.is_zipfile(archive):
-        with zipfile.ZipFile(archive) as zip_file:
-            for name in zip_file.namelist():
-                if name.endswith('pyproject.toml') and name.count("/") == 1:
-                    with zip_file.open(name) as fh:
-                        pyproject = toml.load(fh)
-                    break
-    else:
-        raise ValueError("Can not extract pyproject.toml from '{!s}'. "
-                         "Not a tar or zip file".format(archive))
-    return pyproject
+    try:
+        import tomllib as toml
+    except ModuleNotFoundError:
+        import tomli as toml
+
+    content = ArchiveIndex.of(archive).files.get('pyproject.toml')
+    if content is None:
+        return {}
+    return toml.loads(content.decode('utf-8'))
 
 
 def get_pyproject_table(data, key, notfound=None):
@@ -129,6 +445,8 @@ def get_setuptools_scripts(data):
     Returns:
         list of script names
     """
+    from backports.entry_points_selectable import EntryPoint, EntryPoints
+
     entry_points = data.get('entry_points', None)
     if isinstance(entry_points, str):
         eps = EntryPoints(EntryPoints._from_text(entry_points))
@@ -144,54 +462,224 @@ def get_setuptools_scripts(data):
     return scripts
 
 
-@contextmanager
-def _extract_to_tempdir(archive_filename):
-    """extract the given tarball or zipfile to a tempdir and change
-    the cwd to the new tempdir. Delete the tempdir at the end"""
-    if not os.path.exists(archive_filename):
-        raise Exception("Archive '%s' does not exist" % (archive_filename))
-
-    tempdir = tempfile.mkdtemp(prefix="py2pack_")
-    current_cwd = os.getcwd()
-    try:
-        if tarfile.is_tarfile(archive_filename):
-            with tarfile.open(archive_filename) as f:
-                f.extractall(tempdir)
-        elif zipfile.is_zipfile(archive_filename):
-            with zipfile.ZipFile(archive_filename) as f:
-                f.extractall(tempdir)
-        else:
-            raise Exception("Can not extract '%s'. "
-                            "Not a tar or zip file" % archive_filename)
-        os.chdir(tempdir)
-        yield tempdir
-    finally:
-        os.chdir(current_cwd)
-        shutil.rmtree(tempdir)
+_JSON_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+# strings and brackets, everything else does not change the nesting depth
+_JSON_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[\[\]{}]', re.DOTALL)
+
 
+def _json_skip_value(text, pos, decoder):
+    """Return the position after the JSON value starting at text[pos]
+    without building python objects for it"""
+    if text[pos] not in '[{':
+        return decoder.raw_decode(text, pos)[1]
+    depth = 0
+    for m in _JSON_TOKEN_RE.finditer(text, pos):
+        token = m.group()
+        if token in ('[', '{'):
+            depth += 1
+        elif token in (']', '}'):
+            depth -= 1
+            if depth == 0:
+                return m.end()
+    raise ValueError("Unterminated JSON value at position {0}".format(pos))
 
-def get_metadata(filename):
+
+def json_select(text, keys):
+    # type: (str, List[str]) -> dict
+    """Decode only some members of a JSON object.
+
+    The members of the toplevel object are scanned in order. Values of
+    members not in keys are skipped without decoding them, and scanning
+    stops as soon as all keys were found. This is much cheaper than
+    json.loads() for documents with large unneeded members, like the
+    "releases" of the PyPI JSON API.
+
+    Args:
+        text: JSON document, its toplevel value must be an object
+        keys: names of the members to decode
+
+    Returns:
+        dict with the found members
+
+    Raises:
+        ValueError: when the document is no valid JSON object
     """
-    Extracts metadata from the archive filename
+    decoder = json.JSONDecoder()
+    wanted = set(keys)
+    result = {}
+
+    def skip_ws(pos):
+        return _JSON_WHITESPACE_RE.match(text, pos).end()
+
+    pos = skip_ws(0)
+    if text[pos:pos + 1] != '{':
+        raise ValueError("Not a JSON object")
+    pos = skip_ws(pos + 1)
+    while wanted - result.keys() and text[pos:pos + 1] != '}':
+        key, pos = decoder.raw_decode(text, pos)
+        pos = skip_ws(pos)
+        if text[pos:pos + 1] != ':':
+            raise ValueError("Expecting ':' at position {0}".format(pos))
+        pos = skip_ws(pos + 1)
+        if key in wanted:
+            result[key], pos = decoder.raw_decode(text, pos)
+        else:
+            pos = _json_skip_value(text, pos, decoder)
+        pos = skip_ws(pos)
+        if text[pos:pos + 1] == ',':
+            pos = skip_ws(pos + 1)
+    return result
+
+
+def run_metaextract(source_dir, py_interpreter=sys.executable):
+    """Get the setuptools metadata of an unpacked sdist with metaextract.
+
+    Like metaextract.utils._setup_py_run_from_dir(), but the setup.py runs
+    with source_dir as its working directory instead of changing the
+    working directory of the whole process.
+
+    Returns:
+        the JSON blob written by metaextract, with 'data' holding the metadata
     """
+    setup_py = os.path.join(source_dir, "setup.py")
+    if not os.path.exists(setup_py):
+        if not os.path.exists(os.path.join(source_dir, "pyproject.toml")):
+            raise Exception("'setup.py' does not exist in '%s'" % source_dir)
+        # Create it for pyproject.toml without setup.py
+        with open(setup_py, "w") as f:
+            f.write("from setuptools import setup\nsetup()\n")
+
+    with tempfile.NamedTemporaryFile(mode="r", suffix=".json") as output_json:
+        cmd = [py_interpreter, "setup.py", "-q", "--command-packages", "metaextract",
+               "metaextract", "-o", output_json.name]
+        try:
+            subprocess.check_output(cmd, cwd=source_dir, stderr=subprocess.STDOUT)
+        except subprocess.CalledProcessError:
+            # try again with a encoding in setup.py
+            with open(setup_py, "r+") as f:
+                content = f.read()
+                f.seek(0, 0)
+                f.write("# -*- coding: utf-8 -*-\n" + content)
+            subprocess.check_output(cmd, cwd=source_dir)
+        data = json.load(output_json)
+
+    # sort some of the keys if the dict values are lists
+    for key in ['data_files', 'entry_points', 'extras_require',
+                'install_requires', 'setup_requires', 'scripts',
+                'tests_require', 'tests_suite']:
+        if key in data['data'] and isinstance(data['data'][key], list):
+            data['data'][key] = sorted(data['data'][key])
+    return data
+
+
+# data key -> core metadata field, for the fields py2pack uses
+_METADATA_FIELDS = [
+    ('home_page', 'Home-page'),
+    ('name', 'Name'),
+    ('version', 'Version'),
+    ('description', 'Description'),
+    ('summary', 'Summary'),
+    ('license', 'License'),
+    ('keywords', 'Keywords'),
+    ('author', 'Author'),
+    ('author_email', 'Author-email'),
+    ('maintainer', 'Maintainer'),
+    ('maintainer_email', 'Maintainer-email'),
+]
+_METADATA_MULTIPLE_FIELDS = [
+    ('install_requires', 'Requires-Dist'),
+]
+
+
+def _metadata_to_data(mdata):
     data = {}
+    for key, field in _METADATA_FIELDS:
+        data[key] = mdata.get(field)
+    for key, field in _METADATA_MULTIPLE_FIELDS:
+        data[key] = mdata.get_all(field)
+    if data['description'] is None and hasattr(mdata, 'get_payload'):
+        # since Metadata-Version 2.1 the description is the message body
+        payload = mdata.get_payload()
+        if isinstance(payload, str) and payload.strip():
+            data['description'] = payload
+    return data
+
 
-    with _extract_to_tempdir(filename) as root_dir:
-        dir_list, *_ = os.listdir(root_dir)
-        path = os.path.join(root_dir, dir_list)
-        mdata = project_wheel_metadata(path, isolated=True)
-
-        data['home_page'] = mdata.get('Home-page')
-        data['name'] = mdata.get('Name')
-        data['version'] = mdata.get('Version')
-        data['description'] = mdata.get('Description')
-        data['summary'] = mdata.get('Summary')
-        data['license'] = mdata.get('License')
-        data['keywords'] = mdata.get('Keywords')
-        data['author'] = mdata.get('Author')
-        data['author_email'] = mdata.get('Author-email')
-        data['maintainer'] = mdata.get('Maintainer')
-        data['maintainer_email'] = mdata.get('Maintainer-email')
-        data['install_requires'] = mdata.get_all('Requires-Dist')
+def get_static_metadata(archive):
+    """Read the PKG-INFO in the toplevel directory of the archive.
 
+    Since Metadata-Version 2.2 (PEP 643), all fields of a sdist PKG-INFO
+    which are not marked as Dynamic are exactly the ones a build produces.
+
+    Args:
+        archive: the filename of the archive or its ArchiveIndex
+
+    Returns:
+        tuple of the parsed PKG-INFO (None if there is none) and the set of
+        fields py2pack needs but can not take from it. For metadata older
+        than 2.2, that are all fields.
+    """
+    from email.parser import Parser
+    from packaging.version import InvalidVersion, Version
+
+    content = ArchiveIndex.of(archive).files.get('PKG-INFO')
+    needed = {field.lower() for _, field in _METADATA_FIELDS + _METADATA_MULTIPLE_FIELDS}
+    if content is None:
+        return None, needed
+    pkg_info = Parser().parsestr(content.decode('utf-8', errors='replace'))
+    try:
+        static = Version(pkg_info.get('Metadata-Version', '1.0')) >= Version('2.2')
+    except InvalidVersion:
+        static = False
+    if not static:
+        return pkg_info, needed
+    dynamic = {field.lower() for field in pkg_info.get_all('Dynamic', [])}
+    return pkg_info, needed & dynamic
+
+
+def _project_wheel_metadata(path):
+    from build.util import project_wheel_metadata
+
+    pool = py2pack.buildenv.get_pool()
+    if pool is None:
+        return project_wheel_metadata(path, isolated=True)
+    return py2pack.buildenv.project_wheel_metadata(path, pool)
+
+
+def _build_metadata(archive):
+    """build the metadata of the sdist in an isolated environment"""
+    if isinstance(archive, ArchiveIndex):
+        # the backend may need any file of the sdist
+        return _project_wheel_metadata(archive.extract())
+    with ArchiveIndex(archive, extract=True) as index:
+        return _project_wheel_metadata(index.root_dir)
+
+
+def get_metadata(filename, source='auto'):
+    """
+    Extracts metadata from the archive filename (or ArchiveIndex)
+
+    source selects where the metadata comes from: 'build' always builds the
+    metadata with the build backend, 'static' only uses the PKG-INFO of the
+    sdist and 'auto' uses the PKG-INFO and builds only if some of the
+    needed fields are dynamic (or the PKG-INFO is older than PEP 643).
+
+    Raises:
+        ValueError: for source 'static' if the archive has no PKG-INFO
+    """
+    pkg_info, dynamic = (None, None) if source == 'build' else get_static_metadata(filename)
+    if source == 'static':
+        if pkg_info is None:
+            raise ValueError("No PKG-INFO in '{!s}'".format(getattr(filename, 'filename', filename)))
+        return _metadata_to_data(pkg_info)
+    if pkg_info is not None and not dynamic:
+        return _metadata_to_data(pkg_info)
+
+    data = _metadata_to_data(_build_metadata(filename))
+    if pkg_info is not None:
+        # keep the static fields, take only the dynamic ones from the build
+        static_data = _metadata_to_data(pkg_info)
+        for key, field in _METADATA_FIELDS + _METADATA_MULTIPLE_FIELDS:
+            if field.lower() not in dynamic:
+                data[key] = static_data[key]
     return data
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import pytest
+
+import py2pack
+import py2pack.buildenv
+import py2pack.cache
+import py2pack.index
+import py2pack.store
+
+
+def _reset():
+    # the default directories are looked up again
+    py2pack.cache.configure()
+    py2pack.cache.configure_metadata_cache()
+    py2pack.cache.configure_template_cache()
+    py2pack._template_envs.clear()
+    py2pack.buildenv.configure()
+    py2pack.index.configure()
+    py2pack.store.configure()
+
+
+@pytest.fixture(autouse=True)
+def isolated_user_dirs(tmp_path, monkeypatch):
+    """Keep every test away from the caches and the configuration of the
+    user, so that results cached by earlier runs can not be used"""
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(tmp_path / 'config'))
+    _reset()
+    yield
+    monkeypatch.undo()
+    _reset()
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+try:
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+    import py2pack.aio
+except ImportError:
+    web = None
+
+import py2pack.cache
+
+
+@unittest.skipIf(web is None, "aiohttp is not installed")
+class Py2packAioTestCase(unittest.IsolatedAsyncioTestCase):
+    DATA = b'0123456789' * 1000
+
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='py2pack_test_')
+        py2pack.cache.configure(directory=os.path.join(self.tmpdir, 'http'))
+        self.requests = []
+        self.running = self.max_running = 0
+        app = web.Application()
+        app.router.add_get('/slow/{i}', self._slow)
+        app.router.add_get('/files/{name}', self._file)
+        app.router.add_get('/simple/', self._simple)
+        app.router.add_get('/flaky', self._flaky)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+        py2pack.cache.configure()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    async def _slow(self, request):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.02)
+        self.running -= 1
+        return web.Response(body=request.match_info['i'].encode(), headers={'ETag': '"x"'})
+
+    async def _file(self, request):
+        self.requests.append(dict(request.headers))
+        if request.headers.get('Range'):
+            start = int(request.headers['Range'][len('bytes='):-1])
+            return web.Response(status=206, body=self.DATA[start:])
+        return web.Response(body=self.DATA)
+
+    async def _flaky(self, request):
+        self.requests.append(dict(request.headers))
+        if len(self.requests) < 3:
+            return web.Response(status=429, headers={'Retry-After': '0'})
+        return web.Response(body=b'ok')
+
+    async def _simple(self, request):
+        if request.headers.get('If-None-Match') == '"v1"':
+            return web.Response(status=304)
+        body = json.dumps({'projects': [{'name': 'pytest'}, {'name': 'Django'}, {'name': 'py2pack'}]})
+        return web.Response(body=body.encode(), content_type='application/vnd.pypi.simple.v1+json',
+                            headers={'ETag': '"v1"'})
+
+    async def test_per_host_limit(self):
+        async with py2pack.aio.Client(per_host=3) as client:
+            bodies = await asyncio.gather(*(client.cached_get(str(self.server.make_url('/slow/{0}'.format(i))))
+                                            for i in range(20)))
+        self.assertEqual(bodies, [str(i).encode() for i in range(20)])
+        self.assertEqual(self.max_running, 3)
+        # stored in the shared cache
+        self.assertEqual(py2pack.cache.get_cache().get(str(self.server.make_url('/slow/7'))).body, b'7')
+
+    async def test_retry(self):
+        async with py2pack.aio.Client() as client:
+            limit = client.host_limit(str(self.server.make_url('/')))
+            before = limit.limit
+            self.assertEqual(await client.cached_get(str(self.server.make_url('/flaky'))), b'ok')
+        self.assertEqual(len(self.requests), 3)
+        self.assertLess(limit.limit, before)
+
+    async def test_download_resume(self):
+        filename = os.path.join(self.tmpdir, 'foo-1.0.tar.gz')
+        with open(filename + '.part', 'wb') as f:
+            f.write(self.DATA[:1234])
+        async with py2pack.aio.Client() as client:
+            await client.download(str(self.server.make_url('/files/foo-1.0.tar.gz')), filename,
+                                  sha256=hashlib.sha256(self.DATA).hexdigest())
+        self.assertEqual(self.requests[0]['Range'], 'bytes=1234-')
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), self.DATA)
+
+    async def test_file_work_off_loop(self):
+        # blocking file work does not run in the thread of the event loop
+        threads = []
+
+        def record(func):
+            def wrapper(*args, **kwargs):
+                threads.append(threading.current_thread())
+                return func(*args, **kwargs)
+            return wrapper
+
+        with mock.patch('py2pack.cache.lookup', record(py2pack.cache.lookup)), \
+                mock.patch('py2pack.cache.store', record(py2pack.cache.store)), \
+                mock.patch('py2pack.net.resume_state', record(py2pack.net.resume_state)), \
+                mock.patch('py2pack.net.finish_download', record(py2pack.net.finish_download)), \
+                mock.patch('py2pack.index._store_names', record(py2pack.index._store_names)), \
+                mock.patch('py2pack.aio.open', record(open), create=True):
+            async with py2pack.aio.Client() as client:
+                await client.cached_get(str(self.server.make_url('/slow/1')))
+                await client.download(str(self.server.make_url('/files/foo-1.0.tar.gz')),
+                                      os.path.join(self.tmpdir, 'foo-1.0.tar.gz'))
+                # a file:// mirror: reading and writing
+                await client.download('file://' + os.path.join(self.tmpdir, 'foo-1.0.tar.gz'),
+                                      os.path.join(self.tmpdir, 'copy.tar.gz'))
+                await client.refresh_index(os.path.join(self.tmpdir, 'index'),
+                                           str(self.server.make_url('/simple/')))
+        # lookup, store, resume_state and finish_download of both downloads,
+        # open of both .part files and of the mirror file, _store_names
+        self.assertEqual(len(threads), 10)
+        self.assertNotIn(threading.current_thread(), threads)
+
+    async def test_download_hash_mismatch(self):
+        filename = os.path.join(self.tmpdir, 'foo-1.0.tar.gz')
+        async with py2pack.aio.Client() as client:
+            with self.assertRaises(ValueError):
+                await client.download(str(self.server.make_url('/files/foo-1.0.tar.gz')), filename, sha256='0' * 64)
+        self.assertFalse(os.path.exists(filename))
+
+    async def test_list_packages(self):
+        url = str(self.server.make_url('/simple/'))
+        directory = os.path.join(self.tmpdir, 'index')
+        async with py2pack.aio.Client() as client:
+            self.assertTrue(await client.refresh_index(directory, url))
+            self.assertFalse(await client.refresh_index(directory, url))
+            self.assertEqual(await client.list_packages('py', directory=directory), ['py2pack', 'pytest'])
+
+    async def test_file_mirror(self):
+        os.makedirs(os.path.join(self.tmpdir, 'mirror', 'packages'))
+        with open(os.path.join(self.tmpdir, 'mirror', 'packages', 'foo-1.0.tar.gz'), 'wb') as f:
+            f.write(self.DATA)
+        url = 'file://' + os.path.join(self.tmpdir, 'mirror', 'packages', 'foo-1.0.tar.gz')
+        filename = os.path.join(self.tmpdir, 'foo-1.0.tar.gz')
+        async with py2pack.aio.Client() as client:
+            self.assertEqual(await client.cached_get(url), self.DATA)
+            await client.download(url, filename, sha256=hashlib.sha256(self.DATA).hexdigest())
+            with self.assertRaises(FileNotFoundError):
+                await client.download(url + '.missing', filename + '.missing')
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), self.DATA)
+
+    async def test_pypi_json(self):
+        versions = {'https://pypi.org/simple/foo/': json.dumps(
+            {'files': [{'filename': 'foo-1.0.tar.gz'}, {'filename': 'foo-2.0b1.tar.gz'}]}).encode(),
+            'https://pypi.org/pypi/foo/1.0/json': b'{"info": {"name": "foo", "version": "1.0"}, "urls": []}'}
+
+        async def cached_get(url, immutable=False, accept=None):
+            return versions[url]
+
+        async with py2pack.aio.Client() as client:
+            with mock.patch.object(client, 'cached_get', side_effect=cached_get):
+                data = await client.pypi_json('foo')
+        self.assertEqual(data['info']['version'], '1.0')
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import concurrent.futures
+import copy
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+from unittest import mock
+
+import py2pack.api
+import py2pack.cache
+
+
+def _metadata(name):
+    return {
+        'info': {'name': name, 'version': '1.0', 'summary': 'The {0} package.'.format(name),
+                 'license': 'MIT', 'home_page': 'https://example.com/' + name,
+                 'classifiers': [], 'requires_dist': None},
+        'urls': [{'packagetype': 'sdist', 'filename': name + '-1.0.tar.gz',
+                  'url': 'https://example.com/' + name + '-1.0.tar.gz'}],
+    }
+
+
+class Py2packApiTestCase(unittest.TestCase):
+    PYPROJECT = b'[build-system]\nrequires = ["hatchling"]\nbuild-backend = "hatchling.build"\n'
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='py2pack_test_')
+        py2pack.cache.configure_metadata_cache(directory=os.path.join(self.tmpdir, 'cache'))
+
+    def tearDown(self):
+        py2pack.cache.configure_metadata_cache()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _create_sdist(self, name):
+        sdist = os.path.join(self.tmpdir, name + '-1.0.tar.gz')
+        pkg_info = ("Metadata-Version: 2.3\nName: {0}\nVersion: 1.0\nSummary: {0} from sdist\n"
+                    "License: MIT\nRequires-Dist: requests>=2\n".format(name)).encode()
+        with tarfile.open(sdist, "w:gz") as tar:
+            for member, content in [("pyproject.toml", self.PYPROJECT), ("PKG-INFO", pkg_info),
+                                    ("LICENSE", b"")]:
+                info = tarfile.TarInfo("{0}-1.0/{1}".format(name, member))
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+        return sdist
+
+    def test_generate_spec(self):
+        metadata = _metadata('foo')
+        original = copy.deepcopy(metadata)
+        with self.assertWarns(UserWarning):
+            spec = py2pack.api.generate_spec('foo', '1.0', 'opensuse.spec', metadata=metadata)
+        self.assertIn('Name:           python-foo', spec)
+        self.assertIn('Source:         https://files.pythonhosted.org/packages/source/f/foo/foo-%{version}.tar.gz',
+                      spec)
+        self.assertEqual(metadata, original)
+
+    def test_generate_spec_archive(self):
+        spec = py2pack.api.generate_spec('foo', '1.0', 'opensuse.spec', archive=self._create_sdist('foo'),
+                                         metadata=_metadata('foo'))
+        self.assertIn('BuildRequires:  %{python_module hatchling}', spec)
+        self.assertIn('Requires:       python-requests >= 2', spec)
+        self.assertIn('%license LICENSE', spec)
+
+    @mock.patch('py2pack.pypi_json')
+    def test_generate_spec_no_release(self, pypi_json):
+        pypi_json.return_value = {'info': {'name': 'foo', 'version': '1.0'}, 'urls': []}
+        with self.assertRaises(ValueError):
+            py2pack.api.generate_spec('foo')
+
+    def test_generate_spec_threads(self):
+        names = ['pkg{0}'.format(i) for i in range(16)]
+        archives = {name: self._create_sdist(name) for name in names}
+        cwd = os.getcwd()
+
+        def generate(name):
+            return py2pack.api.generate_spec(name, '1.0', 'opensuse.spec', archive=archives[name],
+                                             metadata=_metadata(name))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+            specs = dict(zip(names, pool.map(generate, names)))
+        self.assertEqual(os.getcwd(), cwd)
+        for name in names:
+            self.assertEqual(specs[name], generate(name))
+            self.assertIn('Name:           python-{0}\n'.format(name), specs[name])
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import py2pack.batch
+
+
+def _pypi_json(name, version=None):
+    if name == 'missing':
+        return {'message': 'Not Found'}
+    return {'info': {'name': name, 'version': version or '1.0', 'summary': name, 'license': 'MIT',
+                     'classifiers': [], 'requires_dist': None},
+            'urls': [{'packagetype': 'sdist', 'filename': '{0}-{1}.tar.gz'.format(name, version or '1.0'),
+                      'url': 'https://example.com/', 'digests': {}}]}
+
+
+class Py2packBatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='py2pack_test_')
+        self.args = argparse.Namespace(
+            file=os.path.join(self.tmpdir, 'packages.txt'), directory=self.tmpdir, template='opensuse.spec',
+            jobs=4, processes=0, metadata='auto', no_metadata_cache=True,
+            config=os.path.join(self.tmpdir, 'nonexistent.conf'), pool_size=None, connect_timeout=None,
+            read_timeout=None, cache_dir=os.path.join(self.tmpdir, 'cache'), cache_ttl=None, no_cache=True)
+        with open(self.args.file, 'w') as f:
+            f.write("# packages\nfoo\nbar==2.0\n\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _create_sdist(self, name, version):
+        content = ("Metadata-Version: 2.3\nName: {0}\nVersion: {1}\n"
+                   "Requires-Dist: requests\n".format(name, version)).encode()
+        filename = os.path.join(self.tmpdir, '{0}-{1}.tar.gz'.format(name, version))
+        with tarfile.open(filename, 'w:gz') as tar:
+            for member, data in [('PKG-INFO', content), ('pyproject.toml', b'[build-system]\nrequires = ["flit_core"]\n')]:
+                info = tarfile.TarInfo('{0}-{1}/{2}'.format(name, version, member))
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+    def test_parse_entries(self):
+        self.assertEqual(py2pack.batch.parse_entries(['foo', ' bar == 1.0 # pinned', '', '# comment']),
+                         [('foo', None), ('bar', '1.0')])
+
+    @mock.patch('py2pack.net.download')
+    @mock.patch('py2pack.pypi_json', side_effect=_pypi_json)
+    def test_generate_batch(self, pypi_json, download):
+        self._create_sdist('foo', '1.0')
+        self._create_sdist('bar', '2.0')
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            py2pack.batch.generate_batch(self.args)
+        download.assert_not_called()
+        self.assertIn('2 generated, 0 unchanged, 0 failed', stdout.getvalue())
+        with open(os.path.join(self.tmpdir, 'python-bar.spec')) as f:
+            spec = f.read()
+        self.assertIn('Version:        2.0', spec)
+        self.assertIn('BuildRequires:  %{python_module flit_core}', spec)
+
+    @mock.patch('py2pack.net.download')
+    @mock.patch('py2pack.pypi_json', side_effect=_pypi_json)
+    def test_generate_batch_unchanged(self, pypi_json, download):
+        self._create_sdist('foo', '1.0')
+        self._create_sdist('bar', '2.0')
+        with mock.patch('sys.stdout', new_callable=io.StringIO):
+            py2pack.batch.generate_batch(self.args)
+        with open(os.path.join(self.tmpdir, 'python-bar.spec'), 'a') as f:
+            f.write('# edited\n')
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            py2pack.batch.generate_batch(self.args)
+        self.assertIn('unchanged {0} 1.0'.format(os.path.join(self.tmpdir, 'python-foo.spec')), stdout.getvalue())
+        self.assertIn('1 generated, 1 unchanged, 0 failed', stdout.getvalue())
+        self.args.force = True
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            py2pack.batch.generate_batch(self.args)
+        self.assertIn('2 generated, 0 unchanged, 0 failed', stdout.getvalue())
+
+    @mock.patch('py2pack.net.download')
+    @mock.patch('py2pack.pypi_json', side_effect=_pypi_json)
+    def test_generate_batch_process_pool(self, pypi_json, download):
+        self._create_sdist('foo', '1.0')
+        self._create_sdist('bar', '2.0')
+        self.args.processes = 2
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            py2pack.batch.generate_batch(self.args)
+        self.assertIn('2 generated, 0 unchanged, 0 failed', stdout.getvalue())
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, 'python-foo.spec')))
+
+    @mock.patch('py2pack.net.download')
+    @mock.patch('py2pack.pypi_json', side_effect=_pypi_json)
+    def test_generate_batch_templates(self, pypi_json, download):
+        self._create_sdist('foo', '1.0')
+        with open(self.args.file, 'w') as f:
+            f.write("foo\n")
+        self.args.template = ['opensuse.spec', 'fedora.spec']
+        with mock.patch('py2pack.spec_data', wraps=py2pack.spec_data) as spec_data:
+            with mock.patch('sys.stdout', new_callable=io.StringIO):
+                py2pack.batch.generate_batch(self.args)
+        spec_data.assert_called_once()
+        for name in ['python-foo.opensuse.spec', 'python-foo.fedora.spec']:
+            self.assertTrue(os.path.exists(os.path.join(self.tmpdir, name)))
+
+    @mock.patch('py2pack.net.download')
+    @mock.patch('py2pack.pypi_json', side_effect=_pypi_json)
+    def test_generate_batch_failure(self, pypi_json, download):
+        self._create_sdist('foo', '1.0')
+        with open(self.args.file, 'w') as f:
+            f.write("foo\nmissing\n")
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            with self.assertRaises(SystemExit):
+                py2pack.batch.generate_batch(self.args)
+        self.assertIn('failed    missing: unable to find a suitable release', stdout.getvalue())
+        self.assertIn('1 generated, 0 unchanged, 1 failed', stdout.getvalue())
+
+
+class Py2packPipelineTestCase(unittest.TestCase):
+    def test_pipeline(self):
+        def first(job):
+            if job.name == 'bad':
+                raise ValueError('bad package')
+            job.filename = job.name + '.spec'
+
+        def second(job):
+            time.sleep(0.01)
+            job.version = '1.0'
+
+        pipeline = py2pack.batch.Pipeline([py2pack.batch.Stage('first', first, 4),
+                                           py2pack.batch.Stage('second', second, 1, maxsize=2)])
+        names = ['pkg{0}'.format(i) for i in range(20)] + ['bad']
+        jobs = {job.name: job for job in pipeline.run(py2pack.batch.Job(n) for n in names)}
+        self.assertEqual(sorted(jobs), sorted(names))
+        self.assertEqual(str(jobs['bad'].error), 'bad package')
+        self.assertIsNone(jobs['bad'].version)
+        self.assertEqual(jobs['pkg3'].version, '1.0')
+        first_stats, second_stats = pipeline.stats()
+        self.assertEqual(first_stats['processed'], 21)
+        self.assertEqual(second_stats['processed'], 20)
+        # the slow stage holds back the fast one
+        self.assertLessEqual(second_stats['max_depth'], 2)
+        self.assertEqual(second_stats['depth'], 0)
+        self.assertGreater(second_stats['throughput'], 0)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import py2pack.buildenv
+
+# in-tree PEP 517 backend without requirements, so no network is needed
+BACKEND = '''
+import os
+
+
+def get_requires_for_build_wheel(config_settings=None):
+    return []
+
+
+def prepare_metadata_for_build_wheel(metadata_directory, config_settings=None):
+    distinfo = os.path.join(metadata_directory, "foo-1.0.dist-info")
+    os.mkdir(distinfo)
+    with open(os.path.join(distinfo, "METADATA"), "w") as f:
+        f.write("Metadata-Version: 2.1\\nName: foo\\nVersion: 1.0\\nRequires-Dist: bar\\n")
+    return "foo-1.0.dist-info"
+
+
+def build_wheel(wheel_directory, config_settings=None, metadata_directory=None):
+    raise NotImplementedError
+'''
+PYPROJECT = '''
+[build-system]
+requires = []
+build-backend = "backend"
+backend-path = ["."]
+'''
+
+
+class Py2packBuildEnvTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='py2pack_test_')
+        self.project = os.path.join(self.tmpdir, 'foo-1.0')
+        os.mkdir(self.project)
+        with open(os.path.join(self.project, 'backend.py'), 'w') as f:
+            f.write(BACKEND)
+        with open(os.path.join(self.project, 'pyproject.toml'), 'w') as f:
+            f.write(PYPROJECT)
+        self.pool = py2pack.buildenv.BuildEnvPool(os.path.join(self.tmpdir, 'pool'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_normalize_requires(self):
+        self.assertEqual(py2pack.buildenv.normalize_requires(['Setuptools>=40', 'wheel', 'setuptools >= 40']),
+                         ('setuptools>=40', 'wheel'))
+        self.assertEqual(py2pack.buildenv.BuildEnvPool.key(['Hatchling']),
+                         py2pack.buildenv.BuildEnvPool.key(['hatchling']))
+
+    def test_project_wheel_metadata_reuses_env(self):
+        with mock.patch.object(py2pack.buildenv.BuildEnv, 'create',
+                               autospec=True, side_effect=py2pack.buildenv.BuildEnv.create) as create:
+            for _ in range(2):
+                mdata = py2pack.buildenv.project_wheel_metadata(self.project, self.pool)
+                self.assertEqual(mdata['Name'], 'foo')
+                self.assertEqual(mdata.get_all('Requires-Dist'), ['bar'])
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(len([d for d in os.listdir(self.pool.directory) if not d.endswith('.lock')]), 1)
+
+    def test_project_wheel_metadata_overlay(self):
+        # requirements of get_requires_for_build_wheel are only there for this build
+        with open(os.path.join(self.project, 'backend.py'), 'w') as f:
+            f.write(BACKEND.replace('return []', 'return ["dyn>=1"]').replace(
+                'Version: 1.0', 'Version: 1.0\\nSummary: " + __import__("dyn").VALUE + "'))
+
+        def install(env, requirements, target=None):
+            if not requirements:
+                # the build-system.requires of the pooled environment
+                return
+            self.assertEqual(requirements, ['dyn>=1'])
+            self.assertIsNotNone(target)
+            with open(os.path.join(target, 'dyn.py'), 'w') as f:
+                f.write('VALUE = "from the overlay"\n')
+            os.mkdir(os.path.join(target, 'dyn-1.0.dist-info'))
+            with open(os.path.join(target, 'dyn-1.0.dist-info', 'METADATA'), 'w') as f:
+                f.write('Metadata-Version: 2.1\nName: dyn\nVersion: 1.0\n')
+
+        with mock.patch.object(py2pack.buildenv.BuildEnv, 'install', autospec=True, side_effect=install):
+            mdata = py2pack.buildenv.project_wheel_metadata(self.project, self.pool)
+        self.assertEqual(mdata['Summary'], 'from the overlay')
+        with self.pool.env([]) as env:
+            self.assertEqual(env.missing(['dyn>=1']), ['dyn>=1'])
+
+    def test_env_shared(self):
+        with self.pool.env([]):
+            pass
+        # a build using the environment does not block others using it
+        entered = threading.Event()
+
+        def use():
+            with self.pool.env([]):
+                entered.set()
+
+        with self.pool.env([]):
+            thread = threading.Thread(target=use)
+            thread.start()
+            self.assertTrue(entered.wait(5))
+        thread.join()
+
+    def test_evict(self):
+        with self.pool.env([]) as env:
+            path = env.path
+        self.pool.evict(max_size=0)
+        self.assertFalse(os.path.exists(path))
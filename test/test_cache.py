@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import py2pack.cache
+
+URL = 'https://pypi.org/pypi/py2pack/json'
+
+
+def _response(status_code=200, content=b'{}', headers=None):
+    r = mock.MagicMock()
+    r.status_code = status_code
+    r.content = content
+    r.headers = headers or {}
+    r.__enter__.return_value = r
+    return r
+
+
+class Py2packCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='py2pack_test_')
+        py2pack.cache.configure(directory=self.tmpdir, ttl=60)
+
+    def tearDown(self):
+        py2pack.cache.configure()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_set_get(self):
+        cache = py2pack.cache.HTTPCache(self.tmpdir)
+        cache.set(URL, b'{"info": {}}', {'ETag': '"abc"'})
+        entry = cache.get(URL)
+        self.assertEqual(entry.body, b'{"info": {}}')
+        self.assertEqual(entry.validators(), {'If-None-Match': '"abc"'})
+        self.assertIsNone(cache.get(URL + '?other'))
+
+    def test_evict_lru(self):
+        cache = py2pack.cache.HTTPCache(self.tmpdir)
+        cache.set('a', b'x' * 100)
+        cache.set('b', b'x' * 100)
+        old = time.time() - 100
+        os.utime(cache._path('a'), (old, old))
+        cache.evict(max_size=cache.size() - 1)
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('b'))
+
+    @mock.patch('py2pack.net.get')
+    def test_cached_get_fresh(self, get):
+        get.return_value = _response(content=b'1')
+        self.assertEqual(py2pack.cache.cached_get(URL), b'1')
+        self.assertEqual(py2pack.cache.cached_get(URL), b'1')
+        self.assertEqual(get.call_count, 1)
+
+    @mock.patch('py2pack.net.get')
+    def test_cached_get_revalidate(self, get):
+        get.return_value = _response(content=b'1', headers={'ETag': '"v1"'})
+        py2pack.cache.cached_get(URL)
+        py2pack.cache.configure(directory=self.tmpdir, ttl=0)
+        get.return_value = _response(status_code=304, content=b'')
+        self.assertEqual(py2pack.cache.cached_get(URL), b'1')
+        get.assert_called_with(URL, headers={'If-None-Match': '"v1"'})
+
+    @mock.patch('py2pack.net.get')
+    def test_cached_get_immutable(self, get):
+        get.return_value = _response(content=b'1')
+        py2pack.cache.cached_get(URL, immutable=True)
+        py2pack.cache.configure(directory=self.tmpdir, ttl=0)
+        self.assertEqual(py2pack.cache.cached_get(URL, immutable=True), b'1')
+        self.assertEqual(get.call_count, 1)
+
+    @mock.patch('py2pack.net.get')
+    def test_cached_get_error_not_stored(self, get):
+        get.return_value = _response(status_code=404, content=b'{"message": "Not Found"}')
+        py2pack.cache.cached_get(URL)
+        py2pack.cache.cached_get(URL)
+        self.assertEqual(get.call_count, 2)
+
+    @mock.patch('py2pack.net.get')
+    def test_cached_get_disabled(self, get):
+        py2pack.cache.configure(enabled=False)
+        get.return_value = _response(content=b'1')
+        py2pack.cache.cached_get(URL)
+        py2pack.cache.cached_get(URL)
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(os.listdir(self.tmpdir), [])
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import py2pack.cache
+import py2pack.index
+
+SIMPLE_JSON = json.dumps({
+    'meta': {'api-version': '1.0', '_last-serial': 42},
+    'projects': [{'name': n, '_last-serial': 1} for n in ['zope.interface', 'Django', 'py2pack', 'pytest']],
+}).encode('utf-8')
+SIMPLE_HTML = b''.join(b'<a href="/simple/%s/">%s</a>\n' % (n, n)
+                       for n in [b'zope.interface', b'Django', b'py2pack', b'pytest'])
+
+
+def _response(status_code=200, content=b'', headers=None):
+    r = mock.MagicMock()
+    r.status_code = status_code
+    r.headers = headers or {}
+    # small chunks to exercise names split between chunks
+    r.iter_content.return_value = [content[i:i + 7] for i in range(0, len(content), 7)]
+    r.__enter__.return_value = r
+    return r
+
+
+class Py2packIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='py2pack_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    @mock.patch('py2pack.net.get')
+    def test_refresh_json(self, get):
+        get.return_value = _response(content=SIMPLE_JSON, headers={
+            'Content-Type': 'application/vnd.pypi.simple.v1+json', 'X-PyPI-Last-Serial': '42'})
+        with mock.patch('py2pack.index.build_search_index') as build_search_index:
+            self.assertTrue(py2pack.index.refresh(self.tmpdir))
+        # built by the first search, not for listing
+        build_search_index.assert_not_called()
+        self.assertEqual(py2pack.index.load(self.tmpdir),
+                         ['Django', 'py2pack', 'pytest', 'zope.interface'])
+        self.assertFalse(py2pack.index.is_stale(self.tmpdir))
+        # same serial, the body is not read again
+        get.return_value = _response(content=b'garbage', headers={'X-PyPI-Last-Serial': '42'})
+        self.assertFalse(py2pack.index.refresh(self.tmpdir))
+        self.assertEqual(len(py2pack.index.load(self.tmpdir)), 4)
+
+    @mock.patch('py2pack.net.get')
+    def test_refresh_html_not_modified(self, get):
+        get.return_value = _response(content=SIMPLE_HTML, headers={
+            'Content-Type': 'text/html', 'ETag': '"abc"'})
+        py2pack.index.refresh(self.tmpdir)
+        get.return_value = _response(status_code=304)
+        self.assertFalse(py2pack.index.refresh(self.tmpdir))
+        self.assertEqual(get.call_args[1]['headers']['If-None-Match'], '"abc"')
+        self.assertEqual(py2pack.index.load(self.tmpdir),
+                         ['Django', 'py2pack', 'pytest', 'zope.interface'])
+
+    def test_search_prefix(self):
+        names = ['Django', 'py2pack', 'pytest', 'pyyaml', 'zope.interface']
+        self.assertEqual(py2pack.index.search_prefix(names, 'PY'), ['py2pack', 'pytest', 'pyyaml'])
+        self.assertEqual(py2pack.index.search_prefix(names, 'pyt'), ['pytest'])
+        self.assertEqual(py2pack.index.search_prefix(names, 'foo'), [])
+        self.assertEqual(py2pack.index.search_prefix(names, None), names)
+
+    def test_load_missing(self):
+        self.assertEqual(py2pack.index.load(self.tmpdir), [])
+        self.assertTrue(py2pack.index.is_stale(self.tmpdir))
+
+
+class Py2packSearchIndexTestCase(unittest.TestCase):
+    NAMES = ['Django', 'django-rest', 'py2pack', 'pytest', 'pytest-cov',
+             'requests', 'requests-oauthlib', 'zope.interface']
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='py2pack_test_')
+        py2pack.cache.configure(directory=self.tmpdir + '/http')
+        py2pack.cache.get_cache().set(
+            'https://pypi.org/pypi/py2pack/0.9.1/json',
+            json.dumps({'info': {'name': 'py2pack', 'version': '0.9.1',
+                                 'summary': 'Generate distribution packages from PyPI'}}).encode())
+        with open(self.tmpdir + '/projects.txt', 'w') as f:
+            f.write(''.join(n + '\n' for n in sorted(self.NAMES, key=str.lower)))
+        self.index = py2pack.index.SearchIndex.open(self.tmpdir)
+
+    def tearDown(self):
+        py2pack.cache.configure()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _names(self, query, limit=20):
+        return [hit['name'] for hit in self.index.search(query, limit)]
+
+    def test_exact_prefix_substring(self):
+        self.assertEqual(self._names('pytest'), ['pytest', 'pytest-cov'])
+        self.assertEqual(self._names('ZOPE_interface'), ['zope.interface'])
+        self.assertEqual(self._names('oauth'), ['requests-oauthlib'])
+
+    def test_fuzzy(self):
+        self.assertEqual(self._names('reqests')[0], 'requests')
+
+    def test_short_query(self):
+        self.assertEqual(self._names('dj'), ['Django', 'django-rest'])
+
+    def test_limit(self):
+        self.assertEqual(self._names('requests', limit=1), ['requests'])
+
+    def test_summary(self):
+        hits = self.index.search('distribution packages')
+        self.assertEqual([(h['name'], h['version']) for h in hits], [('py2pack', '0.9.1')])
+
+    def test_rebuild_when_outdated(self):
+        with open(self.tmpdir + '/projects.txt', 'a') as f:
+            f.write('zzz\n')
+        os.utime(self.tmpdir + '/projects.txt', (0, 2 ** 32))
+        self.assertEqual([h['name'] for h in py2pack.index.SearchIndex.open(self.tmpdir).search('zzz')], ['zzz'])
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import email.utils
+import hashlib
+import http.server
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import py2pack.config
+import py2pack.net
+
+
+class Py2packNetTestCase(unittest.TestCase):
+    def tearDown(self):
+        py2pack.net.configure()
+
+    def test_session_is_shared(self):
+        self.assertIs(py2pack.net.get_session(), py2pack.net.get_session())
+
+    def test_configure(self):
+        old = py2pack.net.get_session()
+        py2pack.net.configure(pool_size=3, connect_timeout=1, read_timeout=2)
+        session = py2pack.net.get_session()
+        self.assertIsNot(old, session)
+        self.assertEqual(session.get_adapter('https://pypi.org')._pool_maxsize, 3)
+        with mock.patch.object(session, 'get') as get:
+            py2pack.net.get('https://pypi.org/simple/')
+        get.assert_called_once_with('https://pypi.org/simple/', timeout=(1, 2))
+
+
+class Py2packConfigTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='py2pack_test_')
+        self.filename = os.path.join(self.tmpdir, 'py2pack.conf')
+        with open(self.filename, 'w') as f:
+            f.write("[network]\npool_size = 4\n[cache]\nenabled = no\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_setting(self):
+        config = py2pack.config.load(self.filename)
+        self.assertEqual(py2pack.config.setting(config, 'network', 'pool_size', type=int), 4)
+        self.assertEqual(py2pack.config.setting(config, 'network', 'pool_size', 8, type=int), 8)
+        self.assertEqual(py2pack.config.setting(config, 'network', 'read_timeout', default=5), 5)
+        self.assertIs(py2pack.config.setting(config, 'cache', 'enabled', type=bool), False)
+
+    def test_missing_file(self):
+        config = py2pack.config.load(os.path.join(self.tmpdir, 'nonexistent.conf'))
+        self.assertIsNone(py2pack.config.setting(config, 'network', 'pool_size'))
+
+
+class Py2packDownloadTestCase(unittest.TestCase):
+    DATA = b'0123456789' * 1000
+    SHA256 = hashlib.sha256(DATA).hexdigest()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='py2pack_test_')
+        self.filename = os.path.join(self.tmpdir, 'foo-1.0.tar.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _response(self, status_code, content):
+        r = mock.MagicMock()
+        r.status_code = status_code
+        r.iter_content.return_value = [content[i:i + 1000] for i in range(0, len(content), 1000)]
+        r.__enter__.return_value = r
+        return r
+
+    @mock.patch('py2pack.net.get')
+    def test_download(self, get):
+        get.return_value = self._response(200, self.DATA)
+        py2pack.net.download('https://example.com/foo', self.filename, sha256=self.SHA256)
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), self.DATA)
+        self.assertFalse(os.path.exists(self.filename + '.part'))
+
+    @mock.patch('py2pack.net.get')
+    def test_download_resume(self, get):
+        with open(self.filename + '.part', 'wb') as f:
+            f.write(self.DATA[:1234])
+        get.return_value = self._response(206, self.DATA[1234:])
+        py2pack.net.download('https://example.com/foo', self.filename, sha256=self.SHA256)
+        self.assertEqual(get.call_args[1]['headers'], {'Range': 'bytes=1234-'})
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), self.DATA)
+
+    @mock.patch('py2pack.net.get')
+    def test_download_resume_unsupported(self, get):
+        with open(self.filename + '.part', 'wb') as f:
+            f.write(b'garbage')
+        get.return_value = self._response(200, self.DATA)
+        py2pack.net.download('https://example.com/foo', self.filename, sha256=self.SHA256)
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), self.DATA)
+
+    @mock.patch('py2pack.net.get')
+    def test_download_hash_mismatch(self, get):
+        get.return_value = self._response(200, self.DATA)
+        with self.assertRaises(ValueError):
+            py2pack.net.download('https://example.com/foo', self.filename, sha256='0' * 64)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+
+class _FlakyHandler(http.server.BaseHTTPRequestHandler):
+    """Answers from a script of (status, headers, delay) per path, 200 when it is used up"""
+    scripts = {}
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        script = self.scripts.get(self.path, [])
+        status, headers, delay = script.pop(0) if script else (200, {}, 0)
+        time.sleep(delay)
+        body = self.path.encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Py2packRetryTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _FlakyHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = 'http://127.0.0.1:{0}'.format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        py2pack.net.configure(read_timeout=0.2, retries=3, backoff=0.01)
+        _FlakyHandler.scripts.clear()
+        del _FlakyHandler.requests[:]
+
+    def tearDown(self):
+        py2pack.net.configure()
+
+    def test_retry(self):
+        _FlakyHandler.scripts['/flaky'] = [(503, {'Retry-After': '0'}, 0), (429, {}, 0), (502, {}, 0)]
+        with py2pack.net.get(self.url + '/flaky') as r:
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.content, b'/flaky')
+        self.assertEqual(len(_FlakyHandler.requests), 4)
+
+    def test_give_up(self):
+        _FlakyHandler.scripts['/down'] = [(503, {}, 0)] * 10
+        with py2pack.net.get(self.url + '/down') as r:
+            self.assertEqual(r.status_code, 503)
+        self.assertEqual(len(_FlakyHandler.requests), 4)
+
+    def test_no_retry(self):
+        _FlakyHandler.scripts['/missing'] = [(404, {}, 0)]
+        with py2pack.net.get(self.url + '/missing') as r:
+            self.assertEqual(r.status_code, 404)
+        self.assertEqual(len(_FlakyHandler.requests), 1)
+
+    def test_stalled(self):
+        _FlakyHandler.scripts['/stall'] = [(200, {}, 1.0)]
+        with py2pack.net.get(self.url + '/stall') as r:
+            self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(_FlakyHandler.requests), 2)
+
+    def test_throttling_lowers_concurrency(self):
+        limit = py2pack.net.host_limit(self.url)
+        before = limit.limit
+        _FlakyHandler.scripts['/throttled'] = [(429, {}, 0)]
+        py2pack.net.get(self.url + '/throttled').close()
+        self.assertLess(limit.limit, before)
+
+
+class Py2packBackoffTestCase(unittest.TestCase):
+    def test_retry_after(self):
+        self.assertEqual(py2pack.net.retry_after({'Retry-After': '7'}), 7.0)
+        date = email.utils.formatdate(time.time() + 30, usegmt=True)
+        self.assertAlmostEqual(py2pack.net.retry_after({'Retry-After': date}), 30, delta=2)
+        self.assertIsNone(py2pack.net.retry_after({'Retry-After': 'soon'}))
+        self.assertIsNone(py2pack.net.retry_after({}))
+
+    def test_backoff_delay(self):
+        self.assertEqual(py2pack.net.backoff_delay(0, {'Retry-After': '3'}), 3.0)
+        self.assertEqual(py2pack.net.backoff_delay(0, {'Retry-After': '86400'}), py2pack.net.MAX_RETRY_AFTER)
+        for attempt in range(12):
+            delay = py2pack.net.backoff_delay(attempt)
+            self.assertLessEqual(delay, min(py2pack.net.MAX_BACKOFF, py2pack.net.DEFAULT_BACKOFF * 2 ** attempt))
+
+    def test_aimd(self):
+        limit = py2pack.net.AdaptiveLimit(16, initial=8)
+        limit.acquire()
+        limit.release(throttled=True)
+        self.assertEqual(limit.limit, 4)
+        # the same overload
+        limit.acquire()
+        limit.release(throttled=True)
+        self.assertEqual(limit.limit, 4)
+        # about one more per round of requests
+        for _ in range(4):
+            limit.acquire()
+            limit.release()
+        self.assertAlmostEqual(limit.limit, 5, delta=0.1)
+        for _ in range(200):
+            limit.acquire()
+            limit.release()
+        self.assertEqual(limit.limit, 16)
+
+    def test_aimd_blocks(self):
+        limit = py2pack.net.AdaptiveLimit(2, initial=1)
+        limit.acquire()
+        acquired = threading.Event()
+
+        def second():
+            limit.acquire()
+            acquired.set()
+
+        threading.Thread(target=second, daemon=True).start()
+        self.assertFalse(acquired.wait(0.1))
+        limit.release()
+        self.assertTrue(acquired.wait(1))
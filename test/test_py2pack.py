@@ -16,11 +16,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import argparse
+import email.message
+import hashlib
+import io
+import json
 import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
 import unittest
+from unittest import mock
 from ddt import ddt, data, unpack
 
+import jinja2
+
 import py2pack
+import py2pack.cache
 from py2pack import replace_string
 
 
@@ -50,12 +64,52 @@ class Py2packTestCase(unittest.TestCase):
         self.assertEqual(py2pack._get_source_url(pypi_name, extension),
                          expected_url)
 
+    def test_template_names(self):
+        self.assertEqual(py2pack.template_names(None), ['opensuse.spec'])
+        self.assertEqual(py2pack.template_names('fedora.spec'), ['fedora.spec'])
+        self.assertEqual(py2pack.template_names(['fedora.spec', 'opensuse.spec', 'fedora.spec']),
+                         ['fedora.spec', 'opensuse.spec'])
+        self.assertEqual(py2pack.template_names(['all']), sorted(set(py2pack.file_template_list())))
+        self.assertEqual(py2pack.output_filename('foo', 'opensuse.dsc'), 'python-foo.dsc')
+        self.assertEqual(py2pack.output_filename('foo', 'opensuse.dsc', several=True), 'python-foo.opensuse.dsc')
+
     def test_replace_text(self):
         input_string = 'This is %{name} and %%{name} %{what}. Also, replace %% with %.'
         output_string = replace_string(input_string, {'name': 'replacement', 'what': r'%placeholders%%'})
         expected_output_string = r'This is replacement and %{name} %placeholders%%. Also, replace % with %.'
         self.assertEqual(output_string, expected_output_string)
 
+    @data(
+        ({'versions': ['1.0', '1.1', '2.0b1'], 'files': []}, '1.1'),
+        ({'versions': ['1.0', '2.0b1'], 'files': [
+            {'filename': 'foo-1.0.tar.gz', 'yanked': 'broken'}]}, '2.0b1'),
+        ({'files': [{'filename': 'foo-1.0.tar.gz'},
+                    {'filename': 'foo-1.1-py3-none-any.whl', 'yanked': False},
+                    {'filename': 'foo-1.2.tar.gz', 'yanked': True}]}, '1.1'),
+        ({'versions': ['dev'], 'files': []}, None),
+    )
+    @unpack
+    def test_pypi_latest_version(self, simple, expected):
+        with mock.patch('py2pack.cache.cached_get', return_value=json.dumps(simple).encode()):
+            self.assertEqual(py2pack.pypi_latest_version('foo'), expected)
+
+    @mock.patch('py2pack.cache.cached_get')
+    def test_pypi_json_latest(self, cached_get):
+        cached_get.side_effect = [
+            json.dumps({'versions': ['1.0']}).encode(),
+            json.dumps({'info': {'version': '1.0'}, 'urls': []}).encode(),
+        ]
+        self.assertEqual(py2pack.pypi_json('foo'), {'info': {'version': '1.0'}, 'urls': []})
+        cached_get.assert_called_with('https://pypi.org/pypi/foo/1.0/json', immutable=True)
+
+    @mock.patch('py2pack.cache.cached_get')
+    def test_pypi_json_project_document(self, cached_get):
+        cached_get.side_effect = [
+            b'<html>no PEP 691 support</html>',
+            json.dumps({'info': {'version': '1.0'}, 'releases': {'1.0': [{}]}, 'urls': []}).encode(),
+        ]
+        self.assertEqual(py2pack.pypi_json('foo'), {'info': {'version': '1.0'}, 'urls': []})
+
     def test_list(self):
         py2pack.list_packages(self.args)
 
@@ -111,6 +165,89 @@ class Py2packTestCase(unittest.TestCase):
         self.assertTrue('parenthesize_version' in env.filters)
         self.assertTrue('basename' in env.filters)
 
+    @mock.patch('py2pack.get_template_env')
+    def test_write_template(self, get_template_env):
+        get_template_env.return_value = jinja2.Environment(loader=jinja2.DictLoader({
+            'ok.spec': 'Name: {{ name }}\n', 'broken.spec': 'Name: {{ name }}\n{{ missing() }}'}))
+        tmpdir = tempfile.mkdtemp(prefix='py2pack_test_')
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        filename = os.path.join(tmpdir, 'python-foo.spec')
+        py2pack.write_template('ok.spec', {'name': 'f\u00f6o'}, filename)
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), 'Name: f\u00f6o'.encode('utf-8'))
+        # a failed render keeps the old file
+        with self.assertRaises(jinja2.UndefinedError):
+            py2pack.write_template('broken.spec', {'name': 'bar'}, filename)
+        self.assertEqual(os.listdir(tmpdir), ['python-foo.spec'])
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), 'Name: f\u00f6o'.encode('utf-8'))
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            py2pack._stream_template_stdout('ok.spec', {'name': 'bar'})
+        self.assertEqual(stdout.getvalue(), 'Name: bar')
+
+    @mock.patch('py2pack.get_template_env')
+    def test_write_template_if_changed(self, get_template_env):
+        templates = {'foo.spec': '{% include "header" %}Name: {{ name }}', 'header': '# spec\n'}
+        get_template_env.return_value = jinja2.Environment(loader=jinja2.DictLoader(templates))
+        tmpdir = tempfile.mkdtemp(prefix='py2pack_test_')
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        filename = os.path.join(tmpdir, 'python-foo.spec')
+        self.assertTrue(py2pack.write_template_if_changed('foo.spec', {'name': 'foo'}, filename))
+        self.assertEqual(sorted(os.listdir(tmpdir)), ['.python-foo.spec.py2pack', 'python-foo.spec'])
+        self.assertFalse(py2pack.write_template_if_changed('foo.spec', {'name': 'foo'}, filename))
+        self.assertTrue(py2pack.write_template_if_changed('foo.spec', {'name': 'foo'}, filename, force=True))
+        self.assertTrue(py2pack.write_template_if_changed('foo.spec', {'name': 'bar'}, filename))
+        templates['header'] = '# new header\n'
+        self.assertTrue(py2pack.write_template_if_changed('foo.spec', {'name': 'bar'}, filename))
+        with open(filename) as f:
+            self.assertEqual(f.read(), '# new headerName: bar')
+        os.unlink(filename)
+        self.assertTrue(py2pack.write_template_if_changed('foo.spec', {'name': 'bar'}, filename))
+
+    def test_get_template_env(self):
+        tmpdir = tempfile.mkdtemp(prefix='py2pack_test_')
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        py2pack.cache.configure_template_cache(directory=tmpdir)
+        py2pack._template_envs.clear()
+        self.addCleanup(py2pack._template_envs.clear)
+        self.addCleanup(py2pack.cache.configure_template_cache)
+        env = py2pack.get_template_env()
+        self.assertIs(py2pack.get_template_env(), env)
+        self.assertIsInstance(env.bytecode_cache, jinja2.FileSystemBytecodeCache)
+        env.get_template('opensuse.spec')
+        self.assertEqual(len(os.listdir(tmpdir)), 1)
+        # a new environment loads the compiled template from the cache
+        py2pack._template_envs.clear()
+        with mock.patch.object(jinja2.Environment, 'compile') as compile:
+            py2pack.get_template_env().get_template('opensuse.spec')
+        compile.assert_not_called()
+
+    def test_lazy_imports(self):
+        # the CLI starts without the heavy dependencies, they are imported on first use
+        heavy = ['backports.entry_points_selectable', 'build', 'concurrent.futures', 'jinja2',
+                 'multiprocessing', 'packaging.requirements', 'pyproject_hooks', 'requests',
+                 'tomli', 'tomllib']
+        script = ('import sys\n'
+                  'import py2pack, py2pack.batch, py2pack.update\n'
+                  'sys.argv = ["py2pack", "--version"]\n'
+                  'try:\n'
+                  '    py2pack.main()\n'
+                  'except SystemExit:\n'
+                  '    pass\n'
+                  'print(sorted(set(sys.modules) & set({0!r})))').format(heavy)
+        output = subprocess.check_output([sys.executable, '-c', script], text=True)
+        self.assertEqual(output.splitlines()[-1], '[]')
+
+    def test_spdx_licenses(self):
+        self.assertIs(py2pack.SPDX_LICENSES, py2pack.get_spdx_licenses())
+        self.assertEqual(py2pack.get_spdx_licenses()['Apache 2.0'], 'Apache-2.0')
+
+    def test_template_choices(self):
+        choices = py2pack._TemplateChoices()
+        self.assertIn('opensuse.spec', choices)
+        self.assertNotIn('missing.spec', choices)
+        self.assertIn('all', list(choices))
+
     @data(
         (
             {'install_requires': ["pywin32>=1.0;sys_platform=='win32'", 'monotonic>=0.1 #comment']},
@@ -215,3 +352,175 @@ class Py2packTestCase(unittest.TestCase):
         py2pack._canonicalize_setup_data(data)
         self.assertEqual(sorted(list(data['console_scripts'])),
                          sorted(expected_data))
+
+
+class Py2packTarballTestCase(unittest.TestCase):
+    PYPROJECT = b'[build-system]\nrequires = ["hatchling"]\nbuild-backend = "hatchling.build"\n'
+    PKG_INFO = (b"Metadata-Version: 2.3\nName: foo\nVersion: 1.0\nSummary: Foo\n"
+                b"License: MIT\nRequires-Dist: bar>=1\n")
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='py2pack_test_')
+        py2pack.cache.configure_metadata_cache(directory=os.path.join(self.tmpdir, 'cache'))
+        self.sdist = os.path.join(self.tmpdir, 'foo-1.0.tar.gz')
+        with tarfile.open(self.sdist, "w:gz") as tar:
+            for member, content in [("foo-1.0/pyproject.toml", self.PYPROJECT),
+                                    ("foo-1.0/PKG-INFO", self.PKG_INFO),
+                                    ("foo-1.0/README.md", b""),
+                                    ("foo-1.0/LICENSE", b"")]:
+                info = tarfile.TarInfo(member)
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+
+        class Args:
+            name = 'foo'
+            version = '1.0'
+        self.args = Args()
+
+    def tearDown(self):
+        py2pack.cache.configure_metadata_cache()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_augment_data_from_tarball(self):
+        data = {'name': 'foo', 'home_page': 'https://example.com/foo', 'description': 'from PyPI'}
+        py2pack._augment_data_from_tarball(self.args, self.sdist, data)
+        # missing in the PKG-INFO, the values from PyPI stay
+        self.assertEqual(data['home_page'], 'https://example.com/foo')
+        self.assertEqual(data['description'], 'from PyPI')
+        self.assertEqual(data['build_requires'], ['hatchling'])
+        self.assertEqual(data['install_requires'], ['bar >= 1'])
+        self.assertEqual(data['summary'], 'Foo')
+        self.assertEqual(data['doc_files'], ['README.md'])
+        self.assertEqual(data['license_files'], ['LICENSE'])
+
+    def test_inspect_tarball_setuptools_single_pass(self):
+        with tarfile.open(self.sdist, "w:gz") as tar:
+            for member, content in [("foo-1.0/setup.py", b"from setuptools import setup\nsetup()\n"),
+                                    ("foo-1.0/PKG-INFO", self.PKG_INFO)]:
+                info = tarfile.TarInfo(member)
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+
+        def run_metaextract(source_dir, py_interpreter):
+            self.assertTrue(os.path.isfile(os.path.join(source_dir, 'setup.py')))
+            return {'data': {'name': 'foo'}}
+
+        self.args.no_metadata_cache = True
+        with mock.patch('py2pack.run_metaextract', side_effect=run_metaextract), \
+                mock.patch('tarfile.open', wraps=tarfile.open) as tar_open:
+            result = py2pack._inspect_tarball_cached(self.args, self.sdist)
+        self.assertEqual(result['data'], {'name': 'foo'})
+        # extracted while indexing, the archive is decompressed once
+        self.assertEqual(tar_open.call_count, 1)
+
+    def test_augment_data_from_tarball_metadata_cache(self):
+        with mock.patch('py2pack._inspect_tarball', wraps=py2pack._inspect_tarball) as inspect:
+            first, second = {}, {}
+            py2pack._augment_data_from_tarball(self.args, self.sdist, first)
+            py2pack._augment_data_from_tarball(self.args, self.sdist, second)
+            self.assertEqual(inspect.call_count, 1)
+            self.assertEqual(first, second)
+            cache = py2pack.cache.get_metadata_cache()
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            # different options, different entry
+            self.args.metadata = 'build'
+            with mock.patch('py2pack.utils._project_wheel_metadata', side_effect=Exception("no build")):
+                with self.assertWarns(UserWarning):
+                    py2pack._augment_data_from_tarball(self.args, self.sdist, {})
+            self.assertEqual(inspect.call_count, 2)
+            # failures are not cached
+            built = email.message.Message()
+            built['Name'] = 'foo'
+            with mock.patch('py2pack.utils._project_wheel_metadata', return_value=built):
+                py2pack._augment_data_from_tarball(self.args, self.sdist, {})
+                py2pack._augment_data_from_tarball(self.args, self.sdist, {})
+            self.assertEqual(inspect.call_count, 3)
+            # disabled
+            self.args.metadata = 'auto'
+            self.args.no_metadata_cache = True
+            py2pack._augment_data_from_tarball(self.args, self.sdist, {})
+            self.assertEqual(inspect.call_count, 4)
+
+    @mock.patch('py2pack.get_template_env')
+    def test_generate_stdout(self, get_template_env):
+        get_template_env.return_value = jinja2.Environment(loader=jinja2.DictLoader({
+            'ok.spec': 'Name: {{ name }}\nSummary: {{ summary }}\n'}))
+
+        def fetch_local_data(args):
+            args.fetched_data = {'info': {'name': 'foo', 'version': '1.0', 'summary': 'Foo'}, 'urls': []}
+
+        args = argparse.Namespace(name='foo', version='1.0', source_url=None, run=False, template=['ok.spec'], filename=None,
+                                  source_glob=os.path.join(self.tmpdir, '%{name}-%{version}.*'),
+                                  stdout=True, force=False, metadata='auto', no_metadata_cache=False)
+        with mock.patch('py2pack.fetch_local_data', side_effect=fetch_local_data):
+            for _ in range(2):
+                # the second run uses the cached metadata
+                with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout, \
+                        mock.patch('sys.stderr', new_callable=io.StringIO) as stderr:
+                    py2pack.generate(args)
+                self.assertEqual(stdout.getvalue(), 'Name: foo\nSummary: Foo')
+                self.assertIn('generating spec file for foo', stderr.getvalue())
+        self.assertIn('using cached metadata for foo-1.0.tar.gz', stderr.getvalue())
+        # the output of several templates can not be told apart, and
+        # there is no file
+        for options in [{'template': ['ok.spec', 'other.spec']}, {'filename': 'python-foo.spec'}]:
+            with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout, \
+                    mock.patch('sys.stderr', new_callable=io.StringIO) as stderr, \
+                    self.assertRaises(SystemExit):
+                py2pack.generate(argparse.Namespace(**dict(vars(args), **options)))
+            self.assertEqual(stdout.getvalue(), '')
+            self.assertIn('--stdout', stderr.getvalue())
+
+
+class Py2packMirrorTestCase(unittest.TestCase):
+    SDIST = b'not really a tarball'
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='py2pack_test_')
+        mirror = os.path.join(self.tmpdir, 'mirror')
+        files = {
+            'simple/index.html': b'<a href="foo/">foo</a>\n<a href="bar/">bar</a>\n',
+            'simple/foo/index.v1_json': json.dumps(
+                {'files': [{'filename': 'foo-1.0.tar.gz'}, {'filename': 'foo-2.0.tar.gz', 'yanked': True}]}).encode(),
+            'pypi/foo/1.0/json': json.dumps({
+                'info': {'name': 'foo', 'version': '1.0'},
+                'urls': [{'packagetype': 'sdist', 'filename': 'foo-1.0.tar.gz',
+                          'url': '../../../packages/foo-1.0.tar.gz',
+                          'digests': {'sha256': hashlib.sha256(self.SDIST).hexdigest()}}]}).encode(),
+            'packages/foo-1.0.tar.gz': self.SDIST,
+        }
+        for name, content in files.items():
+            os.makedirs(os.path.dirname(os.path.join(mirror, name)), exist_ok=True)
+            with open(os.path.join(mirror, name), 'wb') as f:
+                f.write(content)
+        self.mirror_url = 'file://' + mirror
+        py2pack.index.configure(directory=os.path.join(self.tmpdir, 'index'), url=self.mirror_url)
+        py2pack.cache.configure(directory=os.path.join(self.tmpdir, 'http'))
+
+    def tearDown(self):
+        py2pack.index.configure()
+        py2pack.cache.configure()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_pypi_json(self):
+        data = py2pack.pypi_json('foo')
+        self.assertEqual(data['info']['version'], '1.0')
+        release = py2pack._newest_download_url('foo', data)
+        # the spec points to PyPI, the download to the mirror
+        self.assertEqual(release['url'],
+                         'https://files.pythonhosted.org/packages/source/f/foo/foo-1.0.tar.gz')
+        self.assertEqual(release['fetch_url'], self.mirror_url + '/packages/foo-1.0.tar.gz')
+        filename = os.path.join(self.tmpdir, release['filename'])
+        py2pack.net.download(release['fetch_url'], filename, sha256=release['digests']['sha256'])
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), self.SDIST)
+        # local files are not copied into the cache
+        self.assertEqual(list(py2pack.cache.get_cache().entries()), [])
+
+    def test_list_packages(self):
+        self.assertTrue(py2pack.index.refresh())
+        self.assertEqual(py2pack.index.load(), ['bar', 'foo'])
+
+    def test_missing(self):
+        with py2pack.net.get(self.mirror_url + '/pypi/nonexistent/json') as r:
+            self.assertEqual(r.status_code, 404)
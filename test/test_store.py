@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import py2pack.store
+import py2pack.utils
+
+
+class Py2packStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='py2pack_test_')
+        self.store = py2pack.store.Store(os.path.join(self.tmpdir, 'store'), max_size=1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _file(self, name, content):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_add_lookup(self):
+        sdist = self._file('Foo.Bar-1.0.tar.gz', b'sdist')
+        path = self.store.add(sdist, 'Foo.Bar', '1.0')
+        sha256 = hashlib.sha256(b'sdist').hexdigest()
+        self.assertEqual(path, os.path.join(self.store.directory, 'sha256', sha256[:2], sha256,
+                                            'Foo.Bar-1.0.tar.gz'))
+        self.assertEqual(self.store.lookup('foo-bar', '1.0'), path)
+        self.assertIsNone(self.store.lookup('foo-bar', '2.0'))
+        self.assertEqual(self.store.get(sha256), path)
+        # the same content is stored once
+        self.assertEqual(self.store.add(self._file('copy', b'sdist')), path)
+        self.assertEqual(self.store.size(), 5)
+
+    def test_checkout_hardlink(self):
+        path = self.store.add(self._file('foo-1.0.tar.gz', b'sdist'), 'foo', '1.0')
+        checkout = os.path.join(self.tmpdir, 'checkout.tar.gz')
+        self.store.checkout(path, checkout)
+        self.assertTrue(os.path.samefile(path, checkout))
+        self.store.checkout(path, checkout)
+        with open(checkout, 'rb') as f:
+            self.assertEqual(f.read(), b'sdist')
+
+    def test_checkout_copy(self):
+        path = self.store.add(self._file('foo-1.0.tar.gz', b'sdist'), 'foo', '1.0')
+        checkout = os.path.join(self.tmpdir, 'checkout.tar.gz')
+        with mock.patch('os.link', side_effect=OSError('cross-device link')):
+            self.store.checkout(path, checkout)
+        self.assertFalse(os.path.samefile(path, checkout))
+        with open(checkout, 'rb') as f:
+            self.assertEqual(f.read(), b'sdist')
+
+    def test_fetch(self):
+        def download(url, filename, sha256=None):
+            with open(filename, 'wb') as f:
+                f.write(b'downloaded')
+            return hashlib.sha256(b'downloaded').hexdigest()
+
+        with mock.patch('py2pack.net.download', side_effect=download) as mocked:
+            path = self.store.fetch('https://example.com/foo-1.0.tar.gz', 'foo-1.0.tar.gz', 'foo', '1.0')
+            self.assertEqual(self.store.fetch('https://example.com/foo-1.0.tar.gz', 'foo-1.0.tar.gz',
+                                              'foo', '1.0'), path)
+        mocked.assert_called_once()
+        self.assertEqual(self.store.lookup('foo', '1.0'), path)
+        self.assertEqual(os.listdir(os.path.join(self.store.directory, 'tmp')), ['foo-1.0.tar.gz.lock'])
+
+    def test_prune_concurrent_removal(self):
+        path = self.store.add(self._file('foo-1.0.tar.gz', b'f' * 400), 'foo', '1.0')
+        blob_dir = os.path.dirname(path)
+        scandir = os.scandir
+
+        def removed_meanwhile(directory):
+            entries = list(scandir(directory))
+            if directory == os.path.dirname(blob_dir):
+                # another process prunes it after it was listed
+                for name in os.listdir(blob_dir):
+                    os.unlink(os.path.join(blob_dir, name))
+                os.rmdir(blob_dir)
+            return iter(entries)
+
+        with mock.patch('os.scandir', side_effect=removed_meanwhile):
+            self.assertEqual(self.store.prune(0), 0)
+        self.assertIsNone(self.store.get(os.path.basename(blob_dir)))
+
+    def test_fetch_concurrent(self):
+        # another process downloads the file while this one waits for the lock
+        tmp_dir = os.path.join(self.store.directory, 'tmp')
+        os.makedirs(tmp_dir)
+        sdist = self._file('foo-1.0.tar.gz', b'sdist')
+        result = []
+        thread = threading.Thread(target=lambda: result.append(self.store.fetch(
+            'https://example.com/foo-1.0.tar.gz', 'foo-1.0.tar.gz', 'foo', '1.0')))
+        with mock.patch('py2pack.net.download') as download:
+            with py2pack.utils.file_lock(os.path.join(tmp_dir, 'foo-1.0.tar.gz.lock')):
+                thread.start()
+                thread.join(0.2)
+                self.assertTrue(thread.is_alive())
+                path = self.store.add(sdist, 'foo', '1.0')
+            thread.join()
+        download.assert_not_called()
+        self.assertEqual(result, [path])
+
+    def test_prune(self):
+        old = self.store.add(self._file('old-1.0.tar.gz', b'o' * 400), 'old', '1.0')
+        used = self.store.add(self._file('used-1.0.tar.gz', b'u' * 400), 'used', '1.0')
+        os.utime(os.path.dirname(old), (1, 1))
+        os.utime(os.path.dirname(used), (2, 2))
+        self.store.lookup('used', '1.0')
+        new = self.store.add(self._file('new-1.0.tar.gz', b'n' * 400), 'new', '1.0')
+        self.assertIsNone(self.store.lookup('old', '1.0'))
+        self.assertEqual(self.store.lookup('used', '1.0'), used)
+        self.assertEqual(self.store.lookup('new', '1.0'), new)
+        self.assertEqual(self.store.prune(0), 0)
+        self.assertIsNone(self.store.lookup('new', '1.0'))
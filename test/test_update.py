@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2026, the py2pack developers
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import io
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+import py2pack.update
+
+SPEC = """\
+Name:           python-foo.bar
+Version:        1.0
+Release:        0
+Summary:        Foo
+License:        MIT
+URL:            https://example.com/foo
+Source:         https://files.pythonhosted.org/packages/source/f/foo.bar/foo.bar-%{version}.tar.gz
+# PATCH-FIX-UPSTREAM local change
+Patch0:         fix.patch
+BuildRequires:  python-rpm-macros
+BuildRequires:  %{python_module pip}
+BuildRequires:  %{python_module setuptools}
+# SECTION test requirements
+BuildRequires:  %{python_module attrs >= 20}
+BuildRequires:  %{python_module six}
+BuildRequires:  %{python_module pytest}
+# /SECTION
+BuildRequires:  fdupes
+Requires:       python-attrs >= 20
+Requires:       python-six
+Requires:       python-local-addition
+BuildArch:      noarch
+%python_subpackages
+
+%description
+Foo 1.0 does things.
+"""
+
+
+def _metadata(version, requires_dist, filename=None):
+    filename = filename or 'foo.bar-{0}.tar.gz'.format(version)
+    return {'info': {'name': 'foo.bar', 'version': version, 'requires_dist': requires_dist},
+            'urls': [{'packagetype': 'sdist', 'filename': filename,
+                      'url': 'https://files.pythonhosted.org/packages/aa/bb/' + filename}]}
+
+
+class Py2packUpdateTestCase(unittest.TestCase):
+    def test_parse_spec(self):
+        self.assertEqual(py2pack.update.parse_spec(SPEC), {
+            'name': 'python-foo.bar', 'version': '1.0', 'project': 'foo.bar',
+            'source': 'https://files.pythonhosted.org/packages/source/f/foo.bar/foo.bar-1.0.tar.gz'})
+        spec = py2pack.update.parse_spec("%define pypi_name foo\n%global pypi_version 2.0\n"
+                                         "Name: python-%{pypi_name}\nVersion: %{pypi_version}\n")
+        self.assertEqual((spec['name'], spec['version'], spec['project']), ('python-foo', '2.0', 'foo'))
+        with self.assertRaises(ValueError):
+            py2pack.update.parse_spec("Name: foo\n")
+
+    def test_update_spec(self):
+        text, changes = py2pack.update.update_spec(
+            SPEC, _metadata('1.1', ['attrs>=21', 'packaging', 'pytest; extra == "test"']),
+            previous=_metadata('1.0', ['attrs>=20', 'six']))
+        self.assertEqual(changes, ['version 1.0 -> 1.1', 'requirements'])
+        expected = (SPEC.replace('Version:        1.0', 'Version:        1.1')
+                    .replace('attrs >= 20', 'attrs >= 21')
+                    .replace('BuildRequires:  %{python_module six}\n', '')
+                    .replace('Requires:       python-six\n', '')
+                    .replace('# /SECTION', 'BuildRequires:  %{python_module packaging}\n# /SECTION')
+                    .replace('python-local-addition\n', 'python-local-addition\nRequires:       python-packaging\n'))
+        self.assertEqual(text, expected)
+
+    def test_update_spec_up_to_date(self):
+        self.assertEqual(py2pack.update.update_spec(SPEC, _metadata('1.0', [])), (SPEC, []))
+        self.assertEqual(py2pack.update.update_spec(SPEC, _metadata('0.9', [])), (SPEC, []))
+
+    def test_update_spec_no_requires_dist(self):
+        text, changes = py2pack.update.update_spec(SPEC, _metadata('2.0', None))
+        self.assertEqual(changes, ['version 1.0 -> 2.0'])
+        self.assertEqual(text, SPEC.replace('Version:        1.0', 'Version:        2.0'))
+
+    def test_update_spec_without_previous(self):
+        # nothing is removed when the old requirements are unknown
+        text, changes = py2pack.update.update_spec(SPEC, _metadata('1.1', ['attrs>=20']))
+        self.assertEqual(changes, ['version 1.0 -> 1.1'])
+
+    def test_update_spec_source(self):
+        text, changes = py2pack.update.update_spec(SPEC, _metadata('1.1', None, filename='foo_bar-1.1.tar.gz'))
+        self.assertEqual(changes, ['version 1.0 -> 1.1', 'source'])
+        self.assertIn('Source:         https://files.pythonhosted.org/packages/source/f/foo.bar/'
+                      'foo_bar-%{version}.tar.gz\n', text)
+        spec = SPEC.replace('https://files.pythonhosted.org/packages/source/f/foo.bar/foo.bar-%{version}.tar.gz',
+                            'https://github.com/foo/bar/archive/v1.0.tar.gz')
+        text, changes = py2pack.update.update_spec(spec, _metadata('1.1', None))
+        self.assertIn('Source:         https://github.com/foo/bar/archive/v1.1.tar.gz\n', text)
+
+    def test_update_spec_version_macro(self):
+        spec = "%define pypi_version 1.0\nName: python-foo\nVersion: %{pypi_version}\n"
+        text, changes = py2pack.update.update_spec(spec, _metadata('1.1', None))
+        self.assertEqual(text, "%define pypi_version 1.1\nName: python-foo\nVersion: %{pypi_version}\n")
+
+
+class Py2packUpdateFileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='py2pack_test_')
+        self.specfile = os.path.join(self.tmpdir, 'python-foo.bar.spec')
+        with open(self.specfile, 'w') as f:
+            f.write(SPEC)
+        os.chmod(self.specfile, 0o640)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    @mock.patch('py2pack.pypi_json')
+    def test_update(self, pypi_json):
+        pypi_json.side_effect = lambda project, version=None: _metadata(version or '1.1', ['attrs>=20', 'six'])
+        args = argparse.Namespace(specfile=[self.specfile, os.path.join(self.tmpdir, 'missing.spec')],
+                                  version=None, jobs=2)
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            with self.assertRaises(SystemExit):
+                py2pack.update.update(args)
+        self.assertIn('updated   {0}: version 1.0 -> 1.1'.format(self.specfile), stdout.getvalue())
+        self.assertIn('failed    {0}'.format(os.path.join(self.tmpdir, 'missing.spec')), stdout.getvalue())
+        pypi_json.assert_any_call('foo.bar', None)
+        pypi_json.assert_any_call('foo.bar', '1.0')
+        with open(self.specfile) as f:
+            self.assertEqual(f.read(), SPEC.replace('Version:        1.0', 'Version:        1.1'))
+        self.assertEqual(stat.S_IMODE(os.stat(self.specfile).st_mode), 0o640)
+        self.assertEqual(py2pack.update.update_file(self.specfile), [])
+
+    @mock.patch('py2pack.pypi_json')
+    def test_update_file_failed_write(self, pypi_json):
+        pypi_json.side_effect = lambda project, version=None: _metadata(version or '1.1', None)
+        with mock.patch('shutil.copymode', side_effect=PermissionError('copymode')):
+            with self.assertRaises(PermissionError):
+                py2pack.update.update_file(self.specfile)
+        # the spec and no temporary file
+        self.assertEqual(os.listdir(self.tmpdir), ['python-foo.bar.spec'])
+        with open(self.specfile) as f:
+            self.assertEqual(f.read(), SPEC)
@@ -15,11 +15,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import email.message
+import glob
+import io
 import os
 import shutil
 import tarfile
 import tempfile
 import unittest
+from unittest import mock
 
 import py2pack.utils
 
@@ -93,3 +97,173 @@ class Py2packUtilsTestCase(unittest.TestCase):
 
         self.assertNotIn(
             "Not a tar or zip file", str(f_not_found_err.exception))
+
+    def test_json_select(self):
+        text = ('{"info": {"name": "foo"}, "releases": {"1.0": [{"url": "x]}\\"", '
+                '"digests": {}}], "0.1": []}, "urls": [], "vulnerabilities": [}')
+        self.assertEqual(py2pack.utils.json_select(text, ["info", "urls"]),
+                         {"info": {"name": "foo"}, "urls": []})
+        self.assertEqual(py2pack.utils.json_select('{"a": 1}', ["b"]), {})
+        with self.assertRaises(ValueError):
+            py2pack.utils.json_select('[]', ["info"])
+
+    def _create_sdist(self, name="foo-1.0.tar.gz", pkg_info=b"Metadata-Version: 2.2\nName: foo\n"):
+        tarfile_name = os.path.join(self.tmpdir, name)
+        with tarfile.open(tarfile_name, "w:gz") as tar:
+            for member, content in [("foo-1.0/pyproject.toml", b'[project]\nname = "foo"\n'),
+                                    ("foo-1.0/PKG-INFO", pkg_info),
+                                    ("foo-1.0/tests/pyproject.toml", b"[project]\nname = 'other'\n"),
+                                    ("foo-1.0/foo/__init__.py", b"")]:
+                info = tarfile.TarInfo(member)
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+        return tarfile_name
+
+    def test_archive_index(self):
+        with py2pack.utils.ArchiveIndex(self._create_sdist()) as archive:
+            self.assertEqual(archive.names, ["foo-1.0/PKG-INFO", "foo-1.0/foo/__init__.py",
+                                             "foo-1.0/pyproject.toml", "foo-1.0/tests/pyproject.toml"])
+            self.assertEqual(sorted(archive.files), ["PKG-INFO", "pyproject.toml"])
+            self.assertIsNone(archive.root_dir)
+            self.assertEqual(py2pack.utils.parse_pyproject(archive), {"project": {"name": "foo"}})
+
+    def test_archive_index_extract(self):
+        with py2pack.utils.ArchiveIndex(self._create_sdist(), extract=True) as archive:
+            extract_dir = archive.extract_dir
+            self.assertEqual(archive.root_dir, os.path.join(extract_dir, "foo-1.0"))
+            self.assertTrue(os.path.isfile(os.path.join(archive.root_dir, "foo", "__init__.py")))
+            self.assertEqual(archive.files["PKG-INFO"], b"Metadata-Version: 2.2\nName: foo\n")
+        self.assertFalse(os.path.exists(extract_dir))
+
+    def test_archive_index_extract_later(self):
+        with py2pack.utils.ArchiveIndex(self._create_sdist()) as archive:
+            root_dir = archive.extract()
+            self.assertEqual(sorted(os.listdir(root_dir)), ["PKG-INFO", "foo", "pyproject.toml", "tests"])
+            self.assertEqual(archive.extract(), root_dir)
+
+    def test_archive_index_extract_decided(self):
+        calls = []
+
+        def needs_files(index, complete):
+            # like an old PKG-INFO, which needs a build
+            calls.append((sorted(index.files), complete))
+            if "PKG-INFO" in index.files:
+                return index.files["PKG-INFO"].startswith(b"Metadata-Version: 2.1")
+            return None
+
+        sdist = self._create_sdist(pkg_info=b"Metadata-Version: 2.1\nName: foo\n")
+        with mock.patch("tarfile.open", wraps=tarfile.open) as tar_open:
+            with py2pack.utils.ArchiveIndex(sdist, extract=needs_files) as archive:
+                self.assertTrue(os.path.isfile(os.path.join(archive.extract(), "foo", "__init__.py")))
+            # extracted in the indexing pass, not decompressed again
+            self.assertEqual(tar_open.call_count, 1)
+        self.assertEqual(calls, [([], False), (["pyproject.toml"], False), (["PKG-INFO", "pyproject.toml"], False)])
+        # not needed: removed again once decided
+        with py2pack.utils.ArchiveIndex(self._create_sdist(), extract=needs_files) as archive:
+            self.assertIsNone(archive.extract_dir)
+            self.assertEqual(sorted(archive.files), ["PKG-INFO", "pyproject.toml"])
+
+    def test_archive_index_extract_dir(self):
+        extract_dir = os.path.join(self.tmpdir, "shm")
+        py2pack.utils.configure(extract_dir=extract_dir)
+        self.addCleanup(py2pack.utils.configure)
+        with py2pack.utils.ArchiveIndex(self._create_sdist()) as archive:
+            archive.extract()
+            self.assertEqual(os.path.dirname(archive.extract_dir), extract_dir)
+
+    def test_run_metaextract(self):
+        source_dir = os.path.join(self.tmpdir, "foo-1.0")
+        os.mkdir(source_dir)
+        with open(os.path.join(source_dir, "setup.py"), "w") as f:
+            f.write("from setuptools import setup\nsetup(name='foo', version='1.0', "
+                    "install_requires=['requests', 'attrs'])\n")
+        cwd = os.getcwd()
+        data = py2pack.utils.run_metaextract(source_dir)["data"]
+        self.assertEqual(os.getcwd(), cwd)
+        self.assertEqual(data["name"], "foo")
+        self.assertEqual(data["install_requires"], ["attrs", "requests"])
+
+    def test_parse_pyproject_missing(self):
+        self.assertEqual(py2pack.utils.parse_pyproject(self._create_tarfile()), {})
+
+    PKG_INFO = (b"Metadata-Version: %s\nName: foo\nVersion: 1.0\nSummary: static summary\n"
+                b"License: MIT\nRequires-Dist: bar>=1\nRequires-Dist: baz\n%s")
+
+    @mock.patch("py2pack.utils._project_wheel_metadata")
+    def test_get_metadata_static(self, build):
+        sdist = self._create_sdist(pkg_info=self.PKG_INFO % (b"2.2", b""))
+        data = py2pack.utils.get_metadata(sdist)
+        build.assert_not_called()
+        self.assertEqual(data["summary"], "static summary")
+        self.assertEqual(data["install_requires"], ["bar>=1", "baz"])
+        self.assertIsNone(data["home_page"])
+
+    @mock.patch("py2pack.utils._project_wheel_metadata")
+    def test_get_metadata_dynamic(self, build):
+        built = email.message.Message()
+        for field, value in [("Name", "foo"), ("Summary", "built summary"), ("Requires-Dist", "qux")]:
+            built[field] = value
+        build.return_value = built
+        sdist = self._create_sdist(pkg_info=self.PKG_INFO % (b"2.2", b"Dynamic: Requires-Dist\n"))
+        data = py2pack.utils.get_metadata(sdist)
+        build.assert_called_once()
+        self.assertEqual(data["summary"], "static summary")
+        self.assertEqual(data["install_requires"], ["qux"])
+        # forced static: no build, dynamic fields as in PKG-INFO
+        build.reset_mock()
+        data = py2pack.utils.get_metadata(sdist, source="static")
+        build.assert_not_called()
+        self.assertEqual(data["install_requires"], ["bar>=1", "baz"])
+
+    @mock.patch("py2pack.utils._project_wheel_metadata")
+    def test_get_metadata_description_body(self, build):
+        sdist = self._create_sdist(pkg_info=self.PKG_INFO % (b"2.2", b"\nFoo does things.\n\nReally.\n"))
+        data = py2pack.utils.get_metadata(sdist)
+        build.assert_not_called()
+        self.assertEqual(data["description"], "Foo does things.\n\nReally.\n")
+        self.assertEqual(data["install_requires"], ["bar>=1", "baz"])
+        # a Description header is kept
+        sdist = self._create_sdist(pkg_info=self.PKG_INFO % (b"2.2", b"Description: header\n"))
+        self.assertEqual(py2pack.utils.get_metadata(sdist)["description"], "header")
+
+    @mock.patch("py2pack.utils._project_wheel_metadata")
+    def test_get_metadata_old_pkg_info(self, build):
+        build.return_value = email.message.Message()
+        sdist = self._create_sdist(pkg_info=self.PKG_INFO % (b"2.1", b""))
+        data = py2pack.utils.get_metadata(sdist)
+        build.assert_called_once()
+        self.assertIsNone(data["summary"])
+
+    def test_atomic_write(self):
+        filename = os.path.join(self.tmpdir, "sub", "file")
+        py2pack.utils.atomic_write(filename, b"old")
+        with mock.patch("os.replace", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                py2pack.utils.atomic_write(filename, b"new")
+        self.assertEqual(os.listdir(os.path.dirname(filename)), ["file"])
+        with open(filename, "rb") as f:
+            self.assertEqual(f.read(), b"old")
+
+    def test_source_index(self):
+        for name in ["foo-1.0.tar.gz", "foo-1.0.zip", "foo-1.01.tar.gz", "foo_bar-1.0.tar.gz",
+                     ".foo-1.0.tar.gz", "bar-1.0.tar.gz"]:
+            with open(os.path.join(self.tmpdir, name), "w"):
+                pass
+        template = os.path.join(self.tmpdir, "%{name}-%{version}.*")
+        index = py2pack.utils.SourceIndex(template)
+        self.assertEqual(index.find("foo", "1.0"), [os.path.join(self.tmpdir, "foo-1.0.tar.gz"),
+                                                    os.path.join(self.tmpdir, "foo-1.0.zip")])
+        self.assertEqual(index.find("foo_bar", "1.0"), [os.path.join(self.tmpdir, "foo_bar-1.0.tar.gz")])
+        self.assertEqual(index.find("baz", "1.0"), [])
+        self.assertEqual(index.find("foo", "1.0"), sorted(glob.glob(os.path.join(self.tmpdir, "foo-1.0.*"))))
+        with mock.patch("os.listdir") as listdir:
+            index.find("bar", "1.0")
+        listdir.assert_not_called()
+        # a new file changes the mtime of the directory
+        os.utime(self.tmpdir, ns=(0, 0))
+        with open(os.path.join(self.tmpdir, "baz-1.0.tar.gz"), "w"):
+            pass
+        self.assertEqual(index.find("baz", "1.0"), [os.path.join(self.tmpdir, "baz-1.0.tar.gz")])
+        self.assertIs(py2pack.utils.get_source_index(template), py2pack.utils.get_source_index(template))
+        self.assertEqual(py2pack.utils.SourceIndex("%{name}%%{name}%{what}").pattern({"name": "a%", "what": "b"}),
+                         "a%%{name}b")